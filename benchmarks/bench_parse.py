@@ -0,0 +1,138 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.benchmarks.parse"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+"""
+Webhook payload parsing microbenchmark
+Parses the Grafana sample payloads found in grafana-webhook-calls.txt like the /grafana
+endpoint does:
+legacy: json module and full AlertMessage validation, then the f-string debug log which
+    was formatted even with debug logging disabled
+pydantic: AlertMessage.model_validate_json(), as used with http_server:fast_parsing: false
+fast: parse_alert_message() into an AlertMessageView, with orjson when installed
+Reports parses per second, peak bytes allocated while parsing and bytes kept by the result
+
+Usage: python benchmarks/bench_parse.py [--parses 100000] [--alerts 1]
+--alerts replicates sub alerts of every payload, to mimic grouped notifications
+"""
+
+
+import os
+import sys
+import json
+import time
+import logging
+import tracemalloc
+from argparse import ArgumentParser
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT_DIR)
+from grafana_webhook_api import models
+from grafana_webhook_api.models import AlertMessage, parse_alert_message
+
+
+logger = logging.getLogger()
+
+
+def load_bodies(path: str, alerts: int = 1) -> list:
+    bodies = []
+    with open(path, "r", encoding="utf-8") as file_handle:
+        for line_number, line in enumerate(file_handle, start=1):
+            if not line.startswith("{"):
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError as exc:
+                print(f"Skipping invalid sample at line {line_number}: {exc}")
+                continue
+            payload["alerts"] = payload["alerts"] * alerts
+            bodies.append(json.dumps(payload).encode("utf-8"))
+    return bodies
+
+
+def legacy_parse(body: bytes):
+    alert = AlertMessage.model_validate(json.loads(body))
+    logger.debug(f"Alert\n{alert}")
+    return alert
+
+
+def pydantic_parse(body: bytes):
+    alert = AlertMessage.model_validate_json(body)
+    logger.debug("Alert\n%s", alert)
+    return alert
+
+
+def fast_parse(body: bytes):
+    alert = parse_alert_message(body)
+    logger.debug("Alert\n%s", alert)
+    return alert
+
+
+def bench(parse, bodies: list, parses: int) -> float:
+    bodies_count = len(bodies)
+    begin = time.perf_counter()
+    for i in range(parses):
+        parse(bodies[i % bodies_count])
+    return time.perf_counter() - begin
+
+
+def memory(parse, bodies: list) -> tuple:
+    """
+    Average (peak allocated bytes, retained bytes) per parse
+    """
+    peaks = 0
+    retained = 0
+    tracemalloc.start()
+    for body in bodies:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        result = parse(body)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks += peak - before
+        retained += current - before
+        del result
+    tracemalloc.stop()
+    return peaks / len(bodies), retained / len(bodies)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Webhook payload parsing microbenchmark")
+    parser.add_argument("--parses", type=int, default=100000)
+    parser.add_argument("--alerts", type=int, default=1)
+    parser.add_argument(
+        "--samples", default=os.path.join(ROOT_DIR, "grafana-webhook-calls.txt")
+    )
+    args = parser.parse_args()
+    # Like a production server, debug logs are disabled
+    logging.basicConfig(level=logging.INFO)
+
+    bodies = load_bodies(args.samples, args.alerts)
+    if not bodies:
+        sys.exit("No usable samples")
+
+    print(
+        f"{args.parses} parses of {len(bodies)} samples with {args.alerts} sub alert "
+        f"copies, json decoder: {models._loads.__module__}"
+    )
+    for name, parse in (
+        ("legacy", legacy_parse),
+        ("pydantic", pydantic_parse),
+        ("fast", fast_parse),
+    ):
+        # Warm up caches before measuring allocations
+        bench(parse, bodies, len(bodies))
+        peak, retained = memory(parse, bodies)
+        elapsed = bench(parse, bodies, args.parses)
+        print(
+            f"{name:>8}: {args.parses / elapsed:,.0f} parses/s, "
+            f"{elapsed / args.parses * 1e6:.1f}us/parse, "
+            f"{peak:,.0f} peak bytes, {retained:,.0f} retained bytes"
+        )
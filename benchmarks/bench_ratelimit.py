@@ -0,0 +1,158 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.benchmarks.ratelimit"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+"""
+Rate limiter microbenchmark
+Runs the same admissions, with the same min_interval and global_rate_limit rules, against
+the legacy list slicing limiter and the RateLimiter sliding window and token bucket modes
+Admissions are spaced so the global window stays full while every admission is allowed,
+which is where the legacy limiter copies its whole timestamp list on every sms
+
+Usage: python benchmarks/bench_ratelimit.py [--admissions 1000000] [--numbers 2000]
+       [--global-rate-limit 1000/300]
+"""
+
+
+from typing import Tuple
+import os
+import sys
+import math
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timezone, timedelta
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from grafana_webhook_api.ratelimit import RateLimiter, RateLimitRule
+
+MIN_INTERVAL = 300
+
+
+def legacy_admit(
+    last_sent: dict, number: str, now: datetime, global_rate_limit: str
+) -> bool:
+    """
+    Rate limit logic as found in sms.send_sms() before the ratelimit module
+    """
+    global_count, global_interval = global_rate_limit.split("/")
+    global_count = int(global_count)
+    global_interval = int(global_interval)
+    hard_min_interval = MIN_INTERVAL
+    try:
+        elapsed = (now - last_sent[number]["date"]).seconds
+    except KeyError:
+        elapsed = None
+    if elapsed is not None and elapsed < hard_min_interval:
+        return False
+    try:
+        if last_sent["global"][-global_count] >= (
+            now - timedelta(seconds=global_interval)
+        ):
+            return False
+    except (KeyError, IndexError):
+        pass
+    last_sent[number] = {"date": now}
+    last_sent["global"].append(now)
+    last_sent["global"] = last_sent["global"][-global_count:]
+    return True
+
+
+def admission_step(global_rate_limit: str) -> int:
+    """
+    Milliseconds between admissions, just over interval / count so the global window
+    is always full but never refuses
+    """
+    count, interval = global_rate_limit.split("/")
+    return math.ceil(int(interval) * 1000 / int(count)) + 1
+
+
+def bench_legacy(
+    admissions: int, numbers: list, global_rate_limit: str
+) -> Tuple[float, int]:
+    last_sent = {"global": []}
+    start = datetime.now(timezone.utc)
+    step = admission_step(global_rate_limit)
+    numbers_count = len(numbers)
+    admitted = 0
+    begin = time.perf_counter()
+    for i in range(admissions):
+        admitted += legacy_admit(
+            last_sent,
+            numbers[i % numbers_count],
+            start + timedelta(milliseconds=i * step),
+            global_rate_limit,
+        )
+    return time.perf_counter() - begin, admitted
+
+
+def bench_rate_limiter(
+    admissions: int, numbers: list, global_rate_limit: str, mode: str
+) -> Tuple[float, int]:
+    rate_limiter = RateLimiter(
+        [
+            RateLimitRule("min_interval", "number", 1, MIN_INTERVAL),
+            RateLimitRule.from_string(
+                "global_rate_limit", "global", global_rate_limit, mode=mode
+            ),
+        ]
+    )
+    step = admission_step(global_rate_limit)
+    numbers_count = len(numbers)
+    admitted = 0
+    begin = time.perf_counter()
+    for i in range(admissions):
+        admitted += (
+            rate_limiter.admit(numbers[i % numbers_count], now=i * step / 1000) is None
+        )
+    return time.perf_counter() - begin, admitted
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Rate limiter microbenchmark")
+    parser.add_argument("--admissions", type=int, default=1000000)
+    parser.add_argument(
+        "--numbers",
+        type=int,
+        default=2000,
+        help="Numbers sent to in turn, enough of them so min_interval never refuses",
+    )
+    parser.add_argument("--global-rate-limit", default="1000/300")
+    args = parser.parse_args()
+
+    numbers = ["+33{:09d}".format(i) for i in range(args.numbers)]
+    print(
+        f"{args.admissions} admissions over {args.numbers} numbers, min_interval "
+        f"{MIN_INTERVAL}, global_rate_limit {args.global_rate_limit}, one every "
+        f"{admission_step(args.global_rate_limit)}ms"
+    )
+    for name, bench in (
+        (
+            "legacy",
+            lambda: bench_legacy(args.admissions, numbers, args.global_rate_limit),
+        ),
+        (
+            "window",
+            lambda: bench_rate_limiter(
+                args.admissions, numbers, args.global_rate_limit, "window"
+            ),
+        ),
+        (
+            "bucket",
+            lambda: bench_rate_limiter(
+                args.admissions, numbers, args.global_rate_limit, "bucket"
+            ),
+        ),
+    ):
+        elapsed, admitted = bench()
+        print(
+            f"{name:>8}: {elapsed:.3f}s, {args.admissions / elapsed:,.0f} admissions/s, "
+            f"{elapsed / args.admissions * 1e9:.0f}ns/admission, {admitted} admitted"
+        )
@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.benchmarks.render"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+"""
+Alert message rendering microbenchmark
+Renders the Grafana sample payloads found in grafana-webhook-calls.txt with the legacy
+string concatenation code and with the compiled MessageTemplate
+Payloads which aren't valid JSON in the samples file are skipped
+
+Usage: python benchmarks/bench_render.py [--renders 200000] [--alerts 1]
+--alerts replicates sub alerts of every payload, to mimic grouped notifications
+"""
+
+
+import os
+import sys
+import json
+import time
+from argparse import ArgumentParser
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT_DIR)
+from grafana_webhook_api.models import AlertMessage
+from grafana_webhook_api.templates import MessageTemplate
+
+
+def load_samples(path: str, alerts: int = 1) -> list:
+    samples = []
+    with open(path, "r", encoding="utf-8") as file_handle:
+        for line_number, line in enumerate(file_handle, start=1):
+            if not line.startswith("{"):
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError as exc:
+                print(f"Skipping invalid sample at line {line_number}: {exc}")
+                continue
+            payload["alerts"] = payload["alerts"] * alerts
+            samples.append(AlertMessage.model_validate(payload))
+    return samples
+
+
+def legacy_render(alert: AlertMessage, supervision_name: str) -> str:
+    """
+    Message formatting as found in api.grafana() before the templates module
+    """
+    try:
+        title = alert.title.replace("'", r"-")
+    except KeyError:
+        title = ""
+
+    try:
+        orgId = str(alert.orgId).replace("'", r"-")
+    except (KeyError, AttributeError, ValueError, TypeError):
+        orgId = ""
+
+    try:
+        externalURL = alert.externalURL.replace("'", r"-")  # noqa: F841
+    except KeyError:
+        externalURL = ""  # noqa: F841
+
+    try:
+        message = alert.message.replace("'", r"-")
+    except KeyError:
+        message = ""
+
+    extracted_alerts = {}
+    for i in range(0, len(alert.alerts)):
+        extracted_alerts[i] = f"ALERT {alert.alerts[i].status}:\n"
+        for label, content in alert.alerts[i].labels.items():
+            extracted_alerts[i] += f"- {label}={content}\n"
+
+    alert_header = "{} org {}: {}".format(supervision_name, orgId, title)
+    if extracted_alerts:
+        alert_message = alert_header
+        for i in range(0, len(extracted_alerts)):
+            alert_message += f"\n{extracted_alerts[i]}"
+    else:
+        alert_message = alert_header + f"\n{message}"
+    return alert_message
+
+
+def bench(render, samples: list, renders: int) -> float:
+    samples_count = len(samples)
+    begin = time.perf_counter()
+    for i in range(renders):
+        render(samples[i % samples_count])
+    return time.perf_counter() - begin
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Alert message rendering microbenchmark")
+    parser.add_argument("--renders", type=int, default=200000)
+    parser.add_argument("--alerts", type=int, default=1)
+    parser.add_argument(
+        "--samples", default=os.path.join(ROOT_DIR, "grafana-webhook-calls.txt")
+    )
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples, args.alerts)
+    if not samples:
+        sys.exit("No usable samples")
+    template = MessageTemplate(supervision_name="Supervision")
+    for sample in samples:
+        if legacy_render(sample, "Supervision") != template.render(sample).replace(
+            "'", "-"
+        ):
+            print(f"Warning: rendered messages differ for {sample.title}")
+
+    print(
+        f"{args.renders} renders of {len(samples)} samples with {args.alerts} sub alert copies"
+    )
+    for name, render in (
+        ("legacy", lambda alert: legacy_render(alert, "Supervision")),
+        ("template", template.render),
+    ):
+        elapsed = bench(render, samples, args.renders)
+        print(
+            f"{name:>8}: {elapsed:.3f}s, {args.renders / elapsed:,.0f} renders/s, "
+            f"{elapsed / args.renders * 1e9:.0f}ns/render"
+        )
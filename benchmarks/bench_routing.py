@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.benchmarks.routing"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+"""
+Label routing microbenchmark
+Routes sub alerts against a routing table of --routes rules, each matching a folder, a
+severity and an orgId, using the Router inverted index and a linear scan of all rules
+
+Usage: python benchmarks/bench_routing.py [--routes 5000] [--lookups 100000]
+"""
+
+
+import os
+import sys
+import time
+import random
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from grafana_webhook_api.routing import Router
+
+SEVERITIES = ("critical", "warning", "info")
+
+
+def build_routes(count: int) -> list:
+    return [
+        (
+            {
+                "grafana_folder": [f"folder{index}"],
+                "severity": [SEVERITIES[index % len(SEVERITIES)]],
+                "orgId": [str(index % 10)],
+            },
+            [f"+33600{index:06d}"],
+        )
+        for index in range(count)
+    ]
+
+
+def linear_numbers(routes: list, labels: dict, pseudo_labels: dict) -> list:
+    """
+    Every rule checked in turn, as a routing table without index would do
+    """
+    numbers = []
+    for match, route_numbers in routes:
+        for label, values in match.items():
+            if labels.get(label, pseudo_labels.get(label)) not in values:
+                break
+        else:
+            numbers += route_numbers
+    return numbers
+
+
+def bench(numbers, alerts: list, lookups: int) -> float:
+    begin = time.perf_counter()
+    for index in range(lookups):
+        labels, pseudo_labels = alerts[index % len(alerts)]
+        numbers(labels, pseudo_labels)
+    return time.perf_counter() - begin
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Label routing microbenchmark")
+    parser.add_argument("--routes", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    routes = build_routes(args.routes)
+    router = Router(routes)
+    random.seed(0)
+    alerts = []
+    for _ in range(1000):
+        index = random.randrange(args.routes)
+        labels = {
+            "alertname": "HighLoad",
+            "instance": f"server{index}",
+            "grafana_folder": f"folder{index}",
+            "severity": SEVERITIES[index % len(SEVERITIES)],
+        }
+        alerts.append((labels, {"orgId": str(index % 10), "status": "firing"}))
+
+    # Both give the same numbers
+    for labels, pseudo_labels in alerts[:100]:
+        assert router.numbers(labels, pseudo_labels) == linear_numbers(
+            routes, labels, pseudo_labels
+        )
+
+    lookups = args.lookups
+    for name, numbers, count in (
+        (
+            "linear",
+            lambda labels, pseudo_labels: linear_numbers(routes, labels, pseudo_labels),
+            max(lookups // 100, 100),
+        ),
+        ("index", router.numbers, lookups),
+    ):
+        elapsed = bench(numbers, alerts, count)
+        print(
+            f"{name:>6}: {count / elapsed:,.0f} sub alerts/s, "
+            f"{elapsed / count * 1e6:.1f}us/sub alert with {args.routes} routes"
+        )
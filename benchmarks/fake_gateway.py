@@ -0,0 +1,45 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.benchmarks.fake_gateway"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+"""
+Fake sms gateway, used as sms_command instead of gammu-smsd-inject by benchmarks/loadgen.py
+Waits for the simulated modem latency, then fails with exit code 2 at the given rate,
+like gammu-smsd-inject does when it can't reach the outbox
+
+Usage: sms_command: python benchmarks/fake_gateway.py --latency 0.05 --jitter 0.02
+    --failure-rate 0.01 ${NUMBER} ${ALERT_MESSAGE}
+"""
+
+
+import sys
+import time
+import random
+from argparse import ArgumentParser
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Fake sms gateway")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per sms")
+    parser.add_argument(
+        "--jitter", type=float, default=0, help="Random extra seconds per sms"
+    )
+    parser.add_argument(
+        "--failure-rate", type=float, default=0, help="Ratio of failed sends, 0 to 1"
+    )
+    parser.add_argument("number")
+    parser.add_argument("message", nargs="*")
+    args = parser.parse_args()
+
+    time.sleep(args.latency + random.uniform(0, args.jitter))
+    if random.random() < args.failure_rate:
+        print(f"Simulated gateway failure for {args.number}")
+        sys.exit(2)
+    print(f"Written message with ID fake to {args.number}")
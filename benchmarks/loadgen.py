@@ -0,0 +1,335 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.benchmarks.loadgen"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+"""
+Webhook load generator
+Replays the Grafana payloads found in grafana-webhook-calls.txt at a given rate and
+concurrency, and reports latency percentiles, throughput and dropped sms
+
+By default, the ASGI app is loaded in-process with a copy of the configuration file where
+sms_command is benchmarks/fake_gateway.py, which simulates modem latency and failures,
+and rate limits are removed unless --keep-rate-limits is given
+With --url, a running server is targeted instead, eg one started with
+    python benchmarks/loadgen.py --write-config /tmp/bench.conf
+    python server.py -c /tmp/bench.conf
+
+Every request gets new alert fingerprints so duplicate alert detection doesn't answer
+them, unless --identical is given
+With --rate, requests are sent at a fixed rate (open loop) and latency is measured from
+the time a request should have been sent, so a saturated server can't hide its backlog
+Without --rate, --concurrency requests are kept in flight (closed loop)
+
+Usage: python benchmarks/loadgen.py [--requests 1000] [--rate 0] [--concurrency 20]
+    [--numbers 100] [--latency 0.05] [--jitter 0] [--failure-rate 0] [--url URL]
+    [--sms-command /bin/true] [--endpoint grafana|send|bulk] [--bulk-size 100]
+--endpoint bulk sends --bulk-size messages per bulk /send request
+--sms-command replaces the fake gateway, eg /bin/true to measure the server without
+simulated modem latency
+"""
+
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import tempfile
+from collections import Counter
+from argparse import ArgumentParser
+import httpx
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT_DIR)
+from grafana_webhook_api import configuration
+
+FAKE_GATEWAY = os.path.join(ROOT_DIR, "benchmarks", "fake_gateway.py")
+
+
+def load_payloads(path: str) -> list:
+    payloads = []
+    with open(path, "r", encoding="utf-8") as file_handle:
+        for line_number, line in enumerate(file_handle, start=1):
+            if not line.startswith("{"):
+                continue
+            try:
+                payloads.append(json.loads(line))
+            except ValueError as exc:
+                print(f"Skipping invalid sample at line {line_number}: {exc}")
+    return payloads
+
+
+def gateway_command(latency: float, jitter: float, failure_rate: float) -> str:
+    return (
+        f"{sys.executable} {FAKE_GATEWAY} --latency {latency} --jitter {jitter} "
+        f"--failure-rate {failure_rate} ${{NUMBER}} ${{ALERT_MESSAGE}}"
+    )
+
+
+def write_bench_config(
+    config_file: str, path: str, sms_command: str, keep_rate_limits: bool = False
+):
+    """
+    Copy of config_file sending sms to the fake gateway, without authentication
+    Files written by the server end up in the directory of path
+    """
+    config_dict = configuration.load_config(config_file)
+    if config_dict is None:
+        sys.exit(f"Cannot load config file {config_file}")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    config_dict["sms_command"] = sms_command
+    config_dict.setdefault("delivery", {})["backend"] = "command"
+    config_dict.setdefault("http_server", {})["no_auth"] = True
+    config_dict.setdefault("config_reload", {})["watch"] = False
+    for section, file in (("journal", "journal.db"), ("state_store", "state.db")):
+        config_dict.setdefault(section, {})["path"] = os.path.join(directory, file)
+    if "metrics" in config_dict:
+        config_dict["metrics"]["directory"] = None
+    if not keep_rate_limits:
+        config_dict["min_interval"] = None
+        config_dict["global_rate_limit"] = None
+        config_dict["rate_limits"] = []
+    configuration.save_config(path, config_dict)
+
+
+def build_requests(payloads: list, args) -> list:
+    """
+    (path, body) of every request, encoded before the clock starts
+    """
+    requests = []
+    for index in range(args.requests):
+        payload = payloads[index % len(payloads)]
+        if not args.identical:
+            payload = dict(payload)
+            payload["groupKey"] = f"{payload.get('groupKey')}-{index}"
+            payload["alerts"] = [
+                dict(alert, fingerprint=f"{alert.get('fingerprint')}-{index}")
+                for alert in payload.get("alerts", [])
+            ]
+        number = f"+33600{index % args.numbers:06d}"
+        if args.endpoint == "bulk":
+            body = [
+                {
+                    "number": f"+33600{(index + item) % args.numbers:06d}",
+                    "message": payload.get("title") or "loadgen",
+                }
+                for item in range(args.bulk_size)
+            ]
+            requests.append(("/send", json.dumps(body).encode()))
+            continue
+        if args.endpoint == "send":
+            body = {"message": payload.get("title") or "loadgen"}
+        else:
+            body = payload
+        requests.append((f"/{args.endpoint}/{number}", json.dumps(body).encode()))
+    return requests
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.status_codes = Counter()
+        # Result of every sms, as given in response data
+        self.sms = Counter()
+        self.dropped = 0
+        self.errors = Counter()
+
+    def record(self, latency: float, response: httpx.Response):
+        self.latencies.append(latency)
+        self.status_codes[response.status_code] += 1
+        try:
+            if response.headers.get("content-type") == "application/x-ndjson":
+                # Bulk /send results, one line per sms
+                data = {
+                    index: json.loads(line)
+                    for index, line in enumerate(response.text.splitlines())
+                }
+            else:
+                data = response.json().get("data") or {}
+        except ValueError:
+            data = {}
+        if not data and response.status_code >= 400:
+            self.dropped += 1
+        for result in data.values():
+            self.sms[f"{result['status_code']} {result['message']}"] += 1
+            if result["status_code"] >= 400:
+                self.dropped += 1
+
+    def percentile(self, percent: float) -> float:
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies) - 1, round(percent / 100 * len(latencies)))]
+
+    def report(self, elapsed: float) -> dict:
+        return {
+            "requests": len(self.latencies),
+            "errors": sum(self.errors.values()),
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(self.latencies) / elapsed, 1),
+            "latency_ms": {
+                name: round(self.percentile(percent) * 1000, 1)
+                for name, percent in (("p50", 50), ("p90", 90), ("p99", 99))
+            }
+            | {"max": round(max(self.latencies, default=0) * 1000, 1)},
+            "status_codes": dict(sorted(self.status_codes.items())),
+            "sms": dict(self.sms.most_common()),
+            "dropped": self.dropped,
+        }
+
+
+async def run_load(client: httpx.AsyncClient, requests: list, args) -> dict:
+    results = Results()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    auth = (args.username, args.password) if args.username else None
+
+    async def _request(path: str, body: bytes, scheduled: float):
+        try:
+            response = await client.post(
+                path,
+                content=body,
+                headers={"Content-Type": "application/json"},
+                auth=auth,
+            )
+            results.record(time.perf_counter() - scheduled, response)
+        except httpx.HTTPError as exc:
+            results.errors[type(exc).__name__] += 1
+        finally:
+            semaphore.release()
+
+    tasks = []
+    begin = time.perf_counter()
+    for index, (path, body) in enumerate(requests):
+        if args.rate:
+            scheduled = begin + index / args.rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await semaphore.acquire()
+        if not args.rate:
+            scheduled = time.perf_counter()
+        tasks.append(asyncio.create_task(_request(path, body, scheduled)))
+    await asyncio.gather(*tasks)
+    return results.report(time.perf_counter() - begin)
+
+
+async def run_in_process(requests: list, args) -> dict:
+    # The app reads its configuration file from command line when imported
+    sys.argv = [sys.argv[0], "-c", args.bench_config]
+    import grafana_webhook_api.api as api
+
+    async with api.lifespan(api.app):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://loadgen", timeout=args.timeout
+        ) as client:
+            return await run_load(client, requests, args)
+
+
+async def run_remote(requests: list, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, limits=limits
+    ) as client:
+        return await run_load(client, requests, args)
+
+
+def print_report(report: dict):
+    print(
+        f"{report['requests']} requests in {report['seconds']}s, "
+        f"{report['requests_per_second']} requests/s, {report['errors']} errors"
+    )
+    print(
+        "latency: "
+        + ", ".join(f"{name} {value}ms" for name, value in report["latency_ms"].items())
+    )
+    print(
+        "status codes: "
+        + ", ".join(
+            f"{code}: {count}" for code, count in report["status_codes"].items()
+        )
+    )
+    for result, count in report["sms"].items():
+        print(f"  sms {result}: {count}")
+    print(f"dropped sms: {report['dropped']}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Webhook load generator")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument(
+        "--rate", type=float, default=0, help="Requests per second, 0 for closed loop"
+    )
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--numbers", type=int, default=100, help="Distinct numbers")
+    parser.add_argument(
+        "--endpoint", choices=("grafana", "send", "bulk"), default="grafana"
+    )
+    parser.add_argument(
+        "--bulk-size", type=int, default=100, help="Messages per bulk request"
+    )
+    parser.add_argument("--identical", action="store_true")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument(
+        "--sms-command", help="Use this sms_command instead of the fake gateway"
+    )
+    parser.add_argument("--keep-rate-limits", action="store_true")
+    parser.add_argument(
+        "-c",
+        "--config-file",
+        default=os.path.join(ROOT_DIR, "grafana_webhook_api.conf"),
+    )
+    parser.add_argument("--write-config", help="Write a benchmark configuration file")
+    parser.add_argument("--url", help="Target a running server instead of in-process")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument(
+        "--samples", default=os.path.join(ROOT_DIR, "grafana-webhook-calls.txt")
+    )
+    parser.add_argument("--json", action="store_true", help="Print report as json")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    # Failed sends are logged as errors by the server, which is expected here
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    sms_command = args.sms_command or gateway_command(
+        args.latency, args.jitter, args.failure_rate
+    )
+    if args.write_config:
+        write_bench_config(
+            args.config_file, args.write_config, sms_command, args.keep_rate_limits
+        )
+        print(f"Benchmark configuration written to {args.write_config}")
+        sys.exit(0)
+
+    payloads = load_payloads(args.samples)
+    if not payloads:
+        sys.exit("No usable samples")
+    requests = build_requests(payloads, args)
+
+    if args.url:
+        report = asyncio.run(run_remote(requests, args))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            args.bench_config = os.path.join(directory, "bench.conf")
+            write_bench_config(
+                args.config_file, args.bench_config, sms_command, args.keep_rate_limits
+            )
+            report = asyncio.run(run_in_process(requests, args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.admission"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Adaptive admission control of the /grafana and /send endpoints
+Outstanding sms (queued, coalesced or being sent) are kept under a limit which follows
+delivery backend latency: while recent send latency stays within tolerance times its
+long term baseline, the limit grows by about its square root, and it shrinks with the
+latency ratio (down to half) when sends slow down or fail
+Low priority requests which would go over the limit are refused right away with a
+Retry-After estimating when the excess will have been sent, so callers back off instead
+of piling up requests behind a stuck modem. High priority requests are always admitted
+"""
+
+
+from typing import Optional, Callable
+import math
+import logging
+import threading
+from grafana_webhook_api.configuration import Config
+
+
+logger = logging.getLogger()
+
+# Recent and long term send latency averages
+SHORT_SMOOTHING = 0.1
+LONG_SMOOTHING = 0.01
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 4,
+        max_limit: int = 1000,
+        tolerance: float = 2,
+        smoothing: float = 0.2,
+        concurrency: int = 4,
+        max_retry_after: int = 300,
+    ):
+        self.min_limit = max(int(min_limit), 1)
+        self.max_limit = max(int(max_limit), self.min_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        # Sms sent at the same time, used to estimate when excess sms will be sent
+        self.concurrency = max(int(concurrency), 1)
+        self.max_retry_after = max_retry_after
+        # Returns outstanding sms, set once the send queue exists
+        self.get_load: Callable[[], int] = lambda: 0
+        # Latencies are observed by sender threads
+        self._lock = threading.Lock()
+        self._short_latency: Optional[float] = None
+        self._long_latency: Optional[float] = None
+        # Load seen by the last admission, the limit only grows when it is used
+        self._load = 0
+
+    def observe(self, latency: float, success: bool = True):
+        """
+        Adjust the limit after a delivery backend send
+        """
+        with self._lock:
+            if self._short_latency is None:
+                self._short_latency = self._long_latency = latency
+            self._short_latency += SHORT_SMOOTHING * (latency - self._short_latency)
+            self._long_latency += LONG_SMOOTHING * (latency - self._long_latency)
+            # Recover the baseline quickly once a slow period is over
+            if self._long_latency > 2 * self._short_latency:
+                self._long_latency *= 0.95
+            if not success:
+                gradient = 0.5
+            elif self._short_latency <= 0:
+                gradient = 1.0
+            else:
+                gradient = max(
+                    0.5,
+                    min(
+                        1.0,
+                        self.tolerance * self._long_latency / self._short_latency,
+                    ),
+                )
+            limit = self.limit
+            if gradient >= 1 and self._load < limit / 2:
+                # Not using the limit tells nothing about a higher one
+                return
+            new_limit = limit * gradient + math.sqrt(limit)
+            limit = limit * (1 - self.smoothing) + new_limit * self.smoothing
+            self.limit = min(max(limit, self.min_limit), self.max_limit)
+
+    def admit(self, priority: int, high_priority: int, cost: int = 1) -> Optional[int]:
+        """
+        Returns None when cost sms of priority are admitted, otherwise the number of
+        seconds to wait before retrying
+        """
+        load = self.get_load()
+        self._load = load
+        # A request bigger than the limit still goes through when nothing is outstanding
+        if priority >= high_priority or load == 0 or load + cost <= self.limit:
+            return None
+        excess = load + cost - self.limit
+        latency = self._short_latency or 1
+        retry_after = math.ceil(excess * latency / self.concurrency)
+        return min(max(retry_after, 1), self.max_retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "load": self._load,
+            "latency": self._short_latency,
+            "baseline_latency": self._long_latency,
+        }
+
+
+def admission_controller_from_config(config: Config) -> Optional[AdmissionController]:
+    """
+    Returns None when admission control is disabled
+    """
+    admission = config.admission
+    if not admission.enabled:
+        return None
+    logger.info(
+        "Admission control enabled, shedding priorities below %s",
+        config.priority.high_priority,
+    )
+    return AdmissionController(
+        initial_limit=admission.initial_limit,
+        min_limit=admission.min_limit,
+        max_limit=admission.max_limit,
+        tolerance=admission.tolerance,
+        smoothing=admission.smoothing,
+        concurrency=config.send_queue.workers,
+        max_retry_after=admission.max_retry_after,
+    )
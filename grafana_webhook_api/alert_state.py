@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.alert_state"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Bounded LRU / TTL store of the alert states already sent per Grafana alert group
+Grafana notifies whole groups, so when one alert of a group changes, all of them are
+sent again. Remembering the status of every alert fingerprint per group and recipients
+allows sending only alerts which are newly firing or newly resolved
+
+Groups are forgotten ttl seconds after their last send, so unchanged alerts are then sent
+again as a reminder
+"""
+
+
+from typing import Optional, List, Dict
+import time
+import logging
+from collections import OrderedDict
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.models import AlertMessage
+from grafana_webhook_api.metrics import ALERT_STATE
+
+
+logger = logging.getLogger()
+
+
+class _GroupState:
+    __slots__ = ("statuses", "expiry")
+
+    def __init__(self, statuses: Dict[str, Optional[str]], expiry: float):
+        # fingerprint: status
+        self.statuses = statuses
+        self.expiry = expiry
+
+
+class AlertStateStore:
+    def __init__(self, max_size: int = 10000, ttl: int = 86400):
+        self.max_size = max(int(max_size), 1)
+        self.ttl = ttl
+        # key: _GroupState, ordered by last send, so also by expiry since ttl is constant
+        self._groups = OrderedDict()
+
+    @staticmethod
+    def key(numbers: List[str], alert: AlertMessage) -> str:
+        return f"{alert.groupKey}|{';'.join(numbers)}"
+
+    def _evict(self, now: float):
+        while self._groups:
+            group = next(iter(self._groups.values()))
+            if group.expiry > now:
+                break
+            self._groups.popitem(last=False)
+
+    def changes(self, key: str, alert: AlertMessage) -> Optional[list]:
+        """
+        Sub alerts whose status differs from the last one sent for this group, alerts
+        without fingerprint always being part of them
+        Returns None when no alert has a fingerprint, in which case we can't tell changes
+        """
+        if not any(sub_alert.fingerprint for sub_alert in alert.alerts):
+            return None
+        self._evict(time.monotonic())
+        group = self._groups.get(key)
+        if group is None:
+            changed = alert.alerts
+        else:
+            statuses = group.statuses
+            changed = [
+                sub_alert
+                for sub_alert in alert.alerts
+                if not sub_alert.fingerprint
+                or statuses.get(sub_alert.fingerprint, False) != sub_alert.status
+            ]
+        ALERT_STATE.inc(len(changed), result="changed")
+        ALERT_STATE.inc(len(alert.alerts) - len(changed), result="unchanged")
+        return changed
+
+    def remember(self, key: str, alert: AlertMessage):
+        """
+        Record alert as sent, the group state becomes the one of this notification, since
+        Grafana always gives every alert of a group
+        """
+        self._groups.pop(key, None)
+        self._groups[key] = _GroupState(
+            {
+                sub_alert.fingerprint: sub_alert.status
+                for sub_alert in alert.alerts
+                if sub_alert.fingerprint
+            },
+            time.monotonic() + self.ttl,
+        )
+        if len(self._groups) > self.max_size:
+            self._groups.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._groups)}
+
+
+def alert_state_store_from_config(config: Config) -> Optional[AlertStateStore]:
+    """
+    Returns None when only sending changed alerts is disabled
+    """
+    if not config.alert_state.enabled:
+        return None
+    logger.info("Only sending alerts whose state changed")
+    return AlertStateStore(
+        max_size=config.alert_state.max_size, ttl=config.alert_state.ttl
+    )
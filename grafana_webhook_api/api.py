@@ -7,84 +7,191 @@ __intname__ = "grafana_webhook_api.api"
 __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2023-2026 NetInvent"
 __license__ = "BSD-3 Clause"
-__build__ = "2026013101"
-__version__ = "2.0.0"
+__build__ = "2026101801"
+__version__ = "2.1.0"
 __appname__ = "Grafana Alerts to commands"
 
 
-from typing import Optional
+from typing import Optional, List, Dict, Tuple, Union
+import time
+import json
+import asyncio
 import logging
-import secrets
-from argparse import ArgumentParser
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, status, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import HTTPBasic
+from fastapi.concurrency import run_in_threadpool
 from fastapi_offline import FastAPIOffline
+from pydantic import ValidationError
 from grafana_webhook_api import configuration
-from grafana_webhook_api.models import AlertMessage, Message
+from grafana_webhook_api.auth import ANONYMOUS, User
+from grafana_webhook_api.models import (
+    AlertMessage,
+    Message,
+    PayloadError,
+    BulkPayloadError,
+    parse_alert_message,
+    parse_bulk_messages,
+    alert_message_request_body,
+    bulk_messages_request_body,
+    with_alerts,
+)
 from grafana_webhook_api.sms import send_sms
-
-# Make sure we load given config files again
-parser = ArgumentParser()
-parser.add_argument(
-    "-c",
-    "--config-file",
-    dest="config_file",
-    type=str,
-    default=None,
-    required=False,
-    help="Path to grafana_webhook_api.conf file",
+from grafana_webhook_api.runtime import (
+    STATE_STORE,
+    DELIVERY_TRACKER,
+    ADMISSION,
+    get_runtime,
+    watch_config,
+    install_reload_signal,
 )
-args = parser.parse_args()
-if args.config_file:
-    config_dict = configuration.load_config(args.config_file)
-else:
-    config_dict = configuration.load_config()
+from grafana_webhook_api.dispatcher import SendQueueFull, send_queue_from_config
+from grafana_webhook_api.journal import RETRYING, durable_queue_from_config
+from grafana_webhook_api.coalesce import coalescer_from_config
+from grafana_webhook_api.dedup import dedup_cache_from_config
+from grafana_webhook_api.alert_state import alert_state_store_from_config
+from grafana_webhook_api.logs import logging_from_config
+from grafana_webhook_api.metrics import (
+    REGISTRY,
+    QUEUE_DEPTH,
+    ADMISSION_LIMIT,
+    COALESCE_PENDING,
+    RENDER_SECONDS,
+    DROPPED,
+    DELIVERY_PENDING,
+    MetricsMiddleware,
+    observe_parse,
+    worker_snapshots_from_config,
+)
+
+# Configuration is loaded once from the file given on command line
+config = configuration.get_config()
 
 logger = logging.getLogger()
 
+# All sms are sent from a worker pool so we never block the event loop
+worker_queue = send_queue_from_config(
+    config, send_sms, get_tenants=lambda: get_runtime().tenants
+)
+# Optionally journal sms before sending them, so they survive failures and restarts
+send_queue = durable_queue_from_config(config, worker_queue) or worker_queue
+# Optionally merge messages to the same number before queuing them
+coalescer = coalescer_from_config(config, send_queue)
+# Already handled grafana notifications
+dedup_cache = dedup_cache_from_config(config)
+# Alert states already sent per alert group, so only changes are sent
+alert_states = alert_state_store_from_config(config)
+# Optionally share metrics between server workers
+metrics_snapshots = worker_snapshots_from_config(config)
+
+QUEUE_DEPTH.set_function(lambda: send_queue.depth)
+if coalescer:
+    COALESCE_PENDING.set_function(lambda: coalescer.pending)
+
+
+def resend_failed(delivery):
+    """
+    Sms reported failed by gammu-smsd are journaled again, so resends survive restarts
+    They already went through rate limits, which send_sms skips for resends
+    """
+    send_queue.submit(
+        delivery.number,
+        delivery.message,
+        group=delivery.group,
+        priority=delivery.priority,
+        tenant=delivery.tenant,
+        delivery_attempt=delivery.attempt + 1,
+    )
+
+
+if DELIVERY_TRACKER:
+    DELIVERY_TRACKER.resend = resend_failed
+    DELIVERY_PENDING.set_function(lambda: DELIVERY_TRACKER.pending)
 
-app = FastAPIOffline()
-security = HTTPBasic()
+if ADMISSION:
+    # Outstanding sms: queued, being sent, or waiting for the coalescing window
+    ADMISSION.get_load = lambda: (
+        worker_queue.depth
+        + worker_queue.in_flight
+        + (coalescer.pending if coalescer else 0)
+    )
+    ADMISSION_LIMIT.set_function(lambda: ADMISSION.limit)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Started here, so every server worker gets its own log listener thread
+    queued_logging = logging_from_config(config)
+    await send_queue.start()
+    install_reload_signal()
+    # Picks up configuration changes made while the app was loaded, eg before gunicorn forked us
+    await asyncio.get_running_loop().run_in_executor(None, configuration.reload_config)
+    config_watcher = asyncio.create_task(watch_config())
+    if metrics_snapshots:
+        metrics_writer = asyncio.create_task(metrics_snapshots.run())
+    if DELIVERY_TRACKER:
+        delivery_reports = asyncio.create_task(DELIVERY_TRACKER.run())
+    yield
+    config_watcher.cancel()
+    if metrics_snapshots:
+        metrics_writer.cancel()
+    if DELIVERY_TRACKER:
+        delivery_reports.cancel()
+    if coalescer:
+        coalescer.flush_all()
+    await send_queue.stop()
+    if queued_logging:
+        queued_logging.stop()
+
+
+app = FastAPIOffline(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+class BasicAuthorization(HTTPBasic):
+    """
+    Documented as HTTP basic authentication, but returns the raw Authorization header
+    so already validated headers are recognized without decoding them
+    """
 
-# Timestamp of last time we sent an sms, per number
-LAST_SENT_TIMESTAMP = {}
+    async def __call__(self, request: Request) -> Optional[str]:
+        return request.headers.get("Authorization")
 
 
-def anonymous_auth():
-    return "anonymous"
+security = BasicAuthorization(scheme_name="HTTPBasic", auto_error=False)
 
 
-def get_current_username(credentials: HTTPBasicCredentials = Depends(security)):
-    current_username_bytes = credentials.username.encode("utf8")
-    correct_username_bytes = config_dict["http_server"]["username"].encode("utf-8")
-    is_correct_username = secrets.compare_digest(
-        current_username_bytes, correct_username_bytes
-    )
-    current_password_bytes = credentials.password.encode("utf8")
-    correct_password_bytes = config_dict["http_server"]["password"].encode("utf-8")
-    is_correct_password = secrets.compare_digest(
-        current_password_bytes, correct_password_bytes
-    )
-    if not (is_correct_username and is_correct_password):
+async def get_current_user(authorization: Optional[str] = Depends(security)) -> User:
+    credentials = get_runtime().credentials
+    user = credentials.cached(authorization) if authorization else None
+    if user is None and authorization:
+        # Password hashes are slow on purpose, keep them off the event loop
+        user = await run_in_threadpool(credentials.verify, authorization)
+        if user is not None:
+            credentials.remember(authorization, user)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Basic"},
         )
-    return credentials.username
+    return user
 
 
-try:
-    if config_dict["http_server"]["no_auth"] is True:
-        logger.warning("Running without HTTP authentication")
-        auth_scheme = anonymous_auth
-    else:
-        logger.info("Running with HTTP authentication")
-        auth_scheme = get_current_username
-except (KeyError, AttributeError, TypeError):
-    auth_scheme = get_current_username
+async def auth_scheme(authorization: Optional[str] = Depends(security)) -> User:
+    """
+    no_auth is read from current configuration so it can change on reload
+    """
+    if get_runtime().config.http_server.no_auth:
+        return ANONYMOUS
+    return await get_current_user(authorization)
+
+
+if config.http_server.no_auth:
+    logger.warning("Running without HTTP authentication")
+else:
     logger.info("Running with HTTP authentication")
 
 
@@ -102,133 +209,399 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
-@app.get("/")
-async def api_root(auth=Depends(get_current_username)):
-    return {"app": __appname__}
+async def enqueue_sms(
+    number: str,
+    message: str,
+    group: Optional[str] = None,
+    priority: int = 0,
+    tenant: Optional[str] = None,
+) -> Union[asyncio.Future, dict]:
+    """
+    Queue a sms, returns the future of its send result, or its result when it could not
+    be queued
+    """
+    try:
+        if coalescer:
+            future = coalescer.submit(
+                number, message, group=group, priority=priority, tenant=tenant
+            )
+        else:
+            # Returns once the sms is journaled when the journal is enabled
+            future = await send_queue.enqueue(
+                number, message, group=group, priority=priority, tenant=tenant
+            )
+    except SendQueueFull as exc:
+        logger.error(f"Cannot queue text to {number}: {exc}")
+        DROPPED.inc(reason="queue_full")
+        return {"status_code": 503, "message": "Send queue full, cannot send text"}
+    except Exception as exc:
+        logger.error(f"Cannot journal text to {number}: {exc}")
+        DROPPED.inc(reason="journal_error")
+        return {"status_code": 503, "message": "Cannot journal text"}
+    return future
 
 
-@app.post("/grafana/{numbers}")
-@app.post("/grafana/{numbers}/{min_interval}")
-@app.post("/grafana/{numbers}/{min_interval}/{group}")
-async def grafana(
-    numbers: str,
-    min_interval: Optional[int] = None,
-    group: Optional[str] = "yes",
-    alert: AlertMessage = None,
-    auth=Depends(auth_scheme),
-):
-    global LAST_SENT_TIMESTAMP
+async def sms_result(future: asyncio.Future) -> dict:
+    """
+    Wait for the result of a queued sms unless async responses are configured
+    """
+    if get_runtime().config.send_queue.async_response:
+        return {"status_code": 202, "message": "Message queued"}
+    result = await future
+    if result == RETRYING:
+        return {"status_code": 202, "message": "Cannot send text yet, will retry"}
+    if not result:
+        return {"status_code": 402, "message": "Cannot send text"}
+    return {"status_code": 200, "message": "Message sent"}
 
-    if not numbers:
-        raise HTTPException(status_code=404, detail="No phone number set")
 
-    if not alert or not alert.message:
-        raise HTTPException(status_code=404, detail="No alert set")
-    logger.debug(f"Alert\n{alert}")
+def overloaded(priority: int, cost: int) -> Optional[JSONResponse]:
+    """
+    HTTP 429 answer with Retry-After when admission control refuses cost sms of priority
+    """
+    if not ADMISSION:
+        return None
+    retry_after = ADMISSION.admit(
+        priority, get_runtime().priorities.high_priority, cost=cost
+    )
+    if retry_after is None:
+        return None
+    DROPPED.inc(cost, reason="overload")
+    logger.warning(
+        "Overloaded, refusing %s sms of priority %s, retry after %ss",
+        cost,
+        priority,
+        retry_after,
+    )
+    content = {
+        "status_code": 429,
+        "message": "Too many sms waiting to be sent, retry later",
+        "data": None,
+    }
+    return JSONResponse(
+        content=content,
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(retry_after)},
+    )
 
-    # Multiple numbers with ';' are accepted
-    numbers = numbers.split(";")
 
-    # Escape single quotes here so we will stay in line
-    try:
-        title = alert.title.replace("'", r"-")
-    except KeyError:
-        title = ""
+async def queue_sms(
+    number: str,
+    message: str,
+    group: Optional[str] = None,
+    priority: int = 0,
+    tenant: Optional[str] = None,
+) -> dict:
+    """
+    Queue a sms, and wait for the result unless async responses are configured
+    """
+    future = await enqueue_sms(
+        number, message, group=group, priority=priority, tenant=tenant
+    )
+    if isinstance(future, dict):
+        return future
+    return await sms_result(future)
+
+
+async def queue_sms_to_numbers(
+    numbers: List[str],
+    message: str,
+    group: Optional[str] = None,
+    priority: int = 0,
+    tenant: Optional[str] = None,
+) -> dict:
+    """
+    Send the same message to all numbers concurrently, up to max_parallel_sends at a time
+    Returns the result of every number
+    """
+    semaphore = asyncio.Semaphore(get_runtime().config.send_queue.max_parallel_sends)
 
-    try:
-        orgId = str(alert.orgId).replace("'", r"-")
-    except (KeyError, AttributeError, ValueError, TypeError):
-        orgId = ""
+    async def _queue_sms(number: str) -> dict:
+        async with semaphore:
+            return await queue_sms(
+                number, message, group=group, priority=priority, tenant=tenant
+            )
 
-    try:
-        externalURL = alert.externalURL.replace("'", r"-")
-    except KeyError:
-        externalURL = ""
+    results = await asyncio.gather(*[_queue_sms(number) for number in numbers])
+    return dict(zip(numbers, results))
 
-    try:
-        message = alert.message.replace("'", r"-")
-    except KeyError:
-        message = ""
 
-    try:
-        supervision_name = config_dict["supervision_name"]
-    except KeyError:
-        supervision_name = "Supervision"
+def numbers_response(data: dict) -> JSONResponse:
+    """
+    Result of every number is found in data, global status code is 207 if results differ
+    """
+    messages = {}
+    for number, result in data.items():
+        messages.setdefault(result["message"], []).append(number)
+    status_codes = {result["status_code"] for result in data.values()}
+    if len(status_codes) == 1:
+        status_code = status_codes.pop()
+    else:
+        status_code = status.HTTP_207_MULTI_STATUS
+    message = "; ".join(
+        "{} to: {}".format(result_message, ", ".join(result_numbers))
+        for result_message, result_numbers in messages.items()
+    )
+    content = {
+        "status_code": status_code,
+        "message": message,
+        "data": data,
+    }
+    return JSONResponse(content=content, status_code=status_code)
+
+
+async def suppress_numbers(
+    numbers: List[str], suppression_group: str, min_interval: int
+) -> List[str]:
+    """
+    Suppression index lookup for client side min_interval, done before any alert formatting
+    Returns numbers that are not suppressed, and suppresses them for min_interval seconds
+    """
+    if STATE_STORE.shared:
+        # Shared state store does disk I/O, keep it off the event loop
+        return await run_in_threadpool(
+            lambda: [
+                number
+                for number in numbers
+                if STATE_STORE.suppress(number, suppression_group, min_interval)
+            ]
+        )
+    return [
+        number
+        for number in numbers
+        if STATE_STORE.suppress(number, suppression_group, min_interval)
+    ]
+
 
+def get_suppression_group(group: Optional[str], alert: AlertMessage) -> str:
+    """
+    group path parameter: yes (default) applies min_interval per number and alert group,
+    no applies it per number only, anything else is used as group name
+    """
+    if group is None or group.lower() in ("yes", "true"):
+        return alert.groupKey
+    if group.lower() in ("no", "false"):
+        return ""
+    return group
+
+
+def split_numbers(numbers: str) -> List[str]:
+    """
+    Multiple numbers with ';' are accepted
+    Escape single quotes here so we will stay in line, and drop empty or duplicate numbers
+    """
+    numbers_list = []
+    for number in numbers.split(";"):
+        number = number.strip().replace("'", r"-")
+        if number and number not in numbers_list:
+            numbers_list.append(number)
+    return numbers_list
+
+
+async def read_alert(request: Request) -> Optional[AlertMessage]:
+    """
+    The fast parser returns an AlertMessageView, only decoding fields we use
+    """
+    body = await request.body()
+    if not body:
+        return None
     try:
-        extracted_alerts = {}
-        # Alert may not contain sub alerts
-        try:
-            for i in range(0, len(alert.alerts)):
-                """
-                try:
-                    extracted_alerts[i] = "Alert: {}\n".format(
-                        alert.alerts[i].labels["alertname"]
-                    )
-                except KeyError:
-                    pass
-                try:
-                    extracted_alerts[i] += "Rule: {}\n".format(
-                        alert.alerts[i].labels["rulename"]
-                    )
-                except KeyError:
-                    pass
-                try:
-                    extracted_alerts[i] += "Instance: {}\n".format(
-                        alert.alerts[i].labels["instance"]
-                    )
-                except KeyError:
-                    pass
-                try:
-                    extracted_alerts[i] += "Job: {}\n".format(
-                        alert.alerts[i].labels["job"]
-                    )
-                except KeyError:
-                    pass
-                """
-                extracted_alerts[i] = f"ALERT {alert.alerts[i].status}:\n"
-                for label, content in alert.alerts[i].labels.items():
-                    extracted_alerts[i] += f"- {label}={content}\n"
-                if extracted_alerts[i] is None:
-                    extracted_alerts[i] = f"Cannot parse alert. See {__appname__} code"
-        except (KeyError, AttributeError, TypeError, IndexError) as exc:
-            logger.debug(f"Sub alert message extraction failed: {exc}", exc_info=True)
+        if get_runtime().config.http_server.fast_parsing:
+            return parse_alert_message(body)
+        return AlertMessage.model_validate_json(body)
+    except PayloadError as exc:
+        raise RequestValidationError(exc.errors())
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [
+                dict(error, loc=("body", *error["loc"]))
+                for error in exc.errors(include_url=False)
+            ]
+        )
 
+
+UNCHANGED_RESULT = {"status_code": 200, "message": "No alert state change"}
+
+
+async def queue_alert(
+    alert: AlertMessage, numbers: List[str], user: User
+) -> Dict[str, dict]:
+    """
+    Render alert once and queue it to numbers
+    """
+    if not numbers:
+        return {}
+    runtime = get_runtime()
+    begin = time.perf_counter()
+    alert_message = runtime.template.fit(alert, runtime.segmenter)
+    RENDER_SECONDS.observe(time.perf_counter() - begin)
+    return await queue_sms_to_numbers(
+        numbers,
+        alert_message,
+        group=alert.groupKey,
+        priority=user.priority(runtime.priorities.priority(alert)),
+        # Grafana organizations are tenants
+        tenant=str(alert.orgId),
+    )
+
+
+async def send_alert(
+    alert: AlertMessage,
+    deliveries: List[Tuple[AlertMessage, List[str]]],
+    min_interval: Optional[int],
+    group: Optional[str],
+    user: User,
+) -> JSONResponse:
+    """
+    deliveries are (alert, numbers), alert being the whole alert or the sub alerts
+    routed to numbers
+    Duplicate detection and client side min_interval apply to all numbers
+    """
+    numbers = []
+    for _, sub_numbers in deliveries:
+        numbers += [number for number in sub_numbers if number not in numbers]
+
+    # Identical notifications (HA replicas, repeat intervals) are answered right away
+    dedup_key = dedup_cache.key(numbers, alert) if dedup_cache else None
+    if dedup_key and dedup_cache.seen(dedup_key):
+        logger.info(
+            "Duplicate alert %s for numbers %s, already handled",
+            alert.title,
+            ", ".join(numbers),
+        )
+        content = {
+            "status_code": 200,
+            "message": "Duplicate alert, already handled for: {}".format(
+                ", ".join(numbers)
+            ),
+            "data": None,
+        }
+        return JSONResponse(content=content, status_code=status.HTTP_200_OK)
+
+    unchanged_numbers = []
+    # (state key, alert, numbers) of changed alerts, remembered once sent
+    sent_states = []
+    if alert_states:
+        changed_deliveries = []
+        for sub_alert, sub_numbers in deliveries:
+            state_key = alert_states.key(sub_numbers, sub_alert)
+            changed = alert_states.changes(state_key, sub_alert)
+            if changed is None:
+                changed_deliveries.append((sub_alert, sub_numbers))
+                continue
+            if not changed:
+                unchanged_numbers += sub_numbers
+                continue
+            sent_states.append((state_key, sub_alert, sub_numbers))
+            if len(changed) < len(sub_alert.alerts):
+                sub_alert = with_alerts(sub_alert, changed)
+            changed_deliveries.append((sub_alert, sub_numbers))
+        if unchanged_numbers:
+            logger.info(
+                "No state change of alert %s for numbers %s",
+                alert.title,
+                ", ".join(unchanged_numbers),
+            )
+            if not changed_deliveries:
+                return numbers_response(
+                    {number: UNCHANGED_RESULT for number in unchanged_numbers}
+                )
+            numbers = [number for number in numbers if number not in unchanged_numbers]
+        deliveries = changed_deliveries
+
+    if ADMISSION:
+        runtime = get_runtime()
+        response = overloaded(
+            max(
+                user.priority(runtime.priorities.priority(sub_alert))
+                for sub_alert, _ in deliveries
+            ),
+            len(numbers),
+        )
+        if response:
+            # Let Grafana retries through
+            if dedup_key:
+                dedup_cache.discard(dedup_key)
+            return response
+
+    suppression_group = None
+    suppressed_numbers = []
+    if min_interval:
+        suppression_group = get_suppression_group(group, alert)
+        allowed_numbers = await suppress_numbers(
+            numbers, suppression_group, min_interval
+        )
+        suppressed_numbers = [
+            number for number in numbers if number not in allowed_numbers
+        ]
+        if suppressed_numbers:
+            DROPPED.inc(len(suppressed_numbers), reason="min_interval")
+            logger.info(
+                "Client side min_interval %ss not reached for numbers %s",
+                min_interval,
+                ", ".join(suppressed_numbers),
+            )
+        if not allowed_numbers:
+            return numbers_response(
+                {
+                    number: {
+                        "status_code": 200,
+                        "message": "Suppressed by client side min_interval",
+                    }
+                    for number in suppressed_numbers
+                }
+            )
+        numbers = allowed_numbers
+
+    runtime = get_runtime()
+
+    try:
         # Preflight check
-        try:
-            config_dict["sms_command"]
-        except KeyError:
-            logger.error("No sms commandline tool defined")
+        if not runtime.delivery_backend:
+            logger.error("No sms delivery backend defined")
             raise HTTPException(status_code=500, detail="Server not configured")
 
-        alert_header = "{} org {}: {}".format(supervision_name, orgId, title)
-        if extracted_alerts:
-            alert_message = alert_header
-            for i in range(0, len(extracted_alerts)):
-                alert_message += f"\n{extracted_alerts[i]}"
-        else:
-            alert_message = alert_header + f"\n{message}"
-
         # Send alerts
-        for number in numbers:
-            number = number.replace("'", r"-")
-            logger.info("Received alert {} for number {}".format(title, number))
-            result = send_sms(number, alert_message)
-            if not result:
-                content = {
-                    "status_code": 402,
-                    "message": "Cannot send text to: {}".format(number),
-                    "data": None,
-                }
-                return JSONResponse(
-                    content=content, status_code=status.HTTP_402_PAYMENT_REQUIRED
+        logger.info(
+            "Received alert %s from %s for numbers %s",
+            alert.title,
+            user.name,
+            ", ".join(numbers),
+        )
+        allowed_numbers = set(numbers)
+        data = {}
+        for results in await asyncio.gather(
+            *[
+                queue_alert(
+                    sub_alert,
+                    [number for number in sub_numbers if number in allowed_numbers],
+                    user,
                 )
-            content = {
+                for sub_alert, sub_numbers in deliveries
+            ]
+        ):
+            data.update(results)
+        for state_key, sub_alert, sub_numbers in sent_states:
+            if all(
+                number in data and data[number]["status_code"] < 400
+                for number in sub_numbers
+            ):
+                alert_states.remember(state_key, sub_alert)
+        for number, result in data.items():
+            if suppression_group is not None and result["status_code"] >= 400:
+                STATE_STORE.release(number, suppression_group)
+        for number in suppressed_numbers:
+            data[number] = {
                 "status_code": 200,
-                "message": "Message sent to: {}".format(number),
-                "data": None,
+                "message": "Suppressed by client side min_interval",
             }
-            return JSONResponse(content=content, status_code=status.HTTP_200_OK)
+        for number in unchanged_numbers:
+            data[number] = UNCHANGED_RESULT
+        response = numbers_response(data)
+        # Let Grafana retries through when we could not send anything
+        if dedup_key and response.status_code >= 400:
+            dedup_cache.discard(dedup_key)
+        return response
 
     except Exception as exc:
         exc_str = f"Exception {exc} occured"
@@ -236,8 +609,117 @@ async def grafana(
         raise HTTPException(status_code=500, detail=exc_str)
 
 
+@app.get("/")
+async def api_root(user: User = Depends(auth_scheme)):
+    return {"app": __appname__}
+
+
+@app.get("/metrics")
+async def metrics(auth=Depends(auth_scheme)):
+    """
+    Prometheus text format, summed over all workers when metrics:directory is set
+    """
+    if not get_runtime().config.metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    snapshots = None
+    if metrics_snapshots:
+        snapshots = await run_in_threadpool(metrics_snapshots.read_others)
+    return PlainTextResponse(
+        REGISTRY.expose(snapshots), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/deliveries")
+async def deliveries_summary(auth=Depends(auth_scheme)):
+    """
+    Tracked sms count by gammu-smsd delivery report status
+    """
+    if not DELIVERY_TRACKER:
+        raise HTTPException(status_code=404, detail="Delivery reports disabled")
+    return DELIVERY_TRACKER.stats()
+
+
+@app.get("/deliveries/{number}")
+async def deliveries(number: str, limit: int = 100, auth=Depends(auth_scheme)):
+    """
+    Last sms sent to number with their gammu-smsd delivery report status, newest first
+    """
+    if not DELIVERY_TRACKER:
+        raise HTTPException(status_code=404, detail="Delivery reports disabled")
+    return DELIVERY_TRACKER.deliveries(number, limit=limit)
+
+
+# Payloads are read by the endpoint, so they are documented here
+ALERT_REQUEST_BODY = alert_message_request_body()
+
+
+@app.post("/grafana/{numbers}", openapi_extra=ALERT_REQUEST_BODY)
+@app.post("/grafana/{numbers}/{min_interval}", openapi_extra=ALERT_REQUEST_BODY)
+@app.post("/grafana/{numbers}/{min_interval}/{group}", openapi_extra=ALERT_REQUEST_BODY)
+async def grafana(
+    request: Request,
+    numbers: str,
+    min_interval: Optional[int] = None,
+    group: Optional[str] = "yes",
+    user: User = Depends(auth_scheme),
+):
+    alert = await read_alert(request)
+    observe_parse(request.scope)
+    if not numbers:
+        raise HTTPException(status_code=404, detail="No phone number set")
+
+    if not alert or not alert.message:
+        raise HTTPException(status_code=404, detail="No alert set")
+    # Only formatted when debug logging is enabled
+    logger.debug("Alert\n%s", alert)
+
+    numbers = split_numbers(numbers)
+    if not numbers:
+        raise HTTPException(status_code=404, detail="No phone number set")
+
+    return await send_alert(alert, [(alert, numbers)], min_interval, group, user)
+
+
+@app.post("/grafana", openapi_extra=ALERT_REQUEST_BODY)
+async def grafana_routed(
+    request: Request,
+    min_interval: Optional[int] = None,
+    group: Optional[str] = "yes",
+    user: User = Depends(auth_scheme),
+):
+    """
+    Numbers are given by routing rules matching alert labels
+    min_interval and group may be given as query parameters
+    """
+    alert = await read_alert(request)
+    observe_parse(request.scope)
+    if not alert or not alert.message:
+        raise HTTPException(status_code=404, detail="No alert set")
+    logger.debug("Alert\n%s", alert)
+
+    router = get_runtime().router
+    if not router:
+        raise HTTPException(status_code=404, detail="No routing rules configured")
+    deliveries = router.route(alert)
+    if not deliveries:
+        logger.info("No route for alert %s", alert.title)
+        content = {
+            "status_code": 200,
+            "message": "No route for this alert",
+            "data": None,
+        }
+        return JSONResponse(content=content, status_code=status.HTTP_200_OK)
+    return await send_alert(alert, deliveries, min_interval, group, user)
+
+
 @app.post("/send/{numbers}")
-async def grafana(numbers: str, message: Message = None, auth=Depends(auth_scheme)):
+async def grafana(
+    request: Request,
+    numbers: str,
+    message: Message = None,
+    user: User = Depends(auth_scheme),
+):
+    observe_parse(request.scope)
 
     if not numbers:
         raise HTTPException(status_code=404, detail="No phone number set")
@@ -246,30 +728,127 @@ async def grafana(numbers: str, message: Message = None, auth=Depends(auth_schem
     if not message.message:
         raise HTTPException(status_code=404, detail="No message content")
 
+    numbers = split_numbers(numbers)
+    if not numbers:
+        raise HTTPException(status_code=404, detail="No phone number set")
+
     try:
-        logger.debug(f"Message: {message}")
-        # Multiple numbers with ';' are accepted
-        numbers = numbers.split(";")
-        for number in numbers:
-            number = number.replace("'", r"-")
-            logger.info("Received direct send request for number {}".format(number))
-            result = send_sms(number, message.message)
-            if not result:
-                content = {
-                    "status_code": 402,
-                    "message": "Cannot send text to: {}".format(number),
-                    "data": None,
-                }
-                return JSONResponse(
-                    content=content, status_code=status.HTTP_402_PAYMENT_REQUIRED
-                )
-            content = {
-                "status_code": 200,
-                "message": "Message sent to: {}".format(number),
-                "data": None,
-            }
-            return JSONResponse(content=content, status_code=status.HTTP_200_OK)
+        logger.debug("Message: %s", message)
+        logger.info("Received direct send request for numbers %s", ", ".join(numbers))
+        priority = user.default_priority
+        if priority is None:
+            priority = get_runtime().priorities.default
+        priority = user.priority(priority)
+        response = overloaded(priority, len(numbers))
+        if response:
+            return response
+        data = await queue_sms_to_numbers(
+            numbers,
+            message.message,
+            priority=priority,
+            tenant=user.tenant,
+        )
+        return numbers_response(data)
     except Exception as exc:
         exc_str = f"Exception {exc} occured"
         logger.error(exc_str, exc_info=True)
         raise HTTPException(status_code=500, detail=exc_str)
+
+
+# Bulk payloads are read by the endpoint, so they are documented here
+BULK_REQUEST_BODY = bulk_messages_request_body()
+
+
+@app.post("/send", openapi_extra=BULK_REQUEST_BODY)
+async def send_bulk(request: Request, user: User = Depends(auth_scheme)):
+    """
+    Many messages in a single request, as a JSON array or NDJSON of
+    {number or numbers, message, priority} items
+    All items are validated, then all sms are queued at once
+    Results are streamed as NDJSON, one line per sms as soon as it is handled, with the
+    index of its item
+    """
+    body = await request.body()
+    try:
+        messages = parse_bulk_messages(body)
+    except BulkPayloadError as exc:
+        raise RequestValidationError(exc.errors())
+    observe_parse(request.scope)
+
+    sends = []
+    errors = []
+    for index, message in enumerate(messages):
+        numbers = split_numbers(";".join(message.all_numbers()))
+        if not numbers:
+            errors.append(
+                {
+                    "type": "value_error",
+                    "loc": ("body", index, "numbers"),
+                    "msg": "No phone number set",
+                    "input": None,
+                }
+            )
+        sends += [(index, number, message) for number in numbers]
+    if errors:
+        raise RequestValidationError(errors)
+    if not sends:
+        raise HTTPException(status_code=404, detail="No message set")
+
+    runtime = get_runtime()
+    max_bulk_items = runtime.config.send_queue.max_bulk_items
+    if max_bulk_items and len(sends) > max_bulk_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many sms in a single request, maximum is {max_bulk_items}",
+        )
+
+    logger.info(
+        "Received bulk send request of %s messages for %s sms",
+        len(messages),
+        len(sends),
+    )
+    default_priority = user.default_priority
+    if default_priority is None:
+        default_priority = runtime.priorities.default
+    priorities = [
+        user.priority(
+            default_priority if message.priority is None else message.priority
+        )
+        for _, _, message in sends
+    ]
+    # Refused as a whole unless some sms are high priority
+    response = overloaded(max(priorities), len(sends))
+    if response:
+        return response
+    # Journal writes of concurrent enqueues are grouped into a single commit
+    queued = await asyncio.gather(
+        *[
+            enqueue_sms(
+                number,
+                message.message,
+                priority=priority,
+                tenant=user.tenant,
+            )
+            for (_, number, message), priority in zip(sends, priorities)
+        ]
+    )
+
+    async def _result(index: int, number: str, future: asyncio.Future) -> tuple:
+        return index, number, await sms_result(future)
+
+    def _line(index: int, number: str, result: dict) -> bytes:
+        return (json.dumps({"index": index, "number": number, **result}) + "\n").encode(
+            "utf-8"
+        )
+
+    async def _results():
+        pending = []
+        for (index, number, _), future in zip(sends, queued):
+            if isinstance(future, dict):
+                yield _line(index, number, future)
+            else:
+                pending.append(_result(index, number, future))
+        for result in asyncio.as_completed(pending):
+            yield _line(*await result)
+
+    return StreamingResponse(_results(), media_type="application/x-ndjson")
@@ -0,0 +1,226 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.auth"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+HTTP basic authentication credential store, built once per configuration
+Only password digests are kept. Authorization headers which were already validated are
+remembered under a keyed digest, so most requests are authenticated by a single
+dictionary lookup instead of base64 decoding and password hashing
+
+Password hashes can be generated with: python -m grafana_webhook_api.auth
+"""
+
+
+from typing import Optional, Dict
+import os
+import base64
+import hashlib
+import hmac
+import logging
+from collections import OrderedDict
+from grafana_webhook_api.configuration import Config
+
+
+logger = logging.getLogger()
+
+HASH_ALGORITHM = "pbkdf2_sha256"
+HASH_ITERATIONS = 600000
+
+
+def hash_password(password: str, iterations: int = HASH_ITERATIONS) -> str:
+    """
+    Returns pbkdf2_sha256$iterations$salt$hash, salt and hash being base64 encoded
+    """
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return "{}${}${}${}".format(
+        HASH_ALGORITHM,
+        iterations,
+        base64.b64encode(salt).decode("ascii"),
+        base64.b64encode(digest).decode("ascii"),
+    )
+
+
+class PasswordHash:
+    """
+    Configured pbkdf2 hash, or digest of a clear text password made at load time
+    """
+
+    __slots__ = ("salt", "iterations", "digest")
+
+    def __init__(self, salt: bytes, iterations: int, digest: bytes):
+        self.salt = salt
+        self.iterations = iterations
+        self.digest = digest
+
+    @classmethod
+    def from_password(cls, password: str):
+        # The clear text password is already in the configuration file, a keyed fast hash is enough
+        salt = os.urandom(16)
+        return cls(salt, 0, cls._blake2b(password.encode("utf-8"), salt))
+
+    @classmethod
+    def from_string(cls, password_hash: str):
+        try:
+            algorithm, iterations, salt, digest = password_hash.split("$")
+            if algorithm != HASH_ALGORITHM:
+                raise ValueError(f"Unknown algorithm {algorithm}")
+            return cls(
+                base64.b64decode(salt), int(iterations), base64.b64decode(digest)
+            )
+        except ValueError as exc:
+            raise ValueError(f"Bogus password hash: {exc}") from None
+
+    @staticmethod
+    def _blake2b(password: bytes, salt: bytes) -> bytes:
+        return hashlib.blake2b(password, key=salt, digest_size=32).digest()
+
+    def verify(self, password: bytes) -> bool:
+        if self.iterations:
+            digest = hashlib.pbkdf2_hmac("sha256", password, self.salt, self.iterations)
+        else:
+            digest = self._blake2b(password, self.salt)
+        return hmac.compare_digest(digest, self.digest)
+
+
+class User:
+    """
+    Authenticated client, eg one per Grafana instance
+    default_priority applies to its /send requests, max_priority caps priorities of all
+    of its sms, tenant is the tenant lane of its /send requests
+    """
+
+    __slots__ = ("name", "password_hash", "default_priority", "max_priority", "tenant")
+
+    def __init__(
+        self,
+        name: str,
+        password_hash: Optional[PasswordHash] = None,
+        default_priority: Optional[int] = None,
+        max_priority: Optional[int] = None,
+        tenant: Optional[str] = None,
+    ):
+        self.name = name
+        self.password_hash = password_hash
+        self.default_priority = default_priority
+        self.max_priority = max_priority
+        self.tenant = tenant or name
+
+    def priority(self, priority: int) -> int:
+        if self.max_priority is not None:
+            return min(priority, self.max_priority)
+        return priority
+
+    def __repr__(self) -> str:
+        return f"User({self.name})"
+
+
+ANONYMOUS = User("anonymous")
+
+
+class CredentialStore:
+    """
+    The cache is only used from the event loop, verify() may run in a thread
+    """
+
+    def __init__(self, users: Dict[str, User], cache_size: int = 256):
+        self.users = users
+        self.cache_size = cache_size
+        # keyed digest of a validated Authorization header: User
+        self._cache = OrderedDict()
+        self._cache_key = os.urandom(16)
+        # Unknown users are checked against a dummy pbkdf2 hash which never matches, so
+        # they take as long as users with a password_hash
+        self._dummy_hash = PasswordHash(os.urandom(16), HASH_ITERATIONS, os.urandom(32))
+
+    def _header_key(self, authorization: str) -> bytes:
+        return hashlib.blake2b(
+            authorization.encode("latin-1", "replace"),
+            key=self._cache_key,
+            digest_size=16,
+        ).digest()
+
+    def cached(self, authorization: str) -> Optional[User]:
+        """
+        Fast path, returns the user of an already validated Authorization header
+        """
+        key = self._header_key(authorization)
+        user = self._cache.get(key)
+        if user is not None:
+            self._cache.move_to_end(key)
+        return user
+
+    def remember(self, authorization: str, user: User):
+        self._cache[self._header_key(authorization)] = user
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def verify(self, authorization: str) -> Optional[User]:
+        """
+        Slow path, decodes a basic Authorization header and checks its password hash
+        Returns None unless credentials are valid
+        """
+        scheme, _, encoded = authorization.partition(" ")
+        if scheme.lower() != "basic":
+            return None
+        try:
+            username, separator, password = (
+                base64.b64decode(encoded, validate=True).decode("utf-8").partition(":")
+            )
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if not separator:
+            return None
+        user = self.users.get(username)
+        password_hash = user.password_hash if user else self._dummy_hash
+        if not password_hash.verify(password.encode("utf-8")):
+            return None
+        return user
+
+
+def _password_hash(password: Optional[str], password_hash: Optional[str]):
+    if password_hash:
+        return PasswordHash.from_string(password_hash)
+    if not password:
+        # Configuration validation already refuses those
+        raise ValueError("Users need a password or a password_hash")
+    return PasswordHash.from_password(password)
+
+
+def credential_store_from_config(config: Config) -> CredentialStore:
+    """
+    http_server username and password are kept as a user, along with http_server users
+    """
+    users = {}
+    http_server = config.http_server
+    if http_server.username:
+        users[http_server.username] = User(
+            http_server.username,
+            _password_hash(http_server.password, http_server.password_hash),
+        )
+    for user in http_server.users:
+        if user.username in users:
+            raise ValueError(f"Duplicate user {user.username}")
+        users[user.username] = User(
+            user.username,
+            _password_hash(user.password, user.password_hash),
+            default_priority=user.default_priority,
+            max_priority=user.max_priority,
+            tenant=user.tenant,
+        )
+    return CredentialStore(users, cache_size=http_server.auth_cache_size)
+
+
+if __name__ == "__main__":
+    import getpass
+
+    print(hash_password(getpass.getpass("Password: ")))
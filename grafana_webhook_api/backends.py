@@ -0,0 +1,288 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.backends"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+SMS delivery backends
+command: runs sms_command for every sms (eg gammu-smsd-inject)
+files: writes sms directly into gammu-smsd files backend outbox directory
+sql: inserts sms directly into gammu-smsd sqlite database outbox table
+"""
+
+
+from typing import Optional, Tuple
+import os
+import re
+import logging
+import threading
+import itertools
+import sqlite3
+from datetime import datetime
+from command_runner import command_runner
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.segments import is_gsm7, split_parts, ucs2_length
+from grafana_webhook_api.metrics import COMMAND_EXIT_CODES
+
+
+logger = logging.getLogger()
+
+# Phone numbers end up in file names, don't allow anything else than digits
+NUMBER_REGEX = re.compile(r"^\+?[0-9]+$")
+
+
+class DeliveryBackend:
+    name = "backend"
+
+    def send(self, number: str, message: str) -> Tuple[bool, str]:
+        """
+        Returns (success, output)
+        """
+        raise NotImplementedError
+
+    def sender(self) -> Optional[str]:
+        """
+        Name of the gateway which made the last successful send of the calling thread, so
+        its delivery reports are read from the right gammu-smsd instance
+        """
+        return None
+
+
+class CommandBackend(DeliveryBackend):
+    """
+    ${NUMBER}, ${ALERT_MESSAGE} and ${ALERT_MESSAGE_LEN} placeholders are replaced in sms_command
+    """
+
+    name = "command"
+
+    def __init__(self, sms_command: str):
+        self.sms_command = sms_command
+
+    def send(self, number: str, message: str) -> Tuple[bool, str]:
+        # Escape single quotes once on the final message so we will stay in line
+        message = message.replace("'", "-")
+        parsed_sms_command = self.sms_command.replace(
+            "${NUMBER}", "'{}'".format(number)
+        )
+        parsed_sms_command = parsed_sms_command.replace(
+            "${ALERT_MESSAGE}", "'{}'".format(message)
+        )
+        parsed_sms_command = parsed_sms_command.replace(
+            "${ALERT_MESSAGE_LEN}", str(ucs2_length(message))
+        )
+
+        # Whole messages end up in the command line, only logged when debugging
+        logger.debug("sms_command: %s", parsed_sms_command)
+        exit_code, output = command_runner(parsed_sms_command)
+        COMMAND_EXIT_CODES.inc(exit_code=exit_code)
+        if exit_code != 0:
+            return False, "code {}: {}".format(exit_code, output)
+        return True, output
+
+
+class FilesSpoolBackend(DeliveryBackend):
+    """
+    Writes OUT<priority><date>_<time>_<serial>_<number>_<anything>.txt files into
+    gammu-smsd outbox directory
+    Files are written under a temporary name and renamed once complete, so gammu-smsd
+    never picks up a partial sms
+    """
+
+    name = "files"
+
+    def __init__(self, outbox_path: str, priority: str = "A"):
+        self.outbox_path = outbox_path
+        self.priority = priority
+        self._serial = itertools.count()
+
+    def send(self, number: str, message: str) -> Tuple[bool, str]:
+        if not NUMBER_REGEX.match(number):
+            return False, "Invalid phone number {} for files backend".format(number)
+        serial = next(self._serial)
+        filename = "OUT{}{}_{:02d}_{}_{}{}.txt".format(
+            self.priority,
+            datetime.now().strftime("%Y%m%d_%H%M%S"),
+            serial % 100,
+            number,
+            os.getpid(),
+            serial,
+        )
+        # gammu-smsd reads plain text in current locale, or UTF-16 when there's a BOM
+        if message.isascii():
+            content = message.encode("ascii")
+        else:
+            content = message.encode("utf-16")
+        temp_path = os.path.join(self.outbox_path, "tmp_" + filename)
+        try:
+            with open(temp_path, "wb") as file_handle:
+                file_handle.write(content)
+                file_handle.flush()
+                os.fsync(file_handle.fileno())
+            os.rename(temp_path, os.path.join(self.outbox_path, filename))
+        except OSError as exc:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False, "Cannot write {}: {}".format(filename, exc)
+        logger.info("Spooled sms to %s as %s", number, filename)
+        return True, filename
+
+
+class SQLOutboxBackend(DeliveryBackend):
+    """
+    Inserts sms into gammu-smsd sqlite outbox table
+    Long sms are split into concatenated parts using outbox_multipart table, like
+    gammu-smsd-inject does
+    """
+
+    name = "sql"
+
+    def __init__(
+        self, database: str, creator_id: str = "grafana_webhook_api", timeout: int = 30
+    ):
+        self.database = database
+        self.creator_id = creator_id
+        self.timeout = timeout
+        self._local = threading.local()
+        # Multipart sms reference number, must differ between consecutive multipart sms
+        self._reference = itertools.count(int.from_bytes(os.urandom(1), "big"))
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        One pooled connection per sender thread and per process
+        """
+        pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != pid:
+            conn = sqlite3.connect(
+                self.database, timeout=self.timeout, isolation_level=None
+            )
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    def send(self, number: str, message: str) -> Tuple[bool, str]:
+        gsm7 = is_gsm7(message)
+        coding = "Default_No_Compression" if gsm7 else "Unicode_No_Compression"
+        parts = split_parts(message, gsm7)
+        if len(parts) > 1:
+            reference = next(self._reference) % 256
+            udh = [
+                "050003{:02X}{:02X}{:02X}".format(reference, len(parts), position)
+                for position in range(1, len(parts) + 1)
+            ]
+        else:
+            udh = [""]
+
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "INSERT INTO outbox (DestinationNumber, TextDecoded, Coding, UDH, "
+                "MultiPart, CreatorID) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    number,
+                    parts[0],
+                    coding,
+                    udh[0],
+                    "true" if len(parts) > 1 else "false",
+                    self.creator_id,
+                ),
+            )
+            message_id = cursor.lastrowid
+            for position in range(2, len(parts) + 1):
+                conn.execute(
+                    "INSERT INTO outbox_multipart (ID, SequencePosition, TextDecoded, "
+                    "Coding, UDH) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        message_id,
+                        position,
+                        parts[position - 1],
+                        coding,
+                        udh[position - 1],
+                    ),
+                )
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            return False, "Cannot insert sms into outbox: {}".format(exc)
+        logger.info(
+            "Inserted sms to %s in outbox with ID %s (%s parts)",
+            number,
+            message_id,
+            len(parts),
+        )
+        return True, str(message_id)
+
+
+class FallbackBackend(DeliveryBackend):
+    """
+    Uses fallback backend whenever primary backend fails
+    """
+
+    def __init__(self, primary: DeliveryBackend, fallback: DeliveryBackend):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = "{}+{}".format(primary.name, fallback.name)
+
+    def send(self, number: str, message: str) -> Tuple[bool, str]:
+        result, output = self.primary.send(number, message)
+        if result:
+            return result, output
+        logger.error(
+            "{} backend failed ({}), using {} backend".format(
+                self.primary.name, output, self.fallback.name
+            )
+        )
+        return self.fallback.send(number, message)
+
+
+def native_backend(
+    backend: str, outbox_path: str, database: Optional[str], creator_id: str
+) -> Optional[DeliveryBackend]:
+    """
+    files or sql backend, None when the sql backend has no database
+    """
+    if backend == "files":
+        return FilesSpoolBackend(outbox_path)
+    if not database:
+        logger.error("No gammu-smsd database defined for sql backend")
+        return None
+    return SQLOutboxBackend(database, creator_id=creator_id)
+
+
+def backend_from_config(config: Config) -> Optional[DeliveryBackend]:
+    """
+    Returns None when no usable backend is configured
+    """
+    command_backend = CommandBackend(config.sms_command) if config.sms_command else None
+
+    backend = config.delivery.backend
+    if backend == "command":
+        if not command_backend:
+            logger.error("No sms command defined")
+        return command_backend
+
+    backend = native_backend(
+        backend,
+        config.delivery.outbox_path,
+        config.delivery.database,
+        config.delivery.creator_id,
+    )
+    if backend is None:
+        return command_backend
+
+    if config.delivery.fallback_to_command and command_backend:
+        return FallbackBackend(backend, command_backend)
+    return backend
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.coalesce"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Merges messages sent to the same number within a flush window into a single sms
+so alert storms don't burn the rate limits with one sms per webhook
+"""
+
+
+from typing import Optional
+import asyncio
+import logging
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.dispatcher import SendQueue, SendQueueFull
+
+
+logger = logging.getLogger()
+
+
+class _Batch:
+    __slots__ = (
+        "messages",
+        "groups",
+        "tenants",
+        "futures",
+        "length",
+        "priority",
+        "timer",
+    )
+
+    def __init__(self):
+        self.messages = []
+        self.groups = set()
+        self.tenants = set()
+        self.futures = []
+        self.length = 0
+        self.priority = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class Coalescer:
+    def __init__(
+        self,
+        send_queue: SendQueue,
+        window: float = 5,
+        max_length: int = 2000,
+        header: str = "${COUNT} alerts",
+        separator: str = "\n--\n",
+        urgent_priority: Optional[int] = None,
+    ):
+        self.send_queue = send_queue
+        self.window = window
+        self.max_length = max_length
+        self.header = header
+        self.separator = separator
+        # Messages of at least this priority are sent right away, with whatever is buffered
+        self.urgent_priority = urgent_priority
+        self._batches = {}
+
+    @property
+    def pending(self) -> int:
+        return sum(len(batch.messages) for batch in self._batches.values())
+
+    def submit(
+        self,
+        number: str,
+        message: str,
+        group: Optional[str] = None,
+        priority: int = 0,
+        tenant: Optional[str] = None,
+    ) -> asyncio.Future:
+        """
+        Buffer a message for number, returns a future holding the result of the merged send
+        Raises SendQueueFull when a new batch would not fit into the send queue
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            batch = self._batches[number]
+        except KeyError:
+            if self.send_queue.full:
+                raise SendQueueFull(
+                    f"Send queue full ({self.send_queue.max_size} pending sms)"
+                )
+            batch = _Batch()
+            batch.timer = loop.call_later(self.window, self.flush, number)
+            self._batches[number] = batch
+        future = loop.create_future()
+        batch.messages.append(message)
+        batch.groups.add(group)
+        batch.tenants.add(tenant)
+        batch.futures.append(future)
+        batch.length += len(message)
+        # Merged messages get the highest priority of their messages
+        if batch.priority is None or priority > batch.priority:
+            batch.priority = priority
+        if batch.length >= self.max_length or (
+            self.urgent_priority is not None and priority >= self.urgent_priority
+        ):
+            self.flush(number)
+        return future
+
+    def merge(self, messages: list) -> str:
+        if len(messages) == 1:
+            return messages[0]
+        header = self.header.replace("${COUNT}", str(len(messages)))
+        return header + "\n" + self.separator.join(messages)
+
+    def flush(self, number: str):
+        try:
+            batch = self._batches.pop(number)
+        except KeyError:
+            return
+        if batch.timer:
+            batch.timer.cancel()
+        if len(batch.messages) > 1:
+            logger.info(f"Coalesced {len(batch.messages)} messages for number {number}")
+        try:
+            # Merged messages from different alert groups don't belong to any group
+            group = next(iter(batch.groups)) if len(batch.groups) == 1 else None
+            # Likewise for tenants, which then go to the default tenant lane
+            tenant = next(iter(batch.tenants)) if len(batch.tenants) == 1 else None
+            send_future = self.send_queue.submit(
+                number,
+                self.merge(batch.messages),
+                group=group,
+                priority=batch.priority,
+                tenant=tenant,
+            )
+        except (SendQueueFull, RuntimeError) as exc:
+            logger.error(f"Cannot queue coalesced text to {number}: {exc}")
+            for future in batch.futures:
+                if not future.done():
+                    future.set_result(False)
+            return
+
+        def _set_results(send_future: asyncio.Future):
+            result = False if send_future.cancelled() else send_future.result()
+            for future in batch.futures:
+                if not future.done():
+                    future.set_result(result)
+
+        send_future.add_done_callback(_set_results)
+
+    def flush_all(self):
+        for number in list(self._batches.keys()):
+            self.flush(number)
+
+
+def coalescer_from_config(config: Config, send_queue: SendQueue) -> Optional[Coalescer]:
+    """
+    Returns None when coalescing is disabled
+    """
+    if not config.coalesce.enabled:
+        return None
+    logger.info(f"Coalescing messages per number within {config.coalesce.window}s")
+    return Coalescer(
+        send_queue,
+        window=config.coalesce.window,
+        max_length=config.coalesce.max_length,
+        header=config.coalesce.header,
+        urgent_priority=config.priority.high_priority,
+    )
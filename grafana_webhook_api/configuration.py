@@ -5,15 +5,27 @@
 
 __intname__ = "grafana_webhook_api.configuration"
 __author__ = "Orsiris de Jong"
-__copyright__ = "Copyright (C) 2023 NetInvent"
+__copyright__ = "Copyright (C) 2023-2026 NetInvent"
 __license__ = "BSD-3 Clause"
-__build__ = "2023053001"
-__version__ = "1.0.0"
+__build__ = "2026101801"
+__version__ = "1.1.0"
 
 
+from typing import Optional, List, Dict, Union, Literal, Callable
 import os
+import threading
+from argparse import ArgumentParser
 from ruamel.yaml import YAML
 from logging import getLogger
+from pydantic import (
+    AliasChoices,
+    BaseModel,
+    ConfigDict,
+    Field,
+    ValidationError,
+    field_validator,
+    model_validator,
+)
 
 
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
@@ -45,3 +57,485 @@ def save_config(config_file, config_dict):
     with open(config_file, "w", encoding="utf-8") as file_handle:
         yaml = YAML(typ="rt")
         yaml.dump(config_dict, file_handle)
+
+
+class _Section(BaseModel):
+    """
+    Configuration snapshots are immutable, unknown keys are ignored
+    """
+
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+
+def _check_rate(value: Optional[str]) -> Optional[str]:
+    """
+    Rates are given as count/interval in seconds, eg 5/300
+    """
+    if value is None:
+        return value
+    count, interval = str(value).split("/")
+    if int(count) < 1 or float(interval) <= 0:
+        raise ValueError(f"Bogus rate {value}")
+    return str(value)
+
+
+class UserConfig(_Section):
+    username: str
+    password: Optional[str] = None
+    password_hash: Optional[str] = None
+    default_priority: Optional[int] = None
+    max_priority: Optional[int] = None
+    tenant: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _check_password(self):
+        # Users without password would log in with an empty one
+        if not self.password and not self.password_hash:
+            raise ValueError(f"User {self.username} has no password nor password_hash")
+        return self
+
+
+class HttpServerConfig(_Section):
+    listen: Optional[str] = None
+    port: Optional[int] = None
+    username: str = ""
+    password: str = ""
+    password_hash: Optional[str] = None
+    users: List[UserConfig] = []
+    auth_cache_size: int = 256
+    no_auth: bool = False
+    workers: Optional[int] = None
+    fast_parsing: bool = False
+
+    @field_validator("users", mode="before")
+    @classmethod
+    def _empty_users(cls, value):
+        return value or []
+
+    @model_validator(mode="after")
+    def _check_password(self):
+        if (
+            self.username
+            and not self.no_auth
+            and not self.password
+            and not self.password_hash
+        ):
+            raise ValueError(
+                f"User {self.username} has no password nor password_hash"
+            )
+        return self
+
+
+class SendQueueConfig(_Section):
+    workers: int = 4
+    max_size: int = 1000
+    max_parallel_sends: int = 10
+    # Maximum sms of a single bulk /send request, 0 means no limit
+    max_bulk_items: int = 1000
+    async_response: bool = False
+    drain_timeout: int = 30
+
+
+class AdmissionConfig(_Section):
+    enabled: bool = False
+    # Outstanding sms limit, adapted to delivery backend latency
+    initial_limit: int = Field(20, gt=0)
+    min_limit: int = Field(4, gt=0)
+    max_limit: int = Field(1000, gt=0)
+    # Send latency up to tolerance times its baseline lets the limit grow
+    tolerance: float = Field(2, ge=1)
+    smoothing: float = Field(0.2, gt=0, le=1)
+    max_retry_after: int = Field(300, gt=0)
+
+
+class JournalConfig(_Section):
+    enabled: bool = False
+    path: str = "/var/lib/grafana_webhook_api/journal.db"
+    max_attempts: int = 8
+    backoff: float = 10
+    max_backoff: float = 3600
+    commit_interval: float = 0.005
+    poll_interval: float = 1
+
+
+class StateStoreConfig(_Section):
+    backend: Literal["memory", "sqlite"] = "memory"
+    path: str = "/var/lib/grafana_webhook_api/state.db"
+
+
+class GatewayConfig(_Section):
+    name: str
+    backend: Literal["command", "files", "sql"] = "command"
+    sms_command: Optional[str] = None
+    outbox_path: str = "/var/spool/gammu/outbox"
+    # Delivery reports of files gateways, default to sent and error next to outbox_path
+    sent_path: Optional[str] = None
+    error_path: Optional[str] = None
+    database: Optional[str] = None
+    creator_id: str = "grafana_webhook_api"
+    max_concurrency: int = Field(1, gt=0)
+    weight: float = Field(1, gt=0)
+
+
+class GatewayHealthConfig(_Section):
+    window: int = Field(20, gt=0)
+    min_samples: int = Field(5, gt=0)
+    max_failure_rate: float = Field(0.5, gt=0, le=1)
+    max_latency: Optional[float] = None
+    cooldown: float = 60
+
+
+class DeliveryConfig(_Section):
+    backend: Literal["command", "files", "sql"] = "command"
+    outbox_path: str = "/var/spool/gammu/outbox"
+    database: Optional[str] = None
+    creator_id: str = "grafana_webhook_api"
+    fallback_to_command: bool = False
+    # When given, sms are balanced between those gateways instead of using backend
+    gateways: List[GatewayConfig] = []
+    balancing: Literal["least_outstanding", "round_robin"] = "least_outstanding"
+    sticky_numbers: bool = False
+    failover: bool = True
+    health: GatewayHealthConfig = GatewayHealthConfig()
+
+    @field_validator("gateways", mode="before")
+    @classmethod
+    def _empty_gateways(cls, value):
+        return value or []
+
+    @field_validator("gateways")
+    @classmethod
+    def _unique_gateways(cls, value):
+        names = [gateway.name for gateway in value]
+        for name in names:
+            if names.count(name) > 1:
+                raise ValueError(f"Duplicate gateway {name}")
+        return value
+
+
+class DeliveryReportsConfig(_Section):
+    enabled: bool = False
+    # files or sql, defaults to sql with delivery sql backend, files otherwise
+    source: Optional[Literal["files", "sql"]] = None
+    sent_path: str = "/var/spool/gammu/sent"
+    error_path: str = "/var/spool/gammu/error"
+    # Defaults to delivery database
+    database: Optional[str] = None
+    poll_interval: float = Field(5, gt=0)
+    # sqlite allows at most 999 query parameters
+    batch_size: int = Field(500, gt=0, le=999)
+    timeout: float = 3600
+    max_size: int = Field(10000, gt=0)
+    retries: int = Field(0, ge=0)
+
+
+class RateLimitConfig(_Section):
+    scope: Literal["number", "group", "tenant", "global"]
+    limit: str
+    mode: Literal["window", "bucket"] = "window"
+
+    _check_limit = field_validator("limit")(_check_rate)
+
+
+class CoalesceConfig(_Section):
+    enabled: bool = False
+    window: float = 5
+    max_length: int = 2000
+    header: str = "${COUNT} alerts"
+
+
+class DedupConfig(_Section):
+    enabled: bool = False
+    max_size: int = 10000
+    ttl: int = 600
+
+
+class AlertStateConfig(_Section):
+    enabled: bool = False
+    max_size: int = 10000
+    ttl: int = 86400
+
+
+class MessageTemplateConfig(_Section):
+    header: str = "${SUPERVISION_NAME} org ${ORG_ID}: ${TITLE}"
+    alert_header: str = "ALERT ${STATUS}:"
+    status_headers: Dict[str, str] = {}
+    label_format: str = "- ${LABEL}=${VALUE}"
+    labels: List[str] = []
+    exclude_labels: List[str] = []
+    max_alerts: int = 0
+    more_alerts: str = "(+${COUNT} more alerts)"
+    truncation_marker: str = "..."
+
+    @field_validator("status_headers", "labels", "exclude_labels", mode="before")
+    @classmethod
+    def _empty_collections(cls, value, info):
+        if value:
+            return value
+        return {} if info.field_name == "status_headers" else []
+
+
+class SmsConfig(_Section):
+    max_segments: int = 0
+    transliterate: bool = False
+    label_priority: List[str] = []
+
+    @field_validator("label_priority", mode="before")
+    @classmethod
+    def _empty_label_priority(cls, value):
+        return value or []
+
+
+class PriorityRuleConfig(_Section):
+    priority: int
+    status: Optional[str] = None
+    labels: Dict[str, Union[str, List[str]]] = {}
+
+    @field_validator("labels", mode="before")
+    @classmethod
+    def _empty_labels(cls, value):
+        return value or {}
+
+
+def _number_list(value) -> List[str]:
+    # Numbers may be separated with ';' like in webhook URLs
+    if isinstance(value, (str, int)):
+        value = str(value).split(";")
+    return [str(number).strip() for number in value or [] if str(number).strip()]
+
+
+class RouteConfig(_Section):
+    match: Dict[str, List[str]] = {}
+    numbers: List[str]
+
+    @field_validator("match", mode="before")
+    @classmethod
+    def _match_values(cls, value):
+        # orgId and other yaml integers are matched as strings
+        return {
+            str(label): [
+                str(item)
+                for item in (values if isinstance(values, list) else [values])
+            ]
+            for label, values in (value or {}).items()
+        }
+
+    _numbers = field_validator("numbers", mode="before")(_number_list)
+
+
+class RoutingConfig(_Section):
+    routes: List[RouteConfig] = []
+    default_numbers: List[str] = []
+
+    @field_validator("routes", mode="before")
+    @classmethod
+    def _empty_routes(cls, value):
+        return value or []
+
+    _default_numbers = field_validator("default_numbers", mode="before")(
+        _number_list
+    )
+
+
+class PriorityConfig(_Section):
+    default: int = 0
+    high_priority: int = 10
+    reserved: int = 0
+    rules: List[PriorityRuleConfig] = []
+
+    @field_validator("rules", mode="before")
+    @classmethod
+    def _empty_rules(cls, value):
+        return value or []
+
+
+class TenantConfig(_Section):
+    weight: float = Field(1, gt=0)
+    rate_limit: Optional[str] = None
+    max_size: Optional[int] = None
+
+    _check_rate_limit = field_validator("rate_limit")(_check_rate)
+
+
+class TenantsConfig(_Section):
+    enabled: bool = False
+    # Defaults of tenants missing from tenants
+    weight: float = Field(1, gt=0)
+    rate_limit: Optional[str] = None
+    max_size: int = 0
+    mode: Literal["window", "bucket"] = "window"
+    tenants: Dict[str, TenantConfig] = {}
+
+    _check_rate_limit = field_validator("rate_limit")(_check_rate)
+
+    @field_validator("tenants", mode="before")
+    @classmethod
+    def _tenant_names(cls, value):
+        # Grafana orgIds are given as yaml integers
+        return {str(name): tenant or {} for name, tenant in (value or {}).items()}
+
+
+class MetricsConfig(_Section):
+    enabled: bool = True
+    # Shared between server workers so /metrics reports all of them
+    directory: Optional[str] = None
+    interval: float = 5
+
+
+class LoggingConfig(_Section):
+    queued: bool = True
+    max_queue_size: int = Field(10000, gt=0)
+    format: Literal["text", "json"] = "text"
+
+
+class ConfigReloadConfig(_Section):
+    watch: bool = True
+    interval: float = 5
+
+
+class Config(_Section):
+    http_server: HttpServerConfig = HttpServerConfig()
+    sms_command: Optional[str] = None
+    # sms_max_length is the documented key, alert_max_length was read by older versions
+    alert_max_length: int = Field(
+        2500, validation_alias=AliasChoices("sms_max_length", "alert_max_length")
+    )
+    min_interval: Optional[int] = None
+    global_rate_limit: Optional[str] = None
+    rate_limits: List[RateLimitConfig] = []
+    supervision_name: str = "Supervision"
+    delivery: DeliveryConfig = DeliveryConfig()
+    delivery_reports: DeliveryReportsConfig = DeliveryReportsConfig()
+    send_queue: SendQueueConfig = SendQueueConfig()
+    admission: AdmissionConfig = AdmissionConfig()
+    journal: JournalConfig = JournalConfig()
+    state_store: StateStoreConfig = StateStoreConfig()
+    coalesce: CoalesceConfig = CoalesceConfig()
+    dedup: DedupConfig = DedupConfig()
+    alert_state: AlertStateConfig = AlertStateConfig()
+    message_template: MessageTemplateConfig = MessageTemplateConfig()
+    sms: SmsConfig = SmsConfig()
+    priority: PriorityConfig = PriorityConfig()
+    tenants: TenantsConfig = TenantsConfig()
+    routing: RoutingConfig = RoutingConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    logging: LoggingConfig = LoggingConfig()
+    config_reload: ConfigReloadConfig = ConfigReloadConfig()
+
+    _check_global_rate_limit = field_validator("global_rate_limit")(_check_rate)
+
+    @field_validator("rate_limits", mode="before")
+    @classmethod
+    def _empty_rate_limits(cls, value):
+        return value or []
+
+
+def per_worker_features(config: Config) -> List[str]:
+    """
+    Enabled sections whose state is kept in memory by every server worker, and which
+    would misbehave with multiple workers since each worker only sees its own requests
+    """
+    features = {
+        "dedup": config.dedup.enabled,
+        "alert_state": config.alert_state.enabled,
+        "coalesce": config.coalesce.enabled,
+        "admission": config.admission.enabled,
+        "tenants": config.tenants.enabled,
+        "delivery_reports": config.delivery_reports.enabled,
+    }
+    return [name for name, enabled in features.items() if enabled]
+
+
+def get_config_file() -> str:
+    """
+    Config file given with -c / --config-file, else the default one
+    parse_known_args() since we get imported by server.py and uvicorn which have their own arguments
+    """
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument("-c", "--config-file", dest="config_file", default=None)
+    args, _ = parser.parse_known_args()
+    return args.config_file if args.config_file else config_file
+
+
+def load_settings(config_file: str = config_file) -> Config:
+    """
+    Returns a validated configuration snapshot
+    Raises ValueError when the configuration file is not usable
+    """
+    config_dict = load_config(config_file)
+    if config_dict is None:
+        raise ValueError(f"Cannot load config file {config_file}")
+    try:
+        return Config.model_validate(config_dict)
+    except ValidationError as exc:
+        raise ValueError(f"Bogus config file {config_file}: {exc}") from exc
+
+
+_CONFIG_LOCK = threading.RLock()
+_CONFIG: Optional[Config] = None
+_CONFIG_FILE: Optional[str] = None
+_CONFIG_MTIME: Optional[float] = None
+_RELOAD_CALLBACKS = []
+
+
+def _get_mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def get_config() -> Config:
+    """
+    Configuration snapshot shared by all modules, loaded once from the file given on command line
+    """
+    global _CONFIG
+    global _CONFIG_FILE
+    global _CONFIG_MTIME
+
+    if _CONFIG is None:
+        with _CONFIG_LOCK:
+            if _CONFIG is None:
+                _CONFIG_FILE = get_config_file()
+                _CONFIG_MTIME = _get_mtime(_CONFIG_FILE)
+                _CONFIG = load_settings(_CONFIG_FILE)
+    return _CONFIG
+
+
+def on_reload(callback: Callable[[Config, Config], None]):
+    """
+    Register callback(old_config, new_config) used to rebuild state depending on configuration
+    """
+    _RELOAD_CALLBACKS.append(callback)
+
+
+def reload_config(force: bool = False) -> bool:
+    """
+    Reload configuration when the file changed (or always when forced)
+    Dependent state is rebuilt by reload callbacks before the new snapshot is published
+    Returns True when a new configuration is in use, keeps the current one on errors
+    """
+    global _CONFIG
+    global _CONFIG_MTIME
+
+    with _CONFIG_LOCK:
+        # Read under the lock, so concurrent reloads each see the snapshot they replace
+        old_config = get_config()
+        mtime = _get_mtime(_CONFIG_FILE)
+        if not force and mtime == _CONFIG_MTIME:
+            return False
+        _CONFIG_MTIME = mtime
+        try:
+            new_config = load_settings(_CONFIG_FILE)
+        except ValueError as exc:
+            logger.error(f"Not reloading configuration: {exc}")
+            return False
+        try:
+            for callback in _RELOAD_CALLBACKS:
+                callback(old_config, new_config)
+        except Exception as exc:
+            logger.error(f"Not reloading configuration: {exc}", exc_info=True)
+            return False
+        _CONFIG = new_config
+    logger.info(f"Reloaded configuration file {_CONFIG_FILE}")
+    return True
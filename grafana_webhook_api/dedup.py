@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.dedup"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Bounded LRU / TTL cache of already handled Grafana notifications
+Grafana HA replicas and repeat intervals send identical notifications, which are
+answered from this cache without formatting or sending anything
+"""
+
+
+from typing import Optional, List
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.models import AlertMessage
+from grafana_webhook_api.metrics import DEDUP
+
+
+logger = logging.getLogger()
+
+
+class DedupCache:
+    def __init__(self, max_size: int = 10000, ttl: int = 600):
+        self.max_size = max(int(max_size), 1)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key: expiry timestamp, ordered by insertion, so also by expiry since ttl is constant
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(numbers: List[str], alert: AlertMessage) -> Optional[str]:
+        """
+        Key is made of recipients, global status and every alert fingerprint and status
+        Returns None when alerts have no fingerprints, in which case we can't tell duplicates
+        """
+        fingerprints = sorted(
+            f"{sub_alert.fingerprint}:{sub_alert.status}"
+            for sub_alert in alert.alerts
+            if sub_alert.fingerprint
+        )
+        if not fingerprints:
+            return None
+        key = "|".join([";".join(numbers), alert.status, *fingerprints])
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _evict(self, now: float):
+        while self._entries:
+            expiry = next(iter(self._entries.values()))
+            if expiry > now:
+                break
+            self._entries.popitem(last=False)
+
+    def seen(self, key: str) -> bool:
+        """
+        Returns True if key was already seen within ttl, else records it
+        """
+        now = time.monotonic()
+        self._evict(now)
+        if key in self._entries:
+            self.hits += 1
+            DEDUP.inc(result="hit")
+            return True
+        self.misses += 1
+        DEDUP.inc(result="miss")
+        self._entries[key] = now + self.ttl
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return False
+
+    def discard(self, key: str):
+        """
+        Forget a key, eg when sending failed so Grafana retries are not dropped
+        """
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def dedup_cache_from_config(config: Config) -> Optional[DedupCache]:
+    """
+    Returns None when deduplication is disabled
+    """
+    if not config.dedup.enabled:
+        return None
+    logger.info(f"Deduplicating identical alerts for {config.dedup.ttl}s")
+    return DedupCache(max_size=config.dedup.max_size, ttl=config.dedup.ttl)
@@ -0,0 +1,194 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.dispatcher"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Bounded send queue so sms commands never run on the asyncio event loop
+Every queued sms is handled by a pool of worker tasks, which run the blocking
+send function in a thread pool
+Queued sms are sent by priority (highest first), then in arrival order, or share workers
+between tenant lanes when tenants are enabled
+"""
+
+
+from typing import Callable, Optional
+import asyncio
+import logging
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.tenants import FairQueue, Tenants
+
+
+logger = logging.getLogger()
+
+
+class SendQueueFull(Exception):
+    pass
+
+
+class SendQueue:
+    def __init__(
+        self,
+        send_function: Callable,
+        workers: int = 4,
+        max_size: int = 1000,
+        drain_timeout: int = 30,
+        get_tenants: Optional[Callable[[], Tenants]] = None,
+    ):
+        self.send_function = send_function
+        self.workers = max(int(workers), 1)
+        self.max_size = max(int(max_size), 0)
+        self.drain_timeout = drain_timeout
+        # Per tenant lanes instead of a single queue when given
+        self.get_tenants = get_tenants
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        # Tie breaker keeping arrival order within a priority
+        self._sequence = itertools.count()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks = []
+        # Sms taken from the queue and being sent
+        self._in_flight = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        if self._queue is None:
+            return 0
+        return self._queue.qsize()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def full(self) -> bool:
+        if self._queue is None:
+            return False
+        return self._queue.full()
+
+    async def start(self):
+        if self.running:
+            return
+        if self.get_tenants:
+            self._queue = FairQueue(self.get_tenants, maxsize=self.max_size)
+        else:
+            self._queue = asyncio.PriorityQueue(maxsize=self.max_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="sms_sender"
+        )
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"sms_sender_{i}")
+            for i in range(0, self.workers)
+        ]
+        logger.info(
+            f"Send queue started with {self.workers} workers (max size {self.max_size})"
+        )
+
+    async def stop(self):
+        """
+        Wait for pending sms to be sent, up to drain_timeout seconds, then stop workers
+        """
+        if not self.running:
+            return
+        pending = self._queue.qsize()
+        if pending:
+            logger.info(f"Draining {pending} pending sms before shutdown")
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Send queue not drained after {self.drain_timeout}s, {self._queue.qsize()} sms were not sent"
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Drop whatever is left so waiting requests don't hang forever
+        while not self._queue.empty():
+            *_, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_result(False)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        logger.info("Send queue stopped")
+
+    def submit(self, *args, **kwargs) -> asyncio.Future:
+        """
+        Queue a send without waiting for it
+        The priority keyword argument, also given to send_function, orders the queue, and
+        the tenant keyword argument selects the tenant lane
+        Returns a future which will hold the result of send_function
+        Raises SendQueueFull when backpressure limit is reached
+        """
+        if not self.running:
+            raise RuntimeError("Send queue is not running")
+        future = asyncio.get_running_loop().create_future()
+        priority = kwargs.get("priority") or 0
+        try:
+            self._queue.put_nowait(
+                (-priority, next(self._sequence), args, kwargs, future)
+            )
+        except asyncio.QueueFull as exc:
+            # Tenant lanes tell which lane is full
+            raise SendQueueFull(
+                str(exc) or f"Send queue full ({self.max_size} pending sms)"
+            ) from exc
+        return future
+
+    async def enqueue(self, *args, **kwargs) -> asyncio.Future:
+        """
+        Same as submit(), for interface compatibility with DurableSendQueue
+        """
+        return self.submit(*args, **kwargs)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, args, kwargs, future = await self._queue.get()
+            self._in_flight += 1
+            try:
+                result = await loop.run_in_executor(
+                    self._executor, lambda: self.send_function(*args, **kwargs)
+                )
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_result(False)
+                raise
+            except Exception as exc:
+                logger.error(f"Send worker failed: {exc}", exc_info=True)
+                if not future.done():
+                    future.set_result(False)
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+
+
+def send_queue_from_config(
+    config: Config,
+    send_function: Callable,
+    get_tenants: Optional[Callable[[], Tenants]] = None,
+) -> SendQueue:
+    """
+    get_tenants returns current tenant settings, lanes are only used with tenants enabled
+    """
+    return SendQueue(
+        send_function,
+        workers=config.send_queue.workers,
+        max_size=config.send_queue.max_size,
+        drain_timeout=config.send_queue.drain_timeout,
+        get_tenants=get_tenants if config.tenants.enabled else None,
+    )
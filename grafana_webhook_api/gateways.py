@@ -0,0 +1,322 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.gateways"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Balances sms between multiple gateways (eg one gammu-smsd instance per modem), every
+gateway being a delivery backend with its own concurrency limit and weight
+least_outstanding: sends to the gateway with the fewest running sends per weight
+round_robin: smooth weighted round robin
+With sticky_numbers, a number always goes to the same healthy gateway (rendezvous hashing)
+
+A gateway is taken out of rotation for cooldown seconds when too many of its recent sends
+failed or were too slow. It then gets a single probe send, and is back in rotation when it
+succeeds
+send() runs in send queue threads, and waits when all gateways are at their concurrency
+limit
+"""
+
+
+from typing import Optional, List, Tuple, Set
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import deque
+from grafana_webhook_api.configuration import Config, GatewayConfig
+from grafana_webhook_api.backends import (
+    DeliveryBackend,
+    CommandBackend,
+    native_backend,
+)
+from grafana_webhook_api.metrics import GATEWAY_SECONDS, GATEWAY_EJECTIONS
+
+
+logger = logging.getLogger()
+
+
+class Gateway:
+    __slots__ = (
+        "name",
+        "backend",
+        "max_concurrency",
+        "weight",
+        "outstanding",
+        "results",
+        "ejected_until",
+        "current_weight",
+        "settings",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        backend: DeliveryBackend,
+        max_concurrency: int = 1,
+        weight: float = 1,
+        window: int = 20,
+        settings: Optional[GatewayConfig] = None,
+    ):
+        """
+        settings is the configuration the gateway was built from, gateways keep their
+        state across configuration reloads while it doesn't change
+        """
+        self.name = name
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.weight = weight
+        self.outstanding = 0
+        # (success, seconds) of recent sends
+        self.results = deque(maxlen=window)
+        # 0 while in rotation
+        self.ejected_until = 0.0
+        # Smooth weighted round robin state
+        self.current_weight = 0.0
+        self.settings = settings
+
+    def probing(self, now: float) -> bool:
+        return 0 < self.ejected_until <= now
+
+    def usable(self, now: float) -> bool:
+        return not self.ejected_until or self.probing(now)
+
+    def has_capacity(self, now: float) -> bool:
+        if self.probing(now):
+            # A single probe send at a time
+            return self.outstanding == 0
+        return self.outstanding < self.max_concurrency
+
+    def rendezvous_score(self, number: str) -> float:
+        digest = hashlib.blake2b(
+            f"{self.name}:{number}".encode("utf-8"), digest_size=8
+        ).digest()
+        # Uniform in (0, 1), weighted so heavier gateways get more numbers
+        uniform = (int.from_bytes(digest, "big") + 1) / (2**64 + 1)
+        return -self.weight / math.log(uniform)
+
+
+class GatewayPool(DeliveryBackend):
+    name = "gateways"
+
+    def __init__(
+        self,
+        gateways: List[Gateway],
+        balancing: str = "least_outstanding",
+        sticky_numbers: bool = False,
+        failover: bool = True,
+        min_samples: int = 5,
+        max_failure_rate: float = 0.5,
+        max_latency: Optional[float] = None,
+        cooldown: float = 60,
+    ):
+        self.gateways = gateways
+        self.balancing = balancing
+        self.sticky_numbers = sticky_numbers
+        # Try other gateways when a send fails
+        self.failover = failover
+        self.min_samples = min_samples
+        self.max_failure_rate = max_failure_rate
+        self.max_latency = max_latency
+        self.cooldown = cooldown
+        self._condition = threading.Condition()
+        # Gateway of the last successful send, per send queue thread
+        self._local = threading.local()
+
+    def carry_over(self, previous: "GatewayPool"):
+        """
+        Take over gateways of the pool of the previous configuration whose settings didn't
+        change, with their health, ejection and running sends, so a reload doesn't put
+        a failing modem back in rotation
+        Must be called before the pool is used
+        """
+        with previous._condition:
+            previous_gateways = {gateway.name: gateway for gateway in previous.gateways}
+            for index, gateway in enumerate(self.gateways):
+                kept = previous_gateways.get(gateway.name)
+                if kept is None or kept.settings != gateway.settings:
+                    continue
+                if kept.results.maxlen != gateway.results.maxlen:
+                    kept.results = deque(kept.results, maxlen=gateway.results.maxlen)
+                self.gateways[index] = kept
+        # Sends still running on the previous pool release kept gateways under this lock
+        self._condition = previous._condition
+
+    def _pick(self, number: str, candidates: List[Gateway]) -> Optional[Gateway]:
+        """
+        Returns None when the chosen gateways are busy
+        """
+        now = time.monotonic()
+        healthy = [gateway for gateway in candidates if gateway.usable(now)]
+        if not healthy:
+            # Better try an ejected gateway than not sending at all
+            healthy = candidates
+        if self.sticky_numbers:
+            gateway = max(healthy, key=lambda gateway: gateway.rendezvous_score(number))
+            return gateway if gateway.has_capacity(now) else None
+        available = [gateway for gateway in healthy if gateway.has_capacity(now)]
+        if not available:
+            return None
+        if self.balancing == "round_robin":
+            for gateway in available:
+                gateway.current_weight += gateway.weight
+            gateway = max(available, key=lambda gateway: gateway.current_weight)
+            gateway.current_weight -= sum(gateway.weight for gateway in available)
+            return gateway
+        return min(
+            available,
+            key=lambda gateway: (gateway.outstanding + 1) / gateway.weight,
+        )
+
+    def _acquire(self, number: str, tried: Set[str]) -> Optional[Gateway]:
+        """
+        Waits for a gateway with free capacity, returns None once all gateways were tried
+        """
+        candidates = [gateway for gateway in self.gateways if gateway.name not in tried]
+        if not candidates:
+            return None
+        with self._condition:
+            while True:
+                gateway = self._pick(number, candidates)
+                if gateway is not None:
+                    gateway.outstanding += 1
+                    return gateway
+                # Also wakes up when a cooldown ends
+                self._condition.wait(timeout=1)
+
+    def _release(self, gateway: Gateway, result: bool, seconds: float):
+        now = time.monotonic()
+        with self._condition:
+            gateway.outstanding -= 1
+            if gateway.probing(now):
+                if result:
+                    logger.info(f"Gateway {gateway.name} is back in rotation")
+                    gateway.ejected_until = 0.0
+                    gateway.results.clear()
+                else:
+                    gateway.ejected_until = now + self.cooldown
+            elif not gateway.ejected_until:
+                gateway.results.append((result, seconds))
+                reason = self._unhealthy(gateway)
+                if reason:
+                    logger.warning(
+                        f"Taking gateway {gateway.name} out of rotation for "
+                        f"{self.cooldown}s: {reason}"
+                    )
+                    GATEWAY_EJECTIONS.inc(gateway=gateway.name)
+                    gateway.ejected_until = now + self.cooldown
+                    gateway.results.clear()
+            self._condition.notify_all()
+
+    def _unhealthy(self, gateway: Gateway) -> Optional[str]:
+        samples = len(gateway.results)
+        if samples < self.min_samples:
+            return None
+        failures = sum(1 for result, _ in gateway.results if not result)
+        if failures / samples >= self.max_failure_rate:
+            return f"{failures} of its last {samples} sends failed"
+        if self.max_latency:
+            latency = sum(seconds for _, seconds in gateway.results) / samples
+            if latency > self.max_latency:
+                return f"average latency {latency:.1f}s"
+        return None
+
+    def send(self, number: str, message: str) -> Tuple[bool, str]:
+        tried = set()
+        errors = []
+        while True:
+            gateway = self._acquire(number, tried)
+            if gateway is None:
+                break
+            begin = time.perf_counter()
+            try:
+                result, output = gateway.backend.send(number, message)
+            except Exception as exc:
+                result, output = False, str(exc)
+            seconds = time.perf_counter() - begin
+            self._release(gateway, result, seconds)
+            GATEWAY_SECONDS.observe(
+                seconds, backend=gateway.name, result="sent" if result else "failed"
+            )
+            if result:
+                self._local.sender = gateway.name
+                return True, output
+            errors.append(f"gateway {gateway.name}: {output}")
+            tried.add(gateway.name)
+            if not self.failover:
+                break
+            logger.warning(f"Gateway {gateway.name} failed ({output})")
+        return False, ", ".join(errors)
+
+    def sender(self) -> Optional[str]:
+        return getattr(self._local, "sender", None)
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        with self._condition:
+            return [
+                {
+                    "name": gateway.name,
+                    "outstanding": gateway.outstanding,
+                    "in_rotation": not gateway.ejected_until,
+                    "probing": gateway.probing(now),
+                }
+                for gateway in self.gateways
+            ]
+
+
+def gateway_pool_from_config(config: Config) -> Optional[GatewayPool]:
+    """
+    Returns None unless delivery gateways are configured
+    """
+    delivery = config.delivery
+    if not delivery.gateways:
+        return None
+    gateways = []
+    for gateway in delivery.gateways:
+        if gateway.backend == "command":
+            # Gateways without their own command use sms_command
+            sms_command = gateway.sms_command or config.sms_command
+            gateway = gateway.model_copy(update={"sms_command": sms_command})
+            backend = CommandBackend(sms_command) if sms_command else None
+        else:
+            backend = native_backend(
+                gateway.backend,
+                gateway.outbox_path,
+                gateway.database,
+                gateway.creator_id,
+            )
+        if backend is None:
+            logger.error(f"Gateway {gateway.name} has no usable backend, skipping it")
+            continue
+        gateways.append(
+            Gateway(
+                gateway.name,
+                backend,
+                max_concurrency=gateway.max_concurrency,
+                weight=gateway.weight,
+                window=delivery.health.window,
+                settings=gateway,
+            )
+        )
+    if not gateways:
+        logger.error("No usable delivery gateway")
+        return None
+    return GatewayPool(
+        gateways,
+        balancing=delivery.balancing,
+        sticky_numbers=delivery.sticky_numbers,
+        failover=delivery.failover,
+        min_samples=delivery.health.min_samples,
+        max_failure_rate=delivery.health.max_failure_rate,
+        max_latency=delivery.health.max_latency,
+        cooldown=delivery.health.cooldown,
+    )
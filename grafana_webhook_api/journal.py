@@ -0,0 +1,587 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.journal"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Durable outbound queue
+Every sms is written to a sqlite journal before being handed to the send queue, and only
+removed once delivered, so sms survive delivery failures and process restarts (at least once delivery)
+Failed deliveries are retried with exponential backoff, then moved to a dead letter table
+
+Journal writes are group committed: appends, acks and retries made within commit_interval
+are written by a single thread in one fsynced transaction, so durability doesn't limit
+webhook ingest rate
+
+Journal entries are claimed by the process sending them. Processes keep a heartbeat,
+so entries of a crashed process (or of a previous run) are replayed by any live process
+"""
+
+
+from typing import Optional, List, Tuple
+import os
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.dispatcher import SendQueue, SendQueueFull
+
+
+logger = logging.getLogger()
+
+# Result of a first delivery attempt which failed and will be retried
+RETRYING = "retrying"
+
+
+class JournalEntry:
+    __slots__ = (
+        "id",
+        "number",
+        "message",
+        "group",
+        "priority",
+        "tenant",
+        "attempts",
+        "delivery_attempt",
+    )
+
+    def __init__(
+        self,
+        number: str,
+        message: str,
+        group: Optional[str] = None,
+        priority: int = 0,
+        attempts: int = 0,
+        id: Optional[int] = None,
+        tenant: Optional[str] = None,
+        delivery_attempt: int = 0,
+    ):
+        """
+        delivery_attempt counts resends of sms reported failed by gammu-smsd
+        """
+        self.id = id
+        self.number = number
+        self.message = message
+        self.group = group
+        self.priority = priority
+        self.tenant = tenant
+        self.attempts = attempts
+        self.delivery_attempt = delivery_attempt
+
+
+class Journal:
+    """
+    Not thread safe, all calls must be made from the same thread
+    """
+
+    def __init__(self, path: str, owner: str, owner_timeout: float = 30):
+        self.path = path
+        self.owner = owner
+        self.owner_timeout = owner_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode, transactions are explicitly opened with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # fsync on every commit, commits are grouped by DurableSendQueue
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "number TEXT NOT NULL, message TEXT NOT NULL, grp TEXT, "
+            "priority INTEGER NOT NULL DEFAULT 0, "
+            "attempts INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, "
+            "next_attempt REAL NOT NULL, owner TEXT, last_error TEXT)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS messages_next_attempt ON messages (next_attempt)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters (id INTEGER PRIMARY KEY, "
+            "number TEXT NOT NULL, message TEXT NOT NULL, grp TEXT, "
+            "priority INTEGER NOT NULL DEFAULT 0, "
+            "attempts INTEGER NOT NULL, created REAL NOT NULL, failed REAL NOT NULL, "
+            "last_error TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY, seen REAL NOT NULL)"
+        )
+        # Journals made before tenants existed
+        for table in ("messages", "dead_letters"):
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if "tenant" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN tenant TEXT")
+            # Journals made before delivery reports existed
+            if "delivery_attempt" not in columns:
+                conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN delivery_attempt INTEGER NOT NULL "
+                    "DEFAULT 0"
+                )
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def apply(self, operations: List[tuple]):
+        """
+        Write a batch of operations in a single transaction
+        ("append", entry) sets entry.id, ("ack", id), ("retry", id, attempts, next_attempt, error),
+        ("bury", id, attempts, error), ("release", id)
+        """
+        conn = self._conn
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for operation in operations:
+                kind = operation[0]
+                if kind == "append":
+                    entry = operation[1]
+                    entry.id = conn.execute(
+                        "INSERT INTO messages (number, message, grp, priority, tenant, "
+                        "delivery_attempt, attempts, created, next_attempt, owner) "
+                        "VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                        (
+                            entry.number,
+                            entry.message,
+                            entry.group,
+                            entry.priority,
+                            entry.tenant,
+                            entry.delivery_attempt,
+                            now,
+                            now,
+                            self.owner,
+                        ),
+                    ).lastrowid
+                elif kind == "ack":
+                    conn.execute("DELETE FROM messages WHERE id = ?", (operation[1],))
+                elif kind == "retry":
+                    _, entry_id, attempts, next_attempt, error = operation
+                    conn.execute(
+                        "UPDATE messages SET attempts = ?, next_attempt = ?, owner = NULL, "
+                        "last_error = ? WHERE id = ?",
+                        (attempts, next_attempt, error, entry_id),
+                    )
+                elif kind == "bury":
+                    _, entry_id, attempts, error = operation
+                    conn.execute(
+                        "INSERT OR REPLACE INTO dead_letters (id, number, message, grp, "
+                        "priority, tenant, delivery_attempt, attempts, created, failed, "
+                        "last_error) SELECT id, number, message, grp, priority, tenant, "
+                        "delivery_attempt, ?, created, ?, ? FROM messages WHERE id = ?",
+                        (attempts, now, error, entry_id),
+                    )
+                    conn.execute("DELETE FROM messages WHERE id = ?", (entry_id,))
+                elif kind == "release":
+                    conn.execute(
+                        "UPDATE messages SET owner = NULL WHERE id = ?", (operation[1],)
+                    )
+                else:
+                    raise ValueError(f"Unknown journal operation {kind}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, limit: int) -> List[JournalEntry]:
+        """
+        Claim up to limit due entries which are not owned by a live process
+        Also refreshes our heartbeat
+        """
+        conn = self._conn
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO owners (owner, seen) VALUES (?, ?)",
+                (self.owner, now),
+            )
+            conn.execute(
+                "DELETE FROM owners WHERE seen <= ?", (now - self.owner_timeout,)
+            )
+            rows = []
+            if limit > 0:
+                rows = conn.execute(
+                    "SELECT id, number, message, grp, priority, tenant, attempts, "
+                    "delivery_attempt FROM messages "
+                    "WHERE next_attempt <= ? AND (owner IS NULL OR owner NOT IN "
+                    "(SELECT owner FROM owners)) ORDER BY priority DESC, next_attempt "
+                    "LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE messages SET owner = ? WHERE id = ?",
+                    [(self.owner, row[0]) for row in rows],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [
+            JournalEntry(
+                number,
+                message,
+                group,
+                priority,
+                attempts,
+                id=entry_id,
+                tenant=tenant,
+                delivery_attempt=delivery_attempt,
+            )
+            for (
+                entry_id,
+                number,
+                message,
+                group,
+                priority,
+                tenant,
+                attempts,
+                delivery_attempt,
+            ) in rows
+        ]
+
+    def leave(self):
+        """
+        Give our entries back and drop our heartbeat, so they get replayed right away
+        """
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE messages SET owner = NULL WHERE owner = ?", (self.owner,)
+            )
+            conn.execute("DELETE FROM owners WHERE owner = ?", (self.owner,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> dict:
+        (pending,) = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+        (dead,) = self._conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()
+        return {"pending": pending, "dead_letters": dead}
+
+
+class DurableSendQueue:
+    """
+    Same interface as SendQueue, journaling every sms sent through it
+    """
+
+    def __init__(
+        self,
+        send_queue: SendQueue,
+        path: str,
+        max_attempts: int = 8,
+        backoff: float = 10,
+        max_backoff: float = 3600,
+        commit_interval: float = 0.005,
+        poll_interval: float = 1,
+    ):
+        self.send_queue = send_queue
+        self.max_attempts = max(int(max_attempts), 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.commit_interval = commit_interval
+        self.poll_interval = poll_interval
+        self.journal = Journal(path, owner=uuid.uuid4().hex)
+        # Journal is only used from this single thread
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._operations: List[Tuple[tuple, Optional[asyncio.Future]]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._committer: Optional[asyncio.Task] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._in_flight = set()
+        self._stopping = False
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self.send_queue.running
+
+    @property
+    def depth(self) -> int:
+        return self.send_queue.depth
+
+    @property
+    def full(self) -> bool:
+        return self.send_queue.full
+
+    @property
+    def max_size(self) -> int:
+        return self.send_queue.max_size
+
+    async def start(self):
+        if self.running:
+            return
+        loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._closing = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sms_journal"
+        )
+        await loop.run_in_executor(self._executor, self.journal.open)
+        await self.send_queue.start()
+        self._wakeup = asyncio.Event()
+        self._committer = asyncio.create_task(self._commit_loop(), name="sms_journal")
+        self._poller = asyncio.create_task(self._poll_loop(), name="sms_journal_poll")
+        stats = await loop.run_in_executor(self._executor, self.journal.stats)
+        logger.info(
+            f"Using sms journal {self.journal.path}, {stats['pending']} pending sms, "
+            f"{stats['dead_letters']} dead letters"
+        )
+
+    async def stop(self):
+        """
+        Stop retrying, drain the send queue, then commit outstanding journal writes
+        sms which could not be sent stay in the journal and are replayed on next start
+        """
+        if not self.running:
+            return
+        self._stopping = True
+        self._poller.cancel()
+        await asyncio.gather(self._poller, return_exceptions=True)
+        await self.send_queue.stop()
+        # Let send result callbacks queue their journal writes, then commit them
+        await asyncio.sleep(0)
+        self._closing = True
+        self._wakeup.set()
+        await asyncio.gather(self._committer, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.journal.leave)
+        await loop.run_in_executor(self._executor, self.journal.close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        logger.info("Sms journal closed")
+
+    def _write(self, operation: tuple) -> asyncio.Future:
+        """
+        Queue a journal write, returns a future resolved once it is committed
+        """
+        committed = asyncio.get_running_loop().create_future()
+        self._operations.append((operation, committed))
+        self._wakeup.set()
+        return committed
+
+    async def _commit(self):
+        operations, self._operations = self._operations, []
+        if not operations:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                self.journal.apply,
+                [operation for operation, _ in operations],
+            )
+        except Exception as exc:
+            logger.error(f"Cannot write sms journal: {exc}", exc_info=True)
+            for _, committed in operations:
+                if not committed.done():
+                    committed.set_exception(exc)
+            return
+        for _, committed in operations:
+            if not committed.done():
+                committed.set_result(True)
+
+    async def _commit_loop(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._closing:
+                # Group commit window, writes made meanwhile share the same fsync
+                await asyncio.sleep(self.commit_interval)
+            self._wakeup.clear()
+            await self._commit()
+            if self._closing and not self._operations:
+                return
+
+    async def _poll_loop(self):
+        """
+        Dispatch due retries, and sms left over by crashed processes or previous runs
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if self.send_queue.max_size:
+                    free = self.send_queue.max_size - self.send_queue.depth
+                else:
+                    free = 1000
+                entries = await loop.run_in_executor(
+                    self._executor, self.journal.claim, free
+                )
+                entries = [
+                    entry for entry in entries if entry.id not in self._in_flight
+                ]
+                if entries:
+                    logger.info(f"Replaying {len(entries)} journaled sms")
+                for entry in entries:
+                    self._dispatch(entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"Cannot read sms journal: {exc}", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+    def _dispatch(self, entry: JournalEntry, result: Optional[asyncio.Future] = None):
+        try:
+            # Retries were already admitted by rate limits on their first attempt
+            send_future = self.send_queue.submit(
+                entry.number,
+                entry.message,
+                group=entry.group,
+                retry=entry.attempts > 0,
+                priority=entry.priority,
+                tenant=entry.tenant,
+                delivery_attempt=entry.delivery_attempt,
+            )
+        except (SendQueueFull, RuntimeError) as exc:
+            # Entry is picked up again by the journal poller
+            logger.warning(f"Cannot dispatch journaled sms to {entry.number}: {exc}")
+            self._write(("release", entry.id))
+            if result is not None and not result.done():
+                result.set_result(RETRYING)
+            return
+        self._in_flight.add(entry.id)
+        send_future.add_done_callback(
+            lambda future: self._on_sent(entry, future, result)
+        )
+
+    def _on_sent(
+        self,
+        entry: JournalEntry,
+        send_future: asyncio.Future,
+        result: Optional[asyncio.Future],
+    ):
+        self._in_flight.discard(entry.id)
+        sent = False if send_future.cancelled() else send_future.result()
+        if sent or sent is None:
+            # Sent, or refused by rate limits which is final
+            self._write(("ack", entry.id))
+        elif self._stopping:
+            # Not attempted because of shutdown
+            self._write(("release", entry.id))
+            sent = RETRYING
+        else:
+            entry.attempts += 1
+            error = "Delivery failed"
+            if entry.attempts >= self.max_attempts:
+                logger.error(
+                    f"Giving up sms to {entry.number} after {entry.attempts} attempts, moved to dead letters"
+                )
+                self._write(("bury", entry.id, entry.attempts, error))
+            else:
+                delay = min(self.backoff * 2 ** (entry.attempts - 1), self.max_backoff)
+                logger.warning(
+                    f"Sms to {entry.number} failed, attempt {entry.attempts}/{self.max_attempts}, retrying in {delay:.0f}s"
+                )
+                self._write(
+                    ("retry", entry.id, entry.attempts, time.time() + delay, error)
+                )
+                sent = RETRYING
+        if result is not None and not result.done():
+            result.set_result(sent)
+
+    def _append(
+        self,
+        number: str,
+        message: str,
+        group: Optional[str],
+        priority: int,
+        tenant: Optional[str],
+        delivery_attempt: int = 0,
+    ):
+        if not self.running:
+            raise RuntimeError("Send queue is not running")
+        if self.send_queue.full:
+            raise SendQueueFull(
+                f"Send queue full ({self.send_queue.max_size} pending sms)"
+            )
+        entry = JournalEntry(
+            number,
+            message,
+            group,
+            priority,
+            tenant=tenant,
+            delivery_attempt=delivery_attempt,
+        )
+        result = asyncio.get_running_loop().create_future()
+        committed = self._write(("append", entry))
+
+        def _committed(future: asyncio.Future):
+            if future.cancelled() or future.exception() is not None:
+                if not result.done():
+                    result.set_result(False)
+                return
+            self._dispatch(entry, result)
+
+        committed.add_done_callback(_committed)
+        return committed, result
+
+    def submit(
+        self,
+        number: str,
+        message: str,
+        group: Optional[str] = None,
+        priority: int = 0,
+        tenant: Optional[str] = None,
+        delivery_attempt: int = 0,
+    ) -> asyncio.Future:
+        """
+        Journal then queue a sms, returns a future holding the first delivery attempt result
+        (RETRYING when it failed and will be retried)
+        Raises SendQueueFull when backpressure limit is reached
+        """
+        _, result = self._append(
+            number, message, group, priority, tenant, delivery_attempt
+        )
+        return result
+
+    async def enqueue(
+        self,
+        number: str,
+        message: str,
+        group: Optional[str] = None,
+        priority: int = 0,
+        tenant: Optional[str] = None,
+        delivery_attempt: int = 0,
+    ) -> asyncio.Future:
+        """
+        Same as submit(), but only returns once the sms is durably journaled
+        Raises the journal write error when it could not be
+        """
+        committed, result = self._append(
+            number, message, group, priority, tenant, delivery_attempt
+        )
+        await committed
+        return result
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._in_flight)}
+
+
+def durable_queue_from_config(
+    config: Config, send_queue: SendQueue
+) -> Optional[DurableSendQueue]:
+    if not config.journal.enabled:
+        return None
+    return DurableSendQueue(
+        send_queue,
+        config.journal.path,
+        max_attempts=config.journal.max_attempts,
+        backoff=config.journal.backoff,
+        max_backoff=config.journal.max_backoff,
+        commit_interval=config.journal.commit_interval,
+        poll_interval=config.journal.poll_interval,
+    )
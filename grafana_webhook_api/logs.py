@@ -0,0 +1,174 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.logs"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Queued logging, so console and log file writes never stall the event loop or the sms
+senders
+Handlers set up by server.py are moved behind a QueueListener thread. Records are put
+into a bounded queue with their arguments merged into the message, lines are formatted
+by the listener, and records are dropped and counted when the queue is full
+Optionally, records are written as JSON lines
+"""
+
+
+from typing import Optional
+import json
+import queue
+import logging
+import logging.handlers
+import threading
+from datetime import datetime, timezone
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.metrics import LOG_DROPPED
+
+
+logger = logging.getLogger()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Never waits for the listener, records which don't fit into the queue are dropped
+    The number of dropped records is logged with the next record that fits
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        # Only merge arguments into the message, lines are formatted by the listener
+        self.setFormatter(_MessageFormatter())
+        self.dropped = 0
+        self._reported = 0
+        # Records are enqueued from the event loop and sender threads
+        self._lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord):
+        # Records which cannot fit are dropped before spending time formatting them
+        if self.queue.full():
+            self._drop()
+            return
+        super().emit(record)
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+        LOG_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments may change, and tracebacks keep whole frames alive, before the
+        # listener gets to the record
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = self.formatter.formatException(record.exc_info)
+        record = super().prepare(record)
+        record.exc_text = exc_text
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Filled up since emit() checked
+            self._drop()
+            return
+        with self._lock:
+            dropped = self.dropped - self._reported
+            self._reported += dropped
+        if dropped:
+            try:
+                self.queue.put_nowait(
+                    logger.makeRecord(
+                        logger.name,
+                        logging.WARNING,
+                        __file__,
+                        0,
+                        "Log queue full, dropped %s log records",
+                        (dropped,),
+                        None,
+                    )
+                )
+            except queue.Full:
+                # Reported with the next record
+                with self._lock:
+                    self._reported -= dropped
+
+
+class _MessageFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return record.getMessage()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Queued records only keep the formatted traceback
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueuedLogging:
+    def __init__(self, listener: logging.handlers.QueueListener):
+        self.listener = listener
+
+    def stop(self):
+        """
+        Writes pending records, and puts handlers back on the root logger
+        """
+        self.listener.stop()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if isinstance(handler, DroppingQueueHandler):
+                root.removeHandler(handler)
+        for handler in self.listener.handlers:
+            root.addHandler(handler)
+
+
+def logging_from_config(config: Config) -> Optional[QueuedLogging]:
+    """
+    Sets up root logger handlers, returns None unless logging is queued
+    Must run in every server worker, as the listener thread doesn't survive forks
+    """
+    root = logging.getLogger()
+    if config.logging.format == "json":
+        for handler in root.handlers:
+            handler.setFormatter(JsonFormatter())
+    if not config.logging.queued:
+        return None
+    handlers = [
+        handler
+        for handler in root.handlers
+        if not isinstance(handler, DroppingQueueHandler)
+    ]
+    if not handlers:
+        return None
+    log_queue = queue.Queue(maxsize=config.logging.max_queue_size)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    return QueuedLogging(listener)
@@ -0,0 +1,484 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.metrics"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Prometheus text format metrics
+
+Every thread updates its own shard of a metric, so updates never take a lock, and shards
+are summed when metrics are scraped
+With multiple server workers, every worker periodically writes its metrics snapshot into
+a shared directory, and /metrics sums the counters and histograms of all live workers
+Gauges aren't summed, every worker's value is given with its own worker label
+"""
+
+
+from typing import Optional, List, Tuple, Callable, Dict
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from grafana_webhook_api.configuration import Config
+
+
+logger = logging.getLogger()
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+# gammu-smsd reports come after modem sends and retries
+REPORT_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = {}
+            # Only taken once per thread
+            with self._shards_lock:
+                self._shards.append(values)
+            self._local.values = values
+            return values
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def snapshot(self) -> Dict[tuple, object]:
+        raise NotImplementedError
+
+    @classmethod
+    def merge(cls, values: dict, other: dict):
+        raise NotImplementedError
+
+    def expose(self, values: dict) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[tuple, float]:
+        values = {}
+        for shard in list(self._shards):
+            for key, value in dict(shard).items():
+                values[key] = values.get(key, 0) + value
+        return values
+
+    @classmethod
+    def merge(cls, values: dict, other: dict):
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def expose(self, values: dict) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, key)} {_format(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    """
+    Value read from a callback when metrics are scraped
+    Values of a queue or a limit don't add up between workers, so they are labelled with
+    the worker pid instead of being summed
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation, labels=("worker",))
+        self._callback: Optional[Callable[[], float]] = None
+
+    def set_function(self, callback: Callable[[], float]):
+        self._callback = callback
+
+    def snapshot(self) -> Dict[tuple, float]:
+        if self._callback is None:
+            return {}
+        try:
+            return {(str(os.getpid()),): self._callback()}
+        except Exception as exc:
+            logger.debug(f"Cannot read gauge {self.name}: {exc}")
+            return {}
+
+    @classmethod
+    def merge(cls, values: dict, other: dict):
+        # Keys are worker pids, the latest snapshot of a worker wins
+        values.update(other)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        try:
+            counts = shard[key]
+        except KeyError:
+            # One count per bucket, then +Inf, then sum
+            counts = shard[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def snapshot(self) -> Dict[tuple, list]:
+        values = {}
+        for shard in list(self._shards):
+            for key, counts in dict(shard).items():
+                counts = list(counts)
+                if key in values:
+                    values[key] = [a + b for a, b in zip(values[key], counts)]
+                else:
+                    values[key] = counts
+        return values
+
+    @classmethod
+    def merge(cls, values: dict, other: dict):
+        for key, counts in other.items():
+            if key in values:
+                values[key] = [a + b for a, b in zip(values[key], counts)]
+            else:
+                values[key] = list(counts)
+
+    def expose(self, values: dict) -> List[str]:
+        lines = []
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+                cumulative += count
+                le = 'le="{}"'.format(_format(bound))
+                labels = _labels(self.label_names, key, le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format(float(counts[-1]))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> dict:
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def expose(self, snapshots: Optional[List[dict]] = None) -> str:
+        """
+        Text exposition of our metrics, merged with other workers snapshots if given
+        """
+        values = self.snapshot()
+        for other in snapshots or []:
+            for metric in self.metrics:
+                if metric.name in other:
+                    metric.merge(values[metric.name], other[metric.name])
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += metric.expose(values[metric.name])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and their duration per route template, so numbers in paths don't
+    create new series
+    Handlers find the request start time in scope to measure their own stages
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        scope["metrics_start"] = begin = time.perf_counter()
+        status_code = 500
+
+        async def _send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS.inc(route=route, status_code=status_code)
+            REQUEST_SECONDS.observe(time.perf_counter() - begin, route=route)
+
+
+def observe_parse(scope: dict):
+    """
+    Time from request start until the handler runs, which covers reading the body, json
+    parsing, model validation and authentication
+    """
+    begin = scope.get("metrics_start")
+    route = scope.get("route")
+    if begin is not None and route is not None:
+        PARSE_SECONDS.observe(time.perf_counter() - begin, route=route.path)
+
+
+class WorkerSnapshots:
+    """
+    Shares metrics between server workers through snapshot files in directory
+    Snapshots not updated within three intervals belong to dead workers and are ignored
+    """
+
+    def __init__(self, registry: Registry, directory: str, interval: float = 5):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"metrics_{os.getpid()}.json")
+
+    def write(self):
+        # Label tuples aren't valid json keys, store them as lists
+        snapshot = {
+            name: [[list(key), value] for key, value in values.items()]
+            for name, values in self.registry.snapshot().items()
+        }
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file_handle:
+            json.dump(snapshot, file_handle)
+        os.replace(temporary_path, self.path)
+
+    def read_others(self) -> List[dict]:
+        snapshots = []
+        now = time.time()
+        for file in os.listdir(self.directory):
+            path = os.path.join(self.directory, file)
+            if (
+                not file.startswith("metrics_")
+                or not file.endswith(".json")
+                or path == self.path
+            ):
+                continue
+            try:
+                if os.stat(path).st_mtime < now - 3 * self.interval:
+                    continue
+                with open(path, "r", encoding="utf-8") as file_handle:
+                    snapshot = json.load(file_handle)
+            except (OSError, ValueError):
+                continue
+            snapshots.append(
+                {
+                    name: {tuple(key): value for key, value in values}
+                    for name, values in snapshot.items()
+                }
+            )
+        return snapshots
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            while True:
+                try:
+                    await loop.run_in_executor(None, self.write)
+                except OSError as exc:
+                    logger.error(f"Cannot write metrics snapshot: {exc}")
+                await asyncio.sleep(self.interval)
+        finally:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(
+    Counter(
+        "grafana_webhook_requests_total",
+        "HTTP requests by route and status code",
+        ("route", "status_code"),
+    )
+)
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "grafana_webhook_request_seconds",
+        "HTTP request duration by route",
+        ("route",),
+    )
+)
+PARSE_SECONDS = REGISTRY.register(
+    Histogram(
+        "grafana_webhook_parse_seconds",
+        "Time spent reading, parsing and validating payloads until the handler runs",
+        ("route",),
+        buckets=FAST_BUCKETS,
+    )
+)
+RENDER_SECONDS = REGISTRY.register(
+    Histogram(
+        "grafana_webhook_render_seconds",
+        "Time spent rendering alert messages",
+        buckets=FAST_BUCKETS,
+    )
+)
+QUEUE_DEPTH = REGISTRY.register(
+    Gauge("grafana_webhook_queue_depth", "sms waiting in the send queue")
+)
+ADMISSION_LIMIT = REGISTRY.register(
+    Gauge(
+        "grafana_webhook_admission_limit",
+        "Adaptive limit of outstanding sms before low priority requests are refused",
+    )
+)
+COALESCE_PENDING = REGISTRY.register(
+    Gauge("grafana_webhook_coalesce_pending", "Messages buffered by the coalescer")
+)
+GATEWAY_SECONDS = REGISTRY.register(
+    Histogram(
+        "grafana_webhook_gateway_seconds",
+        "sms delivery backend latency by backend and result",
+        ("backend", "result"),
+    )
+)
+SMS = REGISTRY.register(
+    Counter(
+        "grafana_webhook_sms_total",
+        "sms by result: sent, failed or rate_limited",
+        ("result",),
+    )
+)
+RATE_LIMITED = REGISTRY.register(
+    Counter(
+        "grafana_webhook_rate_limited_total",
+        "sms refused by rate limits, by rule",
+        ("rule",),
+    )
+)
+DROPPED = REGISTRY.register(
+    Counter(
+        "grafana_webhook_dropped_total",
+        "sms not queued, by reason: queue_full, journal_error, min_interval, overload",
+        ("reason",),
+    )
+)
+DEDUP = REGISTRY.register(
+    Counter(
+        "grafana_webhook_dedup_total",
+        "Duplicate notification lookups by result: hit or miss",
+        ("result",),
+    )
+)
+ALERT_STATE = REGISTRY.register(
+    Counter(
+        "grafana_webhook_alert_state_total",
+        "Sub alerts of grafana notifications by state: changed or unchanged",
+        ("result",),
+    )
+)
+GATEWAY_EJECTIONS = REGISTRY.register(
+    Counter(
+        "grafana_webhook_gateway_ejections_total",
+        "Delivery gateways taken out of rotation by health checks",
+        ("gateway",),
+    )
+)
+LOG_DROPPED = REGISTRY.register(
+    Counter(
+        "grafana_webhook_log_dropped_total",
+        "Log records dropped because the log queue was full",
+    )
+)
+DELIVERY_REPORTS = REGISTRY.register(
+    Counter(
+        "grafana_webhook_delivery_reports_total",
+        "gammu-smsd delivery reports by status: sent, delivered, failed or unknown",
+        ("status",),
+    )
+)
+DELIVERY_REPORT_SECONDS = REGISTRY.register(
+    Histogram(
+        "grafana_webhook_delivery_report_seconds",
+        "Time from handing a sms to gammu-smsd until its delivery report, by status",
+        ("status",),
+        buckets=REPORT_BUCKETS,
+    )
+)
+DELIVERY_PENDING = REGISTRY.register(
+    Gauge(
+        "grafana_webhook_delivery_pending",
+        "sms handed to gammu-smsd still waiting for a delivery report",
+    )
+)
+COMMAND_EXIT_CODES = REGISTRY.register(
+    Counter(
+        "grafana_webhook_command_exit_codes_total",
+        "sms_command (eg gammu-smsd-inject) exit codes",
+        ("exit_code",),
+    )
+)
+
+
+def worker_snapshots_from_config(config: Config) -> Optional[WorkerSnapshots]:
+    """
+    Returns None unless metrics are shared between workers
+    """
+    if not config.metrics.enabled or not config.metrics.directory:
+        return None
+    return WorkerSnapshots(
+        REGISTRY, config.metrics.directory, interval=config.metrics.interval
+    )
@@ -3,20 +3,34 @@
 #
 # This file is part of grafana_webhook_api
 
-__intname__ = "grafana_webhook_api.server"
+__intname__ = "grafana_webhook_api.models"
 __author__ = "Orsiris de Jong"
-__copyright__ = "Copyright (C) 2023-2024 NetInvent"
+__copyright__ = "Copyright (C) 2023-2026 NetInvent"
 __license__ = "BSD-3 Clause"
-__build__ = "2024030901"
-__version__ = "1.2.0"
+__build__ = "2026101801"
+__version__ = "1.3.0"
 
 """
 These models were tested on Grafana 9x and 10x alerts.
+
+AlertMessageView is a lean alternative to AlertMessage, which only keeps the fields used
+to route and render alerts, and skips pydantic model construction of every sub alert
 """
 
 
-from pydantic import BaseModel
-from typing import List, Optional, Any
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, model_validator
+from typing import List, Optional, Any, Union
+import re
+import copy
+import json
+
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
 
 class Alert(BaseModel):
@@ -53,3 +67,254 @@ class AlertMessage(BaseModel):
 
 class Message(BaseModel):
     message: Optional[str] = None
+
+
+class BulkMessage(BaseModel):
+    """
+    Item of a bulk /send request, numbers may be separated with ';' like in /send URLs
+    """
+
+    number: Optional[str] = None
+    numbers: Union[str, List[str], None] = None
+    message: str = Field(min_length=1)
+    priority: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _has_numbers(self):
+        if not self.number and not self.numbers:
+            raise ValueError("number or numbers is required")
+        return self
+
+    def all_numbers(self) -> List[str]:
+        numbers = [self.number] if self.number else []
+        if isinstance(self.numbers, str):
+            numbers += self.numbers.split(";")
+        elif self.numbers:
+            numbers += self.numbers
+        return numbers
+
+
+_BULK_MESSAGES = TypeAdapter(List[BulkMessage])
+
+
+class PayloadError(ValueError):
+    """
+    Invalid webhook payload, errors are given in pydantic format
+    """
+
+    def __init__(self, location: tuple, message: str):
+        super().__init__(f"{'.'.join(str(item) for item in location)}: {message}")
+        self.location = location
+        self.message = message
+
+    def errors(self) -> list:
+        return [
+            {
+                "type": "value_error",
+                "loc": ("body", *self.location),
+                "msg": self.message,
+                "input": None,
+            }
+        ]
+
+
+class BulkPayloadError(ValueError):
+    """
+    Invalid bulk /send items, errors of all items are given in pydantic format
+    """
+
+    def __init__(self, errors: list):
+        super().__init__(f"{len(errors)} invalid items")
+        self._errors = errors
+
+    def errors(self) -> list:
+        return [dict(error, loc=("body", *error["loc"])) for error in self._errors]
+
+
+class AlertView:
+    __slots__ = ("status", "labels", "fingerprint")
+
+    def __init__(self, status: Optional[str], labels: dict, fingerprint: Optional[str]):
+        self.status = status
+        self.labels = labels
+        self.fingerprint = fingerprint
+
+    def __repr__(self) -> str:
+        return (
+            f"AlertView(status={self.status!r}, labels={self.labels!r}, "
+            f"fingerprint={self.fingerprint!r})"
+        )
+
+
+class AlertMessageView:
+    """
+    Same attributes as AlertMessage for the fields it keeps
+    """
+
+    __slots__ = (
+        "status",
+        "alerts",
+        "groupLabels",
+        "commonLabels",
+        "externalURL",
+        "groupKey",
+        "orgId",
+        "title",
+        "message",
+    )
+
+    def __repr__(self) -> str:
+        return "AlertMessageView({})".format(
+            ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        )
+
+
+def with_alerts(
+    alert: Union[AlertMessage, AlertMessageView], alerts: list
+) -> Union[AlertMessage, AlertMessageView]:
+    """
+    Shallow copy of alert keeping only the given sub alerts
+    """
+    if isinstance(alert, AlertMessageView):
+        view = copy.copy(alert)
+        view.alerts = alerts
+        return view
+    return alert.model_copy(update={"alerts": alerts})
+
+
+_INTEGER = re.compile(r"[+-]?[0-9]+")
+
+
+def _get(payload: dict, name: str, kind: type, location: tuple = (), default=...):
+    try:
+        value = payload[name]
+    except KeyError:
+        if default is ...:
+            raise PayloadError((*location, name), "Field required") from None
+        return default
+    if value is None and default is None:
+        return None
+    if not isinstance(value, kind):
+        raise PayloadError(
+            (*location, name), f"Input should be a valid {kind.__name__}"
+        )
+    return value
+
+
+def parse_alert_message(body: bytes) -> AlertMessageView:
+    """
+    Decode a grafana webhook payload into an AlertMessageView
+    Fields used by AlertMessageView are checked like AlertMessage does, others are ignored
+    Raises PayloadError
+    """
+    try:
+        payload = _loads(body)
+    except ValueError as exc:
+        raise PayloadError((), f"JSON decode error: {exc}") from None
+    if not isinstance(payload, dict):
+        raise PayloadError((), "Input should be a valid dictionary")
+
+    alerts = []
+    for index, alert in enumerate(_get(payload, "alerts", list)):
+        location = ("alerts", index)
+        if not isinstance(alert, dict):
+            raise PayloadError(location, "Input should be a valid dictionary")
+        alerts.append(
+            AlertView(
+                _get(alert, "status", str, location, None),
+                _get(alert, "labels", dict, location),
+                _get(alert, "fingerprint", str, location, None),
+            )
+        )
+
+    view = AlertMessageView()
+    view.status = _get(payload, "status", str)
+    view.alerts = alerts
+    view.groupLabels = _get(payload, "groupLabels", dict, default=None)
+    view.commonLabels = _get(payload, "commonLabels", dict, default=None)
+    view.externalURL = _get(payload, "externalURL", str)
+    view.groupKey = _get(payload, "groupKey", str)
+    org_id = _get(payload, "orgId", object)
+    # Like pydantic, integral numeric strings are accepted, but not booleans nor floats
+    if not (
+        (isinstance(org_id, int) and not isinstance(org_id, bool))
+        or (isinstance(org_id, str) and _INTEGER.fullmatch(org_id))
+    ):
+        raise PayloadError(("orgId",), "Input should be a valid integer")
+    view.orgId = int(org_id)
+    view.title = _get(payload, "title", str)
+    view.message = _get(payload, "message", str)
+    return view
+
+
+def _inline_references(schema, definitions: dict):
+    if isinstance(schema, dict):
+        if "$ref" in schema:
+            name = schema["$ref"].rsplit("/", 1)[-1]
+            return _inline_references(definitions[name], definitions)
+        return {
+            key: _inline_references(value, definitions)
+            for key, value in schema.items()
+            if key != "$defs"
+        }
+    if isinstance(schema, list):
+        return [_inline_references(value, definitions) for value in schema]
+    return schema
+
+
+def alert_message_request_body() -> dict:
+    """
+    OpenAPI request body of endpoints reading AlertMessage payloads themselves
+    """
+    schema = AlertMessage.model_json_schema()
+    return {
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "schema": _inline_references(schema, schema.get("$defs", {}))
+                }
+            }
+        }
+    }
+
+
+def parse_bulk_messages(body: bytes) -> List[BulkMessage]:
+    """
+    body is a JSON array or NDJSON, one item per line
+    Every item is validated before any of them is used, errors of all items are raised
+    at once as a BulkPayloadError, located by item index
+    """
+    if body.lstrip()[:1] == b"[":
+        try:
+            return _BULK_MESSAGES.validate_json(body)
+        except ValidationError as exc:
+            raise BulkPayloadError(exc.errors(include_url=False)) from None
+    messages = []
+    errors = []
+    for index, line in enumerate(line for line in body.splitlines() if line.strip()):
+        try:
+            messages.append(BulkMessage.model_validate_json(line))
+        except ValidationError as exc:
+            errors += [
+                dict(error, loc=(index, *error["loc"]))
+                for error in exc.errors(include_url=False)
+            ]
+    if errors:
+        raise BulkPayloadError(errors)
+    return messages
+
+
+def bulk_messages_request_body() -> dict:
+    """
+    OpenAPI request body of the bulk /send endpoint
+    """
+    schema = _BULK_MESSAGES.json_schema()
+    schema = _inline_references(schema, schema.get("$defs", {}))
+    return {
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": schema},
+                "application/x-ndjson": {"schema": schema["items"]},
+            }
+        }
+    }
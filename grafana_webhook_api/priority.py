@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.priority"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+SMS priorities, computed from alert status and labels
+Sub alerts get the priority of the first matching rule, a message gets the highest
+priority of its sub alerts
+Queued sms are sent by priority, and the last sends allowed by rate limits are kept
+for high priority sms
+"""
+
+
+from typing import Optional, List, Dict, Union
+import logging
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.models import AlertMessage
+
+
+logger = logging.getLogger()
+
+
+class PriorityRule:
+    __slots__ = ("status", "labels", "priority")
+
+    def __init__(
+        self,
+        priority: int,
+        status: Optional[str] = None,
+        labels: Optional[Dict[str, Union[str, List[str]]]] = None,
+    ):
+        self.priority = priority
+        self.status = status
+        # label: accepted values
+        self.labels = tuple(
+            (label, frozenset([values] if isinstance(values, str) else values))
+            for label, values in (labels or {}).items()
+        )
+
+    def matches(self, status: Optional[str], labels: dict) -> bool:
+        if self.status is not None and status != self.status:
+            return False
+        for label, values in self.labels:
+            if labels.get(label) not in values:
+                return False
+        return True
+
+
+class Priorities:
+    def __init__(
+        self,
+        rules: Optional[List[PriorityRule]] = None,
+        default: int = 0,
+        high_priority: int = 10,
+        reserved: int = 0,
+    ):
+        self.rules = rules or []
+        self.default = default
+        self.high_priority = high_priority
+        self.reserved = reserved
+
+    def _priority(self, status: Optional[str], labels: dict) -> int:
+        for rule in self.rules:
+            if rule.matches(status, labels):
+                return rule.priority
+        return self.default
+
+    def priority(self, alert: AlertMessage) -> int:
+        if not self.rules:
+            return self.default
+        if not alert.alerts:
+            return self._priority(alert.status, alert.commonLabels or {})
+        return max(
+            self._priority(sub_alert.status, sub_alert.labels)
+            for sub_alert in alert.alerts
+        )
+
+    def reserve(self, priority: int) -> int:
+        """
+        Rate limit sends kept for high priority sms, which lower priorities may not use
+        """
+        return 0 if priority >= self.high_priority else self.reserved
+
+
+def priorities_from_config(config: Config) -> Priorities:
+    return Priorities(
+        rules=[
+            PriorityRule(rule.priority, status=rule.status, labels=rule.labels)
+            for rule in config.priority.rules
+        ],
+        default=config.priority.default,
+        high_priority=config.priority.high_priority,
+        reserved=config.priority.reserved,
+    )
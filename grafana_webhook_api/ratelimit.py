@@ -0,0 +1,324 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.ratelimit"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Rate limiting rules, built once from configuration
+Every rule applies either per number, per alert group, per tenant or globally, and limits
+sends with a sliding window (at most count sends within interval) or a token bucket
+(bursts of count sends, refilled at count per interval)
+"""
+
+
+from typing import Optional, List, Set
+import time
+import logging
+from collections import deque
+from grafana_webhook_api.configuration import Config
+
+
+logger = logging.getLogger()
+
+SCOPES = ("number", "group", "tenant", "global")
+MODES = ("window", "bucket")
+
+
+class Refusal(str):
+    """
+    Reason a send was refused, which remembers the rule that refused it
+    """
+
+    def __new__(cls, rule: "RateLimitRule", scope_key: str):
+        refusal = super().__new__(
+            cls, f"Rate limit {rule.description} reached for {rule.scope} {scope_key}"
+        )
+        refusal.rule = rule
+        return refusal
+
+
+class SlidingWindow:
+    """
+    Keeps the last count send timestamps in a ring buffer, so checks are O(1)
+    """
+
+    __slots__ = ("count", "interval", "_events")
+
+    def __init__(self, count: int, interval: float):
+        self.count = count
+        self.interval = interval
+        self._events = deque(maxlen=count)
+
+    def allows(self, now: float, reserve: int = 0) -> bool:
+        """
+        reserve sends within interval are kept for others
+        """
+        limit = self.count - reserve
+        return len(self._events) < limit or self._events[-limit] <= now - self.interval
+
+    def record(self, now: float):
+        # deque maxlen drops the oldest timestamp by itself
+        self._events.append(now)
+
+    def idle(self, now: float) -> bool:
+        return not self._events or self._events[-1] <= now - self.interval
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, count: int, interval: float):
+        self.capacity = float(count)
+        self.rate = count / interval
+        self.tokens = self.capacity
+        self.updated = None
+
+    def _refill(self, now: float):
+        if self.updated is not None:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+        self.updated = now
+
+    def allows(self, now: float, reserve: int = 0) -> bool:
+        self._refill(now)
+        return self.tokens >= 1 + reserve
+
+    def record(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class RateLimitRule:
+    __slots__ = (
+        "name",
+        "scope",
+        "mode",
+        "count",
+        "interval",
+        "tenant",
+        "excluded_tenants",
+        "description",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        scope: str,
+        count: int,
+        interval: float,
+        mode: str = "window",
+        tenant: Optional[str] = None,
+        excluded_tenants: Optional[Set[str]] = None,
+    ):
+        """
+        Tenant scoped rules apply to tenant only when given, else to every tenant but
+        excluded_tenants, which have their own rules
+        """
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown rate limit scope {scope}")
+        if mode not in MODES:
+            raise ValueError(f"Unknown rate limit mode {mode}")
+        if count < 1 or interval <= 0:
+            raise ValueError(f"Bogus rate limit {count}/{interval}")
+        self.name = name
+        self.scope = scope
+        self.mode = mode
+        self.count = int(count)
+        self.interval = float(interval)
+        self.tenant = tenant
+        self.excluded_tenants = frozenset(excluded_tenants or ())
+        self.description = (
+            f"{name} ({self.count}/{int(self.interval)}s {mode} per {scope})"
+        )
+
+    @classmethod
+    def from_string(
+        cls, name: str, scope: str, limit: str, mode: str = "window", **kwargs
+    ):
+        """
+        limit is given as count/interval, eg 5/300
+        """
+        count, interval = str(limit).split("/")
+        return cls(name, scope, int(count), float(interval), mode=mode, **kwargs)
+
+    def applies_to_tenant(self, tenant: str) -> bool:
+        if self.tenant is not None:
+            return tenant == self.tenant
+        return tenant not in self.excluded_tenants
+
+    def reserve(self, reserve: int) -> int:
+        """
+        At least one send is always allowed, so per number limits of a single sms still work
+        """
+        return max(min(reserve, self.count - 1), 0)
+
+    def new_limiter(self):
+        if self.mode == "bucket":
+            return TokenBucket(self.count, self.interval)
+        return SlidingWindow(self.count, self.interval)
+
+    def __repr__(self) -> str:
+        return self.description
+
+
+class RateLimiter:
+    """
+    Not thread safe, callers must serialize admit() calls
+    """
+
+    def __init__(self, rules: List[RateLimitRule], evict_interval: float = 60):
+        self.rules = rules
+        self.evict_interval = evict_interval
+        # (rule index, scope key): limiter
+        self._limiters = {}
+        self._last_evict = time.monotonic()
+
+    def set_rules(self, rules: List[RateLimitRule]):
+        """
+        Replace rules, windows and buckets of rules whose description didn't change are kept
+        so a configuration reload doesn't reset rate limits
+        """
+        indexes = {rule.description: index for index, rule in enumerate(rules)}
+        limiters = {}
+        for (index, scope_key), limiter in self._limiters.items():
+            new_index = indexes.get(self.rules[index].description)
+            if new_index is not None:
+                limiters[(new_index, scope_key)] = limiter
+        self.rules = rules
+        self._limiters = limiters
+
+    def admit(
+        self,
+        number: str,
+        group: Optional[str] = None,
+        now: Optional[float] = None,
+        reserve: int = 0,
+        tenant: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Records the send and returns None when all rules allow it, else returns the reason
+        reserve is the number of sends of every rule kept for high priority sms
+        """
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_evict > self.evict_interval:
+            self.evict(now)
+
+        limiters = []
+        for index, rule in enumerate(self.rules):
+            scope = rule.scope
+            if scope == "number":
+                scope_key = number
+            elif scope == "group":
+                if group is None:
+                    continue
+                scope_key = group
+            elif scope == "tenant":
+                if tenant is None or not rule.applies_to_tenant(tenant):
+                    continue
+                scope_key = tenant
+            else:
+                scope_key = "global"
+            limiter = self._limiters.get((index, scope_key))
+            if limiter is None:
+                limiter = rule.new_limiter()
+                self._limiters[(index, scope_key)] = limiter
+            if not limiter.allows(now, rule.reserve(reserve) if reserve else 0):
+                return Refusal(rule, scope_key)
+            limiters.append(limiter)
+
+        for limiter in limiters:
+            limiter.record(now)
+        return None
+
+    def evict(self, now: Optional[float] = None):
+        """
+        Drop limiters that would allow a send anyway, so state doesn't grow with every new number
+        """
+        if now is None:
+            now = time.monotonic()
+        self._limiters = {
+            key: limiter
+            for key, limiter in self._limiters.items()
+            if not limiter.idle(now)
+        }
+        self._last_evict = now
+
+    def stats(self) -> dict:
+        return {"limiters": len(self._limiters)}
+
+
+def rules_from_config(config: Config) -> List[RateLimitRule]:
+    """
+    min_interval and global_rate_limit keys are kept as shortcuts for the
+    per number and global sliding window rules
+    """
+    rules = []
+    if config.min_interval:
+        rules.append(
+            RateLimitRule("min_interval", "number", 1, float(config.min_interval))
+        )
+    else:
+        logger.info("No server side per number limit defined")
+    if config.global_rate_limit:
+        rules.append(
+            RateLimitRule.from_string(
+                "global_rate_limit", "global", config.global_rate_limit
+            )
+        )
+    else:
+        logger.info("No global rate limit defined")
+    for index, rate_limit in enumerate(config.rate_limits):
+        rules.append(
+            RateLimitRule.from_string(
+                f"rate_limits[{index}]",
+                rate_limit.scope,
+                rate_limit.limit,
+                mode=rate_limit.mode,
+            )
+        )
+    if config.tenants.enabled:
+        tenant_limits = {
+            name: tenant.rate_limit
+            for name, tenant in config.tenants.tenants.items()
+            if tenant.rate_limit
+        }
+        if config.tenants.rate_limit:
+            rules.append(
+                RateLimitRule.from_string(
+                    "tenants.rate_limit",
+                    "tenant",
+                    config.tenants.rate_limit,
+                    mode=config.tenants.mode,
+                    excluded_tenants=set(tenant_limits),
+                )
+            )
+        for name, limit in tenant_limits.items():
+            rules.append(
+                RateLimitRule.from_string(
+                    f"tenants.{name}.rate_limit",
+                    "tenant",
+                    limit,
+                    mode=config.tenants.mode,
+                    tenant=name,
+                )
+            )
+    for rule in rules:
+        logger.info(f"Using rate limit {rule}")
+    return rules
+
+
+def rate_limiter_from_config(config: Config) -> RateLimiter:
+    return RateLimiter(rules_from_config(config))
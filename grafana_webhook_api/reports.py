@@ -0,0 +1,531 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.reports"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Delivery reports of sms handed over to gammu-smsd
+A backend send only tells the sms reached gammu-smsd outbox. The modem result is read
+afterwards from gammu-smsd itself:
+files: sent sms are moved by gammu-smsd into its sent directory, failed ones into its error
+       directory, keeping their outbox file name. Both directories are watched with inotify
+       (watchfiles) when available, and checked every poll_interval anyway
+sql: sent and failed sms end up in gammu-smsd sentitems table with their outbox ID, which
+     is queried for pending sms every poll_interval, batch_size IDs per query. Sent sms
+     stay tracked until the network delivery report makes them delivered or failed
+
+Every gateway of a gateway pool has its own source, command backends and gateways use
+the configured one. Sms without any report after timeout seconds are considered unknown.
+Failed sms can be resent up to retries times
+"""
+
+
+from typing import Optional, List, Dict, Tuple, Callable, AsyncIterator
+import os
+import re
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.metrics import DELIVERY_REPORTS, DELIVERY_REPORT_SECONDS
+
+
+try:
+    import watchfiles
+except ImportError:
+    watchfiles = None
+
+
+logger = logging.getLogger()
+
+PENDING = "pending"
+SENT = "sent"
+DELIVERED = "delivered"
+FAILED = "failed"
+RETRIED = "retried"
+UNKNOWN = "unknown"
+
+# gammu-smsd-inject output, ID being an outbox file path or a sql outbox ID
+INJECT_OUTPUT_REGEX = re.compile(r"Written message with ID (\S+)")
+
+# gammu-smsd sentitems Status values: (status, final), sent sms waiting for a delivery
+# report are not final yet
+SQL_STATUSES = {
+    "SendingOK": (SENT, False),
+    "SendingOKNoReport": (SENT, True),
+    "DeliveryPending": (SENT, False),
+    "DeliveryUnknown": (SENT, False),
+    "DeliveryOK": (DELIVERED, True),
+    "SendingError": (FAILED, True),
+    "DeliveryFailed": (FAILED, True),
+    "Error": (FAILED, True),
+}
+
+# Longest delay before restarting a failing report source
+MAX_SOURCE_BACKOFF = 300
+
+# reference: (status, final)
+Reports = Dict[str, Tuple[str, bool]]
+
+
+def message_reference(output: str) -> Optional[str]:
+    """
+    gammu-smsd reference of a sent sms from the delivery backend output: the outbox file
+    name of files backend, the outbox ID of sql backend, or the ID printed by gammu-smsd-inject
+    """
+    output = (output or "").strip()
+    match = INJECT_OUTPUT_REGEX.search(output)
+    if match:
+        output = match.group(1)
+    return os.path.basename(output) or None
+
+
+class Delivery:
+    __slots__ = (
+        "reference",
+        "number",
+        "message",
+        "group",
+        "priority",
+        "tenant",
+        "attempt",
+        "gateway",
+        "status",
+        "submitted",
+        "updated",
+    )
+
+    def __init__(
+        self,
+        reference: str,
+        number: str,
+        message: str,
+        group: Optional[str],
+        priority: int,
+        tenant: Optional[str],
+        attempt: int,
+        gateway: Optional[str] = None,
+    ):
+        self.reference = reference
+        self.number = number
+        self.message = message
+        self.group = group
+        self.priority = priority
+        self.tenant = tenant
+        self.attempt = attempt
+        # Report source, None for the configured one
+        self.gateway = gateway
+        self.status = PENDING
+        self.submitted = time.time()
+        self.updated = self.submitted
+
+    def as_dict(self) -> dict:
+        return {
+            "reference": self.reference,
+            "number": self.number,
+            "status": self.status,
+            "attempt": self.attempt,
+            "gateway": self.gateway,
+            "submitted": self.submitted,
+            "updated": self.updated,
+        }
+
+
+class SpoolReports:
+    """
+    gammu-smsd files backend sent and error directories
+    """
+
+    name = "files"
+
+    def __init__(self, sent_path: str, error_path: str):
+        self.sent_path = sent_path
+        self.error_path = error_path
+
+    def accepts(self, reference: str) -> bool:
+        return reference.startswith("OUT")
+
+    def check(self, references: List[str]) -> Reports:
+        # files backend has no delivery report, sent is final
+        reports = {}
+        for reference in references:
+            if os.path.exists(os.path.join(self.sent_path, reference)):
+                reports[reference] = (SENT, True)
+            elif os.path.exists(os.path.join(self.error_path, reference)):
+                reports[reference] = (FAILED, True)
+        return reports
+
+    def _report(self, path: str) -> Optional[Tuple[str, bool]]:
+        directory = os.path.dirname(path)
+        if os.path.samefile(directory, self.sent_path):
+            return SENT, True
+        if os.path.samefile(directory, self.error_path):
+            return FAILED, True
+        return None
+
+    async def watch(self, interval: float) -> AsyncIterator[Reports]:
+        """
+        Yields reports of files moved into watched directories, or nothing every interval
+        """
+        if watchfiles is not None:
+            try:
+                async for changes in watchfiles.awatch(
+                    self.sent_path,
+                    self.error_path,
+                    watch_filter=lambda change, _: change == watchfiles.Change.added,
+                    debounce=200,
+                    rust_timeout=int(interval * 1000),
+                    yield_on_timeout=True,
+                    recursive=False,
+                ):
+                    reports = {}
+                    for _, path in changes:
+                        try:
+                            report = self._report(path)
+                        except OSError:
+                            continue
+                        if report:
+                            reports[os.path.basename(path)] = report
+                    yield reports
+            except (OSError, RuntimeError) as exc:
+                logger.warning(
+                    "Cannot watch gammu-smsd directories, polling them instead: %s", exc
+                )
+        while True:
+            yield {}
+            await asyncio.sleep(interval)
+
+
+class SQLReports:
+    """
+    gammu-smsd sql backend sentitems table
+    """
+
+    name = "sql"
+
+    def __init__(self, database: str):
+        self.database = database
+        self._local = threading.local()
+
+    def accepts(self, reference: str) -> bool:
+        return reference.isdigit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"file:{self.database}?mode=ro", uri=True, timeout=10
+            )
+            self._local.conn = conn
+        return conn
+
+    def check(self, references: List[str]) -> Reports:
+        # Every part of a multipart sms has its own sentitems row
+        statuses: Dict[str, List[Tuple[str, bool]]] = {}
+        rows = self._connection().execute(
+            "SELECT ID, Status FROM sentitems WHERE ID IN ({})".format(
+                ",".join("?" * len(references))
+            ),
+            [int(reference) for reference in references],
+        )
+        for message_id, status in rows:
+            statuses.setdefault(str(message_id), []).append(
+                SQL_STATUSES.get(status, (SENT, False))
+            )
+        reports = {}
+        for reference, parts in statuses.items():
+            if any(status == FAILED for status, _ in parts):
+                reports[reference] = (FAILED, True)
+            elif all(status == DELIVERED for status, _ in parts):
+                reports[reference] = (DELIVERED, True)
+            else:
+                reports[reference] = (SENT, all(final for _, final in parts))
+        return reports
+
+    async def watch(self, interval: float) -> AsyncIterator[Reports]:
+        while True:
+            yield {}
+            await asyncio.sleep(interval)
+
+
+class DeliveryTracker:
+    def __init__(
+        self,
+        sources: dict,
+        poll_interval: float = 5,
+        batch_size: int = 500,
+        timeout: float = 3600,
+        max_size: int = 10000,
+        retries: int = 0,
+    ):
+        """
+        sources are {gateway name: report source}, the None key being the source of
+        sms whose gateway has no source of its own
+        """
+        self.sources = sources
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_size = max(int(max_size), 1)
+        self.retries = retries
+        # Called with a failed Delivery to send it again, set once the send queue exists
+        self.resend: Optional[Callable[[Delivery], None]] = None
+        # Sms are tracked by sender threads and reported on the event loop
+        self._lock = threading.Lock()
+        # (gateway, reference): Delivery, oldest first
+        self._deliveries: "OrderedDict[tuple, Delivery]" = OrderedDict()
+        # Deliveries still waiting for a final report, oldest first
+        self._pending: "OrderedDict[tuple, Delivery]" = OrderedDict()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def track(
+        self,
+        output: str,
+        number: str,
+        message: str,
+        group: Optional[str] = None,
+        priority: int = 0,
+        tenant: Optional[str] = None,
+        attempt: int = 0,
+        gateway: Optional[str] = None,
+    ):
+        """
+        Remember a sms handed over to gammu-smsd, output being the delivery backend output
+        and gateway the gateway pool member which sent it
+        """
+        if gateway not in self.sources:
+            gateway = None
+        source = self.sources.get(gateway)
+        reference = message_reference(output)
+        if source is None or not reference or not source.accepts(reference):
+            logger.debug("No gammu-smsd reference in delivery output %s", output)
+            return
+        delivery = Delivery(
+            reference, number, message, group, priority, tenant, attempt, gateway
+        )
+        key = (gateway, reference)
+        with self._lock:
+            self._deliveries.pop(key, None)
+            self._deliveries[key] = delivery
+            self._pending[key] = delivery
+            while len(self._deliveries) > self.max_size:
+                evicted_key, _ = self._deliveries.popitem(last=False)
+                self._pending.pop(evicted_key, None)
+
+    def update(self, reports: Reports, gateway: Optional[str] = None):
+        """
+        Apply gammu-smsd reports of a source, deliveries stay pending until their report
+        is final
+        """
+        now = time.time()
+        failed = []
+        with self._lock:
+            for reference, (status, final) in reports.items():
+                key = (gateway, reference)
+                delivery = self._pending.get(key)
+                if delivery is None:
+                    continue
+                if final:
+                    del self._pending[key]
+                if delivery.status == status:
+                    continue
+                delivery.status = status
+                delivery.updated = now
+                DELIVERY_REPORTS.inc(status=status)
+                DELIVERY_REPORT_SECONDS.observe(now - delivery.submitted, status=status)
+                if status == FAILED:
+                    failed.append(delivery)
+        for delivery in failed:
+            logger.error(
+                "gammu-smsd could not send sms %s to %s",
+                delivery.reference,
+                delivery.number,
+            )
+            if self.resend and delivery.attempt < self.retries:
+                logger.warning(
+                    "Resending sms to %s, retry %s/%s",
+                    delivery.number,
+                    delivery.attempt + 1,
+                    self.retries,
+                )
+                try:
+                    self.resend(delivery)
+                except Exception as exc:
+                    logger.error("Cannot resend sms to %s: %s", delivery.number, exc)
+                    continue
+                delivery.status = RETRIED
+
+    def expire(self):
+        """
+        Deliveries without any report after timeout become unknown, sent ones whose
+        delivery report never came stay sent
+        """
+        now = time.time()
+        expired = []
+        with self._lock:
+            while self._pending:
+                delivery = next(iter(self._pending.values()))
+                if delivery.submitted + self.timeout > now:
+                    break
+                self._pending.popitem(last=False)
+                if delivery.status == PENDING:
+                    delivery.status = UNKNOWN
+                    delivery.updated = now
+                    expired.append(delivery)
+        for delivery in expired:
+            DELIVERY_REPORTS.inc(status=UNKNOWN)
+            logger.warning(
+                "No gammu-smsd report for sms %s to %s after %ss",
+                delivery.reference,
+                delivery.number,
+                self.timeout,
+            )
+
+    async def check(self, gateway: Optional[str] = None):
+        """
+        Query the source of gateway for its pending deliveries, batch_size at a time
+        """
+        loop = asyncio.get_running_loop()
+        source = self.sources[gateway]
+        with self._lock:
+            references = [
+                reference
+                for delivery_gateway, reference in self._pending
+                if delivery_gateway == gateway
+            ]
+        for index in range(0, len(references), self.batch_size):
+            self.update(
+                await loop.run_in_executor(
+                    None,
+                    source.check,
+                    references[index : index + self.batch_size],
+                ),
+                gateway,
+            )
+
+    async def _run_source(self, gateway: Optional[str]):
+        """
+        Reads reports of a source until cancelled
+        A failing source is restarted after a delay, doubled on every consecutive failure
+        """
+        backoff = self.poll_interval
+        while True:
+            last_check = 0
+            try:
+                async for reports in self.sources[gateway].watch(self.poll_interval):
+                    if reports:
+                        self.update(reports, gateway)
+                    # Watch events may be missed, eg when gammu-smsd reports an sms before
+                    # it was tracked, so pending deliveries are checked anyway
+                    if time.monotonic() - last_check >= self.poll_interval:
+                        last_check = time.monotonic()
+                        await self.check(gateway)
+                        self.expire()
+                    backoff = self.poll_interval
+            except Exception as exc:
+                logger.error(
+                    "Cannot read gammu-smsd delivery reports%s, retrying in %ss: %s",
+                    f" of gateway {gateway}" if gateway else "",
+                    backoff,
+                    exc,
+                    exc_info=True,
+                )
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_SOURCE_BACKOFF)
+
+    async def run(self):
+        await asyncio.gather(*[self._run_source(gateway) for gateway in self.sources])
+
+    def deliveries(self, number: str, limit: int = 100) -> List[dict]:
+        """
+        Last deliveries to number, newest first
+        """
+        with self._lock:
+            deliveries = [
+                delivery.as_dict()
+                for delivery in reversed(self._deliveries.values())
+                if delivery.number == number
+            ]
+        return deliveries[:limit]
+
+    def stats(self) -> dict:
+        statuses: Dict[str, int] = {}
+        with self._lock:
+            for delivery in self._deliveries.values():
+                statuses[delivery.status] = statuses.get(delivery.status, 0) + 1
+        return {
+            "sources": {
+                gateway or "default": source.name
+                for gateway, source in self.sources.items()
+            },
+            "tracked": len(self._deliveries),
+            "pending": len(self._pending),
+            "statuses": statuses,
+        }
+
+
+def _spool_path(outbox_path: str, directory: str) -> str:
+    """
+    gammu-smsd directories are usually siblings of its outbox
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(outbox_path)), directory)
+
+
+def delivery_tracker_from_config(config: Config) -> Optional[DeliveryTracker]:
+    """
+    Returns None when delivery reports are disabled
+    The configured source follows the delivery backend unless given, gateways of a
+    gateway pool using files or sql backends get their own source
+    """
+    reports = config.delivery_reports
+    if not reports.enabled:
+        return None
+    sources = {}
+    source = reports.source or ("sql" if config.delivery.backend == "sql" else "files")
+    if source == "sql":
+        database = reports.database or config.delivery.database
+        if database:
+            sources[None] = SQLReports(database)
+        else:
+            logger.error(
+                "No gammu-smsd database configured, cannot read delivery reports"
+            )
+    else:
+        sources[None] = SpoolReports(reports.sent_path, reports.error_path)
+    for gateway in config.delivery.gateways:
+        if gateway.backend == "files":
+            sources[gateway.name] = SpoolReports(
+                gateway.sent_path or _spool_path(gateway.outbox_path, "sent"),
+                gateway.error_path or _spool_path(gateway.outbox_path, "error"),
+            )
+        elif gateway.backend == "sql" and gateway.database:
+            sources[gateway.name] = SQLReports(gateway.database)
+    if not sources:
+        return None
+    for gateway, report_source in sources.items():
+        logger.info(
+            "Reading delivery reports%s from gammu-smsd %s backend",
+            f" of gateway {gateway}" if gateway else "",
+            report_source.name,
+        )
+    return DeliveryTracker(
+        sources,
+        poll_interval=reports.poll_interval,
+        batch_size=reports.batch_size,
+        timeout=reports.timeout,
+        max_size=reports.max_size,
+        retries=reports.retries,
+    )
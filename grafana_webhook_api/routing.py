@@ -0,0 +1,174 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.routing"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Label based routing of grafana alerts to phone numbers, used by the /grafana endpoint
+when no numbers are given in the URL
+Every route matches labels against accepted values, orgId and status being matched like
+labels. A sub alert goes to the numbers of all matching routes, or to the default numbers
+
+Routes are compiled into an inverted index of (label, value): routes, every route being
+indexed under its most selective label. Routing a sub alert only looks up its own labels,
+then checks the few routes found, whatever the number of routes
+"""
+
+
+from typing import Optional, List, Dict, Tuple, Union
+import logging
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.models import AlertMessage, AlertMessageView, with_alerts
+
+logger = logging.getLogger()
+
+# Matched like labels, unless alerts have real labels with those names
+PSEUDO_LABELS = ("orgId", "status")
+
+
+class Router:
+    def __init__(
+        self,
+        routes: List[Tuple[Dict[str, List[str]], List[str]]],
+        default_numbers: Optional[List[str]] = None,
+    ):
+        """
+        routes is a list of ({label: accepted values}, numbers)
+        """
+        # Every route is indexed under the values of its most selective label only, and
+        # its other labels are checked on lookup
+        frequencies: Dict[Tuple[str, str], int] = {}
+        for match, _ in routes:
+            for label, values in match.items():
+                for value in set(values):
+                    frequencies[label, value] = frequencies.get((label, value), 0) + 1
+        # (label, value): indexes of routes indexed under it
+        self._index: Dict[Tuple[str, str], List[int]] = {}
+        self._matchers: List[Tuple[Tuple[str, frozenset], ...]] = []
+        self._numbers: List[Tuple[str, ...]] = []
+        # Routes without matchers, matching every alert
+        self._catch_all: List[int] = []
+        for route_index, (match, numbers) in enumerate(routes):
+            matchers = tuple(
+                (label, frozenset(values)) for label, values in match.items()
+            )
+            self._matchers.append(matchers)
+            self._numbers.append(tuple(numbers))
+            if not matchers:
+                self._catch_all.append(route_index)
+                continue
+            label, values = min(
+                matchers,
+                key=lambda matcher: sum(
+                    frequencies[matcher[0], value] for value in matcher[1]
+                ),
+            )
+            for value in values:
+                self._index.setdefault((label, value), []).append(route_index)
+        # Pseudo labels some routes are indexed under
+        self._pseudo_labels = [
+            label
+            for label in PSEUDO_LABELS
+            if any(key[0] == label for key in self._index)
+        ]
+        self.default_numbers = tuple(default_numbers or ())
+
+    def _matches(self, route_index: int, labels: dict, pseudo_labels: dict) -> bool:
+        for label, values in self._matchers[route_index]:
+            value = labels[label] if label in labels else pseudo_labels.get(label)
+            if value not in values:
+                return False
+        return True
+
+    def numbers(self, labels: dict, pseudo_labels: Optional[dict] = None) -> List[str]:
+        """
+        Numbers of all routes matching labels, in route order
+        """
+        pseudo_labels = pseudo_labels or {}
+        index = self._index
+        candidates = []
+        for label, value in labels.items():
+            routes = index.get((label, value))
+            if routes:
+                candidates += routes
+        for label in self._pseudo_labels:
+            if label in labels or label not in pseudo_labels:
+                continue
+            routes = index.get((label, pseudo_labels[label]))
+            if routes:
+                candidates += routes
+        matched = [
+            route_index
+            for route_index in candidates
+            if self._matches(route_index, labels, pseudo_labels)
+        ]
+        if self._catch_all:
+            matched += self._catch_all
+        if not matched:
+            return list(self.default_numbers)
+        if len(matched) == 1:
+            return list(self._numbers[matched[0]])
+        numbers = []
+        for route_index in sorted(matched):
+            for number in self._numbers[route_index]:
+                if number not in numbers:
+                    numbers.append(number)
+        return numbers
+
+    def route(
+        self, alert: Union[AlertMessage, AlertMessageView]
+    ) -> List[Tuple[Union[AlertMessage, AlertMessageView], List[str]]]:
+        """
+        Returns (alert, numbers) deliveries, every number getting a single alert made
+        of the sub alerts routed to it
+        """
+        pseudo_labels = {"orgId": str(alert.orgId)}
+        if not alert.alerts:
+            pseudo_labels["status"] = alert.status
+            numbers = self.numbers(alert.commonLabels or {}, pseudo_labels)
+            return [(alert, numbers)] if numbers else []
+
+        # number: indexes of its sub alerts
+        sub_alerts: Dict[str, List[int]] = {}
+        for alert_index, sub_alert in enumerate(alert.alerts):
+            pseudo_labels["status"] = sub_alert.status
+            for number in self.numbers(sub_alert.labels, pseudo_labels):
+                sub_alerts.setdefault(number, []).append(alert_index)
+
+        # Numbers getting the same sub alerts share a single message
+        deliveries: Dict[Tuple[int, ...], List[str]] = {}
+        for number, alert_indexes in sub_alerts.items():
+            deliveries.setdefault(tuple(alert_indexes), []).append(number)
+        return [
+            (
+                (
+                    alert
+                    if len(alert_indexes) == len(alert.alerts)
+                    else with_alerts(
+                        alert, [alert.alerts[index] for index in alert_indexes]
+                    )
+                ),
+                numbers,
+            )
+            for alert_indexes, numbers in deliveries.items()
+        ]
+
+
+def router_from_config(config: Config) -> Optional[Router]:
+    """
+    Returns None when no routes nor default numbers are configured
+    """
+    routing = config.routing
+    if not routing.routes and not routing.default_numbers:
+        return None
+    return Router(
+        [(route.match, route.numbers) for route in routing.routes],
+        default_numbers=routing.default_numbers,
+    )
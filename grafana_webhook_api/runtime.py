@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.runtime"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+State precomputed from the configuration snapshot
+A new Runtime is built on configuration reload and swapped in a single assignment,
+so in-flight requests keep using the Runtime they started with
+"""
+
+
+from typing import Optional
+import asyncio
+import signal
+import logging
+from grafana_webhook_api import configuration
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.backends import backend_from_config
+from grafana_webhook_api.gateways import GatewayPool, gateway_pool_from_config
+from grafana_webhook_api.ratelimit import rules_from_config
+from grafana_webhook_api.state import state_store_from_config
+from grafana_webhook_api.priority import priorities_from_config
+from grafana_webhook_api.segments import segmenter_from_config
+from grafana_webhook_api.templates import template_from_config
+from grafana_webhook_api.auth import credential_store_from_config
+from grafana_webhook_api.tenants import tenants_from_config
+from grafana_webhook_api.routing import router_from_config
+from grafana_webhook_api.reports import delivery_tracker_from_config
+from grafana_webhook_api.admission import admission_controller_from_config
+
+
+logger = logging.getLogger()
+
+# Those sections are only read at startup
+RESTART_SECTIONS = (
+    "send_queue",
+    "admission",
+    "journal",
+    "state_store",
+    "coalesce",
+    "dedup",
+    "alert_state",
+    "delivery_reports",
+    "logging",
+)
+
+
+class Runtime:
+    def __init__(self, config: Config):
+        self.config = config
+        # Command template, gammu-smsd files spool or gammu-smsd sql outbox, or a pool of
+        # those balanced between modems
+        self.delivery_backend = gateway_pool_from_config(config) or backend_from_config(
+            config
+        )
+        self.rate_limit_rules = rules_from_config(config)
+        # Message templates are compiled once per configuration
+        self.template = template_from_config(config)
+        self.segmenter = segmenter_from_config(config)
+        self.priorities = priorities_from_config(config)
+        # Label routing index of the /grafana endpoint, None without routing rules
+        self.router = router_from_config(config)
+        # Tenant lane weights and sizes, None when tenants are disabled
+        self.tenants = tenants_from_config(config)
+        # Credentials are hashed once instead of being encoded on every request
+        self.credentials = credential_store_from_config(config)
+
+
+_RUNTIME = Runtime(configuration.get_config())
+
+# Rate limits and last sends, optionally shared between server workers
+# The store outlives reloads, only its rules are replaced
+STATE_STORE = state_store_from_config(_RUNTIME.config, _RUNTIME.rate_limit_rules)
+
+# gammu-smsd delivery reports of sent sms, None when disabled
+DELIVERY_TRACKER = delivery_tracker_from_config(_RUNTIME.config)
+
+# Adaptive limit of outstanding sms, None when admission control is disabled
+ADMISSION = admission_controller_from_config(_RUNTIME.config)
+
+
+def get_runtime() -> Runtime:
+    return _RUNTIME
+
+
+def _rebuild_runtime(old_config: Config, new_config: Config):
+    global _RUNTIME
+
+    runtime = Runtime(new_config)
+    for section in RESTART_SECTIONS:
+        if getattr(old_config, section) != getattr(new_config, section):
+            logger.warning(f"Changes to {section} need a server restart")
+    if old_config.http_server.model_dump(
+        include={"listen", "port", "workers"}
+    ) != new_config.http_server.model_dump(include={"listen", "port", "workers"}):
+        logger.warning("Changes to http_server listen, port or workers need a restart")
+    if old_config.tenants.enabled != new_config.tenants.enabled:
+        logger.warning("Enabling or disabling tenants needs a restart")
+    STATE_STORE.set_rules(runtime.rate_limit_rules)
+    if isinstance(runtime.delivery_backend, GatewayPool) and isinstance(
+        _RUNTIME.delivery_backend, GatewayPool
+    ):
+        runtime.delivery_backend.carry_over(_RUNTIME.delivery_backend)
+    _RUNTIME = runtime
+
+
+configuration.on_reload(_rebuild_runtime)
+
+
+async def reload_config(force: bool = False) -> bool:
+    """
+    Reading and validating the configuration file is done off the event loop
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        None, configuration.reload_config, force
+    )
+
+
+async def watch_config():
+    """
+    Reload configuration whenever the file modification time changes
+    """
+    while True:
+        config = get_runtime().config
+        await asyncio.sleep(config.config_reload.interval)
+        if config.config_reload.watch:
+            try:
+                await reload_config()
+            except Exception as exc:
+                logger.error(f"Configuration watcher failed: {exc}", exc_info=True)
+
+
+def install_reload_signal() -> Optional[bool]:
+    """
+    Reload configuration on SIGHUP
+    Not available on Windows, nor when the event loop doesn't run in the main thread
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(
+            signal.SIGHUP, lambda: asyncio.ensure_future(reload_config(force=True))
+        )
+        return True
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError) as exc:
+        logger.debug(f"Cannot install SIGHUP handler: {exc}")
+        return False
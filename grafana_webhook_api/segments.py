@@ -0,0 +1,232 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.segments"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+SMS encoding and segmentation
+A message is sent as GSM 7 bit (160 septets per sms, 153 per concatenated part) unless a
+single character is missing from the GSM alphabet, in which case the whole message is sent
+as UCS-2 (70 characters per sms, 67 per part)
+Segmenter transliterates such characters and caps messages by sms parts, which are what
+modem airtime is spent on
+"""
+
+
+from typing import List, Optional
+import logging
+import unicodedata
+from grafana_webhook_api.configuration import Config
+
+
+logger = logging.getLogger()
+
+# GSM 03.38 default alphabet, and its extension table which costs two septets per character
+GSM7_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = "\f^{}\\[~]|€"
+_GSM7_BASIC_SET = frozenset(GSM7_BASIC)
+_GSM7_EXTENDED_SET = frozenset(GSM7_EXTENDED)
+_GSM7_SET = _GSM7_BASIC_SET | _GSM7_EXTENDED_SET
+
+# Characters commonly found in alerts without a GSM equivalent after unicode decomposition
+TRANSLITERATIONS = {
+    "\t": " ",
+    "\u00a0": " ",
+    "\u2009": " ",
+    "\u202f": " ",
+    "‘": "'",
+    "’": "'",
+    "‚": "'",
+    "`": "'",
+    "´": "'",
+    "“": '"',
+    "”": '"',
+    "„": '"',
+    "«": '"',
+    "»": '"',
+    "‐": "-",
+    "–": "-",
+    "—": "-",
+    "−": "-",
+    "…": "...",
+    "•": "*",
+    "·": ".",
+    "°": "o",
+    "×": "x",
+    "÷": "/",
+    "≤": "<=",
+    "≥": ">=",
+    "≠": "!=",
+    "→": "->",
+    "←": "<-",
+    "œ": "oe",
+    "Œ": "OE",
+    "ð": "d",
+    "Ð": "D",
+    "þ": "th",
+    "Þ": "TH",
+    "ł": "l",
+    "Ł": "L",
+    "đ": "d",
+    "Đ": "D",
+}
+# Replaces characters which can't be transliterated
+UNKNOWN_CHARACTER = "?"
+
+
+def is_gsm7(message: str) -> bool:
+    return _GSM7_SET.issuperset(message)
+
+
+def ucs2_length(message: str) -> int:
+    """
+    Length as counted by gammu, characters outside of the BMP need a surrogate pair
+    """
+    return len(message.encode("utf-16-le")) // 2
+
+
+def split_parts(message: str, gsm7: Optional[bool] = None) -> List[str]:
+    """
+    Split a message into concatenated sms parts
+    A single part holds 160 septets or 70 UCS-2 characters, a concatenated part
+    loses 7 septets (or 3 UCS-2 characters) to the UDH
+    """
+    if gsm7 is None:
+        gsm7 = is_gsm7(message)
+    if gsm7:
+        single, multi = 160, 153
+        cost = [2 if char in _GSM7_EXTENDED_SET else 1 for char in message]
+    else:
+        single, multi = 70, 67
+        # Characters outside of the BMP need a surrogate pair
+        cost = [2 if ord(char) > 0xFFFF else 1 for char in message]
+    if sum(cost) <= single:
+        return [message]
+    parts = []
+    part_start = 0
+    part_cost = 0
+    for index, char_cost in enumerate(cost):
+        if part_cost + char_cost > multi:
+            parts.append(message[part_start:index])
+            part_start = index
+            part_cost = 0
+        part_cost += char_cost
+    parts.append(message[part_start:])
+    return parts
+
+
+def count_segments(message: str) -> int:
+    return len(split_parts(message))
+
+
+class _Transliterations(dict):
+    """
+    str.translate() table filled on first use of every character
+    """
+
+    def __missing__(self, codepoint: int) -> str:
+        char = chr(codepoint)
+        if char in _GSM7_SET:
+            replacement = char
+        elif char in TRANSLITERATIONS:
+            replacement = TRANSLITERATIONS[char]
+        else:
+            # Strip accents and compatibility forms, eg á -> a, ﬁ -> fi
+            replacement = "".join(
+                decomposed
+                for decomposed in unicodedata.normalize("NFKD", char)
+                if decomposed in _GSM7_SET
+            )
+            if not replacement:
+                replacement = UNKNOWN_CHARACTER
+        # Don't let arbitrary input grow the table forever
+        if len(self) < 4096:
+            self[codepoint] = replacement
+        return replacement
+
+
+_TRANSLITERATIONS = _Transliterations()
+
+
+def transliterate(message: str) -> str:
+    """
+    Replace characters missing from the GSM alphabet with their closest GSM equivalent
+    """
+    if is_gsm7(message):
+        return message
+    return message.translate(_TRANSLITERATIONS)
+
+
+class Segmenter:
+    """
+    Fits messages within max_segments sms parts (0 means no limit) and max_length characters
+    When label_priority is given, alert messages lose their label lines, lowest priority
+    first, before being cut
+    """
+
+    def __init__(
+        self,
+        max_segments: int = 0,
+        max_length: int = 2500,
+        transliterate: bool = False,
+        label_priority: Optional[List[str]] = None,
+        truncation_marker: str = "...",
+    ):
+        self.max_segments = max_segments
+        self.max_length = max_length
+        self.transliterate = transliterate
+        self.label_priority = tuple(label_priority or ())
+        self.truncation_marker = truncation_marker
+
+    def prepare(self, message: str) -> str:
+        if self.transliterate:
+            return transliterate(message)
+        return message
+
+    def fits(self, message: str) -> bool:
+        """
+        message must already be prepared
+        """
+        if len(message) > self.max_length:
+            return False
+        return not self.max_segments or count_segments(message) <= self.max_segments
+
+    def truncate(self, message: str) -> str:
+        """
+        Cut a prepared message so it fits with its truncation marker
+        """
+        if self.fits(message):
+            return message
+        marker = self.prepare(self.truncation_marker)
+        # Longest prefix that fits, found with a bisection over split_parts()
+        low, high = 0, min(len(message), self.max_length)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.fits(message[:middle] + marker):
+                low = middle
+            else:
+                high = middle - 1
+        return message[:low] + marker
+
+    def fit(self, message: str) -> str:
+        return self.truncate(self.prepare(message))
+
+
+def segmenter_from_config(config: Config) -> Segmenter:
+    return Segmenter(
+        max_segments=config.sms.max_segments,
+        max_length=config.alert_max_length,
+        transliterate=config.sms.transliterate,
+        label_priority=config.sms.label_priority,
+        truncation_marker=config.message_template.truncation_marker,
+    )
@@ -0,0 +1,361 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.state"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Rate limit state storage
+MemoryStateStore only works within one process
+SQLiteStateStore keeps state in a WAL mode sqlite database so multiple server
+workers share the same rate limits
+"""
+
+
+from typing import Optional, List
+import os
+import time
+import logging
+import threading
+import sqlite3
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.ratelimit import (
+    Refusal,
+    RateLimitRule,
+    RateLimiter,
+    rules_from_config,
+)
+
+
+logger = logging.getLogger()
+
+
+class StateStore:
+    """
+    Every store must implement admit(), which atomically checks rate limit rules
+    for a number and records the send when allowed
+    It also keeps the suppression index of client side min_interval, keyed by
+    (number, alert group), which is checked before any alert formatting
+    """
+
+    shared = False
+
+    def __init__(self, rules: List[RateLimitRule]):
+        self.rules = rules
+
+    def set_rules(self, rules: List[RateLimitRule]):
+        """
+        Replace rate limit rules, eg on configuration reload
+        """
+        self.rules = rules
+
+    def admit(
+        self,
+        number: str,
+        group: Optional[str] = None,
+        reserve: int = 0,
+        tenant: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Returns None when the sms may be sent, else the reason why it may not
+        reserve is the number of sends of every rule kept for high priority sms
+        """
+        raise NotImplementedError
+
+    def suppressed(self, number: str, group: str) -> Optional[float]:
+        """
+        Returns remaining suppression seconds, or None when not suppressed
+        """
+        raise NotImplementedError
+
+    def suppress(self, number: str, group: str, interval: float) -> bool:
+        """
+        Atomically suppresses (number, group) for interval seconds
+        Returns False when it already was suppressed, so concurrent requests only send once
+        """
+        raise NotImplementedError
+
+    def release(self, number: str, group: str):
+        """
+        Lift a suppression, eg when the sms could not be sent
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self, rules: List[RateLimitRule]):
+        super().__init__(rules)
+        self._lock = threading.Lock()
+        self._rate_limiter = RateLimiter(rules)
+        # (number, group): suppressed until timestamp
+        self._suppressions = {}
+        self._last_evict = time.monotonic()
+
+    def set_rules(self, rules: List[RateLimitRule]):
+        # Unchanged rules keep their windows and buckets, like SQLiteStateStore
+        with self._lock:
+            self.rules = rules
+            self._rate_limiter.set_rules(rules)
+
+    def admit(
+        self,
+        number: str,
+        group: Optional[str] = None,
+        reserve: int = 0,
+        tenant: Optional[str] = None,
+    ) -> Optional[str]:
+        with self._lock:
+            return self._rate_limiter.admit(
+                number, group=group, reserve=reserve, tenant=tenant
+            )
+
+    def suppressed(self, number: str, group: str) -> Optional[float]:
+        until = self._suppressions.get((number, group))
+        if until is None:
+            return None
+        remaining = until - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    def suppress(self, number: str, group: str, interval: float) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_evict > 60:
+                self._suppressions = {
+                    key: until
+                    for key, until in self._suppressions.items()
+                    if until > now
+                }
+                self._last_evict = now
+            until = self._suppressions.get((number, group))
+            if until is not None and until > now:
+                return False
+            self._suppressions[(number, group)] = now + interval
+            return True
+
+    def release(self, number: str, group: str):
+        with self._lock:
+            self._suppressions.pop((number, group), None)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Same rules as RateLimiter, sliding windows are kept as event rows and token buckets
+    as one row per scope key
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        path: str,
+        rules: List[RateLimitRule],
+        timeout: int = 30,
+        evict_interval: int = 60,
+    ):
+        super().__init__(rules)
+        self.path = path
+        self.timeout = timeout
+        self.evict_interval = evict_interval
+        self._max_interval = max([rule.interval for rule in rules] or [0])
+        self._last_evict = time.time()
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS suppressions (number TEXT NOT NULL, "
+                "grp TEXT NOT NULL, until REAL NOT NULL, PRIMARY KEY (number, grp))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events (scope TEXT NOT NULL, ts REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS events_scope_ts ON events (scope, ts)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (scope TEXT PRIMARY KEY, "
+                "tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def set_rules(self, rules: List[RateLimitRule]):
+        # Rows are keyed by rule description, so unchanged rules keep their state
+        self._max_interval = max([rule.interval for rule in rules] or [0])
+        self.rules = rules
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        One connection per thread and per process, since gunicorn forks workers
+        after the app has been loaded
+        """
+        pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != pid:
+            # Autocommit mode, transactions are explicitly opened with BEGIN IMMEDIATE
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    def _allows(
+        self,
+        conn: sqlite3.Connection,
+        rule: RateLimitRule,
+        scope: str,
+        now: float,
+        reserve: int = 0,
+    ) -> bool:
+        if rule.mode == "bucket":
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE scope = ?", (scope,)
+            ).fetchone()
+            if not row:
+                return True
+            tokens = min(
+                rule.count, row[0] + (now - row[1]) * rule.count / rule.interval
+            )
+            return tokens >= 1 + reserve
+        (count,) = conn.execute(
+            "SELECT COUNT(*) FROM events WHERE scope = ? AND ts > ?",
+            (scope, now - rule.interval),
+        ).fetchone()
+        return count < rule.count - reserve
+
+    def _record(
+        self, conn: sqlite3.Connection, rule: RateLimitRule, scope: str, now: float
+    ):
+        if rule.mode == "bucket":
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE scope = ?", (scope,)
+            ).fetchone()
+            if row:
+                tokens = min(
+                    rule.count, row[0] + (now - row[1]) * rule.count / rule.interval
+                )
+            else:
+                tokens = rule.count
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (scope, tokens, updated) VALUES (?, ?, ?)",
+                (scope, tokens - 1, now),
+            )
+        else:
+            conn.execute("INSERT INTO events (scope, ts) VALUES (?, ?)", (scope, now))
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """
+        Sliding window events and token buckets are useless after the longest rule interval
+        Expired suppressions are dropped too
+        """
+        conn.execute("DELETE FROM events WHERE ts <= ?", (now - self._max_interval,))
+        conn.execute(
+            "DELETE FROM buckets WHERE updated <= ?", (now - self._max_interval,)
+        )
+        conn.execute("DELETE FROM suppressions WHERE until <= ?", (now,))
+        self._last_evict = now
+
+    def admit(
+        self,
+        number: str,
+        group: Optional[str] = None,
+        reserve: int = 0,
+        tenant: Optional[str] = None,
+    ) -> Optional[str]:
+        conn = self._connection()
+        # BEGIN IMMEDIATE takes the write lock, so check and update are atomic between workers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            if now - self._last_evict > self.evict_interval:
+                self._evict(conn, now)
+            scopes = []
+            for rule in self.rules:
+                if rule.scope == "number":
+                    scope_key = number
+                elif rule.scope == "group":
+                    scope_key = group
+                elif rule.scope == "tenant":
+                    if tenant is None or not rule.applies_to_tenant(tenant):
+                        continue
+                    scope_key = tenant
+                else:
+                    scope_key = "global"
+                if scope_key is None:
+                    continue
+                scope = f"{rule.description}:{scope_key}"
+                if not self._allows(conn, rule, scope, now, rule.reserve(reserve)):
+                    conn.execute("COMMIT")
+                    return Refusal(rule, scope_key)
+                scopes.append((rule, scope))
+
+            for rule, scope in scopes:
+                self._record(conn, rule, scope, now)
+            conn.execute("COMMIT")
+            return None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def suppressed(self, number: str, group: str) -> Optional[float]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT until FROM suppressions WHERE number = ? AND grp = ?",
+                (number, group),
+            )
+            .fetchone()
+        )
+        if not row:
+            return None
+        remaining = row[0] - time.time()
+        return remaining if remaining > 0 else None
+
+    def suppress(self, number: str, group: str, interval: float) -> bool:
+        conn = self._connection()
+        now = time.time()
+        # Only replaces an expired suppression, so concurrent workers only send once
+        cursor = conn.execute(
+            "INSERT INTO suppressions (number, grp, until) VALUES (?, ?, ?) "
+            "ON CONFLICT (number, grp) DO UPDATE SET until = excluded.until "
+            "WHERE suppressions.until <= ?",
+            (number, group, now + interval, now),
+        )
+        return cursor.rowcount > 0
+
+    def release(self, number: str, group: str):
+        self._connection().execute(
+            "DELETE FROM suppressions WHERE number = ? AND grp = ?", (number, group)
+        )
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def state_store_from_config(
+    config: Config, rules: Optional[List[RateLimitRule]] = None
+) -> StateStore:
+    """
+    Rate limit rules are built once here, not on every send
+    """
+    if rules is None:
+        rules = rules_from_config(config)
+    if config.state_store.backend == "sqlite":
+        logger.info(f"Using shared sqlite state store {config.state_store.path}")
+        return SQLiteStateStore(config.state_store.path, rules)
+    return MemoryStateStore(rules)
@@ -0,0 +1,254 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.templates"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+SMS text templates
+${PLACEHOLDER} templates are compiled once into python f-strings when the configuration
+is loaded, so rendering an alert only collects fragments into a list and joins them once
+"""
+
+
+from typing import Optional, List, Callable
+import re
+import logging
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.models import AlertMessage
+from grafana_webhook_api.segments import Segmenter
+
+
+logger = logging.getLogger()
+
+PLACEHOLDER_REGEX = re.compile(r"\$\{([A-Z_]+)\}")
+
+# Placeholder: expression, evaluated with the arguments of the compiled function
+HEADER_FIELDS = {
+    "ORG_ID": "alert.orgId",
+    "TITLE": "alert.title",
+    "STATUS": "alert.status",
+    "EXTERNAL_URL": "alert.externalURL",
+}
+ALERT_HEADER_FIELDS = {"STATUS": "status"}
+LABEL_FIELDS = {"LABEL": "label", "VALUE": "value"}
+MORE_ALERTS_FIELDS = {"COUNT": "count"}
+GRAFANA_STATUSES = ("firing", "resolved")
+
+
+def _escape(text: str) -> str:
+    """
+    Literal text as it must appear between the double quotes of an f-string
+    """
+    return (
+        text.encode("unicode_escape")
+        .decode("ascii")
+        .replace('"', '\\"')
+        .replace("{", "{{")
+        .replace("}", "}}")
+    )
+
+
+def template_source(
+    template: str, fields: dict, constants: Optional[dict] = None
+) -> str:
+    """
+    Converts a ${PLACEHOLDER} template into f-string source code
+    Literal text and constants are escaped, so templates cannot inject code
+    Unknown placeholders raise ValueError
+    """
+    constants = constants or {}
+    parts = []
+    position = 0
+    for match in PLACEHOLDER_REGEX.finditer(template):
+        parts.append(_escape(template[position : match.start()]))
+        name = match.group(1)
+        if name in constants:
+            parts.append(_escape(str(constants[name])))
+        elif name in fields:
+            parts.append("{" + fields[name] + "}")
+        else:
+            raise ValueError(f"Unknown placeholder ${{{name}}} in template {template}")
+        position = match.end()
+    parts.append(_escape(template[position:]))
+    return 'f"' + "".join(parts) + '"'
+
+
+def _compile(source: str, names: Optional[dict] = None) -> Callable:
+    return eval(source, {"__builtins__": {}, **(names or {})})
+
+
+def compile_template(
+    template: str, fields: dict, arguments: str, constants: Optional[dict] = None
+) -> Callable[..., str]:
+    """
+    Compiles a ${PLACEHOLDER} template into a function taking arguments
+    """
+    return _compile(
+        f"lambda {arguments}: {template_source(template, fields, constants)}"
+    )
+
+
+class MessageTemplate:
+    """
+    Renders a Grafana alert as SMS text
+
+    header is rendered once, then every sub alert gets its status header followed
+    by one line per label
+    When labels is given, only those labels are shown, in that order
+    When max_alerts is reached, remaining sub alerts are summarized by more_alerts
+    """
+
+    def __init__(
+        self,
+        header: str = "${SUPERVISION_NAME} org ${ORG_ID}: ${TITLE}",
+        alert_header: str = "ALERT ${STATUS}:",
+        status_headers: Optional[dict] = None,
+        label_format: str = "- ${LABEL}=${VALUE}",
+        labels: Optional[List[str]] = None,
+        exclude_labels: Optional[List[str]] = None,
+        max_alerts: int = 0,
+        more_alerts: str = "(+${COUNT} more alerts)",
+        supervision_name: str = "Supervision",
+    ):
+        self._header = compile_template(
+            header, HEADER_FIELDS, "alert", {"SUPERVISION_NAME": supervision_name}
+        )
+        # Fragments include their leading newline, so every line is a single append
+        self._alert_header = compile_template(
+            "\n" + alert_header, ALERT_HEADER_FIELDS, "status"
+        )
+        status_headers = status_headers or {}
+        # Known statuses are rendered right away
+        self._status_headers = {
+            status: self._alert_header(status)
+            for status in GRAFANA_STATUSES
+            if status not in status_headers
+        }
+        for status, template in status_headers.items():
+            self._status_headers[status] = compile_template(
+                "\n" + template, ALERT_HEADER_FIELDS, "status"
+            )(status)
+        self.labels = tuple(labels) if labels else None
+        self.exclude_labels = frozenset(exclude_labels or ())
+        # Label lines of a sub alert are rendered by a single list comprehension
+        if self.labels:
+            line = template_source(
+                "\n" + label_format, {"LABEL": "label", "VALUE": "labels[label]"}
+            )
+            source = f"lambda labels: [{line} for label in LABELS if label in labels]"
+        else:
+            line = template_source("\n" + label_format, LABEL_FIELDS)
+            source = f"lambda labels: [{line} for label, value in labels.items()"
+            source += " if label not in EXCLUDE]" if self.exclude_labels else "]"
+        self._label_lines = _compile(
+            source, {"LABELS": self.labels, "EXCLUDE": self.exclude_labels}
+        )
+        # Used when label lines are dropped to fit sms parts
+        self._label_line = compile_template(
+            "\n" + label_format, LABEL_FIELDS, "label, value"
+        )
+        self.max_alerts = max_alerts
+        self._more_alerts = compile_template(
+            "\n\n" + more_alerts, MORE_ALERTS_FIELDS, "count"
+        )
+
+    def _status_header(self, status: Optional[str]) -> str:
+        header = self._status_headers.get(status)
+        if header is None:
+            header = self._alert_header(status)
+        return header
+
+    def _shown_labels(self, labels: dict) -> List[str]:
+        if self.labels:
+            return [label for label in self.labels if label in labels]
+        return [label for label in labels if label not in self.exclude_labels]
+
+    def render(self, alert: AlertMessage, dropped_labels: Optional[set] = None) -> str:
+        fragments = [self._header(alert)]
+        append = fragments.append
+        extend = fragments.extend
+        if dropped_labels:
+            label_line = self._label_line
+
+            def label_lines(labels: dict) -> List[str]:
+                return [
+                    label_line(label, labels[label])
+                    for label in self._shown_labels(labels)
+                    if label not in dropped_labels
+                ]
+
+        else:
+            label_lines = self._label_lines
+        status_header = self._status_header
+        alerts = alert.alerts
+        if self.max_alerts and len(alerts) > self.max_alerts:
+            more_alerts = len(alerts) - self.max_alerts
+            alerts = alerts[: self.max_alerts]
+        else:
+            more_alerts = 0
+
+        for sub_alert in alerts:
+            append(status_header(sub_alert.status))
+            extend(label_lines(sub_alert.labels))
+            append("\n")
+
+        if more_alerts:
+            append(self._more_alerts(more_alerts))
+        elif not alerts:
+            # Alert may not contain sub alerts
+            append("\n")
+            append(alert.message)
+        return "".join(fragments)
+
+    def fit(self, alert: AlertMessage, segmenter: Segmenter) -> str:
+        """
+        Render alert within segmenter limits, dropping label lines with the lowest
+        priority first: labels missing from segmenter.label_priority in reverse order
+        of appearance, then label_priority from last to first
+        The most important label is always kept, segmenter.fit() cuts what remains too long
+        """
+        message = self.render(alert)
+        if segmenter.fits(segmenter.prepare(message)):
+            return message
+
+        shown_labels = {}
+        for sub_alert in alert.alerts:
+            shown_labels.update(dict.fromkeys(self._shown_labels(sub_alert.labels)))
+        priority = segmenter.label_priority
+        drop_order = [
+            label for label in reversed(shown_labels) if label not in priority
+        ]
+        drop_order += [label for label in reversed(priority) if label in shown_labels]
+
+        dropped_labels = set()
+        for label in drop_order[:-1]:
+            dropped_labels.add(label)
+            message = self.render(alert, dropped_labels)
+            if segmenter.fits(segmenter.prepare(message)):
+                break
+        return message
+
+
+def template_from_config(config: Config) -> MessageTemplate:
+    """
+    Raises ValueError on unknown placeholders, so a bogus template is refused on reload
+    """
+    template = config.message_template
+    return MessageTemplate(
+        header=template.header,
+        alert_header=template.alert_header,
+        status_headers=template.status_headers,
+        label_format=template.label_format,
+        labels=template.labels,
+        exclude_labels=template.exclude_labels,
+        max_alerts=template.max_alerts,
+        more_alerts=template.more_alerts,
+        supervision_name=config.supervision_name,
+    )
@@ -0,0 +1,159 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tenants"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+__version__ = "1.0.0"
+
+"""
+Tenant isolation, tenants being Grafana organizations (orgId) or /send users
+Every tenant gets its own send lane, and lanes share the send workers by weight with
+start-time fair queuing: a lane's virtual time advances by 1 / weight per sent sms, and
+the lane with the lowest virtual time is served next. A tenant flooding its lane only
+delays its own sms, others wait at most for their share
+Within a lane, sms are sent by priority, then in arrival order
+Per tenant rate limits are built by ratelimit.rules_from_config()
+"""
+
+
+from typing import Optional, Dict, Callable
+import heapq
+import asyncio
+import logging
+from grafana_webhook_api.configuration import Config
+
+
+logger = logging.getLogger()
+
+# Lane of sms without a tenant
+DEFAULT_TENANT = "default"
+
+
+class Tenant:
+    __slots__ = ("name", "weight", "max_size")
+
+    def __init__(self, name: str, weight: float = 1, max_size: int = 0):
+        self.name = name
+        self.weight = weight
+        # Maximum pending sms in the tenant lane, 0 means only send_queue max_size applies
+        self.max_size = max_size
+
+
+class Tenants:
+    def __init__(
+        self, tenants: Dict[str, Tenant], weight: float = 1, max_size: int = 0
+    ):
+        self.tenants = tenants
+        self.weight = weight
+        self.max_size = max_size
+
+    def get(self, name: str) -> Tenant:
+        tenant = self.tenants.get(name)
+        if tenant is None:
+            # Not remembered, so unknown tenants don't grow memory
+            return Tenant(name, self.weight, self.max_size)
+        return tenant
+
+
+_ANY_TENANTS = Tenants({})
+
+
+class _Lane:
+    __slots__ = ("items", "virtual_time")
+
+    def __init__(self, virtual_time: float):
+        self.items = []
+        self.virtual_time = virtual_time
+
+
+class FairQueue(asyncio.Queue):
+    """
+    Drop-in replacement for the send queue asyncio.PriorityQueue
+    Items are (-priority, sequence, args, kwargs, future), the tenant keyword argument
+    selecting the lane
+    get_tenants is called on every put and get, so weights follow configuration reloads
+    When it returns None, all lanes get the same weight
+    """
+
+    def __init__(self, get_tenants: Callable[[], Tenants], maxsize: int = 0):
+        self._get_tenants = get_tenants
+        super().__init__(maxsize=maxsize)
+
+    def _init(self, maxsize: int):
+        # asyncio.Queue.empty() checks _queue, empty lanes are removed
+        self._lanes: Dict[str, _Lane] = {}
+        self._queue = self._lanes
+        self._size = 0
+        # Virtual time of the last served lane, new lanes start from there
+        self._virtual_time = 0.0
+
+    def _settings(self, name: str) -> Tenant:
+        return (self._get_tenants() or _ANY_TENANTS).get(name)
+
+    def _qsize(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _tenant(item: tuple) -> str:
+        return item[3].get("tenant") or DEFAULT_TENANT
+
+    def _put(self, item: tuple):
+        name = self._tenant(item)
+        lane = self._lanes.get(name)
+        if lane is None:
+            lane = self._lanes[name] = _Lane(self._virtual_time)
+        heapq.heappush(lane.items, item)
+        self._size += 1
+
+    def _get(self) -> tuple:
+        name, lane = min(
+            self._lanes.items(), key=lambda name_lane: name_lane[1].virtual_time
+        )
+        item = heapq.heappop(lane.items)
+        self._size -= 1
+        self._virtual_time = lane.virtual_time
+        lane.virtual_time += 1 / self._settings(name).weight
+        if not lane.items:
+            # An idle tenant doesn't keep credit, it restarts from current virtual time
+            del self._lanes[name]
+        return item
+
+    def put_nowait(self, item: tuple):
+        name = self._tenant(item)
+        max_size = self._settings(name).max_size
+        lane = self._lanes.get(name)
+        if max_size and lane is not None and len(lane.items) >= max_size:
+            raise asyncio.QueueFull(f"Lane of tenant {name} full ({max_size} sms)")
+        super().put_nowait(item)
+
+    def depths(self) -> Dict[str, int]:
+        return {name: len(lane.items) for name, lane in self._lanes.items()}
+
+
+def tenants_from_config(config: Config) -> Optional[Tenants]:
+    """
+    Returns None when tenants are disabled
+    """
+    if not config.tenants.enabled:
+        return None
+    return Tenants(
+        {
+            name: Tenant(
+                name,
+                weight=tenant.weight,
+                max_size=(
+                    config.tenants.max_size
+                    if tenant.max_size is None
+                    else tenant.max_size
+                ),
+            )
+            for name, tenant in config.tenants.tenants.items()
+        },
+        weight=config.tenants.weight,
+        max_size=config.tenants.max_size,
+    )
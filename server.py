@@ -7,8 +7,8 @@ __intname__ = "grafana_webhook_api.server"
 __author__ = "Orsiris de Jong"
 __copyright__ = "Copyright (C) 2023-2026 NetInvent"
 __license__ = "BSD-3 Clause"
-__build__ = "2026012901"
-__version__ = "1.0.1"
+__build__ = "2026101801"
+__version__ = "1.1.0"
 
 
 import sys
@@ -50,19 +50,34 @@ if __name__ == "__main__":
     if args.dev:
         _DEV = True
 
-    if args.config_file:
-        config_dict = configuration.load_config(args.config_file)
+    # Same configuration snapshot as the one loaded by the api
+    config = configuration.get_config()
+    listen = config.http_server.listen
+    port = config.http_server.port
+
+    # Rate limits are only shared between workers when using a shared state store
+    # Deduplication, alert states, coalescing, admission control, tenant lanes and delivery
+    # reports are always kept per worker
+    per_worker = configuration.per_worker_features(config)
+    if config.state_store.backend == "memory":
+        workers = 1
+    elif config.http_server.workers:
+        workers = config.http_server.workers
+        if workers > 1 and per_worker:
+            logger.warning(
+                "Running {} workers, but {} state is kept per worker".format(
+                    workers, ", ".join(per_worker)
+                )
+            )
+    elif per_worker:
+        logger.info(
+            "Running a single worker since {} state is kept per worker".format(
+                ", ".join(per_worker)
+            )
+        )
+        workers = 1
     else:
-        config_dict = configuration.load_config()
-
-    try:
-        listen = config_dict["http_server"]["listen"]
-    except (TypeError, KeyError):
-        listen = None
-    try:
-        port = config_dict["http_server"]["port"]
-    except (TypeError, KeyError):
-        port = None
+        workers = (multiprocessing.cpu_count() * 2) + 1
 
     # Cannot use gunicorn on Windows
     if _DEV or os.name == "nt":
@@ -102,7 +117,7 @@ if __name__ == "__main__":
                 return self.application
 
         server_args = {
-            "workers": 1,  # Don't run multiple workers since we don't have shared variables yet (multiprocessing.cpu_count() * 2) + 1,
+            "workers": workers,
             "bind": f"{listen}:{port}" if listen else "0.0.0.0:8080",
             "worker_class": "uvicorn.workers.UvicornWorker",
         }
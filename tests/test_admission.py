@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.admission"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+from grafana_webhook_api.admission import AdmissionController
+
+
+def _controller(load: int, **kwargs) -> AdmissionController:
+    controller = AdmissionController(**kwargs)
+    controller.get_load = lambda: load
+    return controller
+
+
+def test_admit_under_limit():
+    controller = _controller(10, initial_limit=20)
+    assert controller.admit(0, high_priority=10) is None
+    assert controller.admit(0, high_priority=10, cost=10) is None
+
+
+def test_shed_low_priority_over_limit():
+    controller = _controller(20, initial_limit=20, concurrency=2)
+    controller.observe(1.0)
+    # 5 sms over the limit, sent 2 at a time in one second each
+    assert controller.admit(0, high_priority=10, cost=5) == 3
+    # High priority sms are always admitted
+    assert controller.admit(10, high_priority=10, cost=5) is None
+
+
+def test_retry_after_is_capped():
+    controller = _controller(1000, initial_limit=20, max_retry_after=30)
+    controller.observe(10.0)
+    assert controller.admit(0, high_priority=10) == 30
+
+
+def test_large_requests_go_through_when_idle():
+    controller = _controller(0, initial_limit=4, min_limit=4)
+    assert controller.admit(0, high_priority=10, cost=100) is None
+
+
+def test_limit_shrinks_on_failures_and_slow_sends():
+    controller = _controller(20, initial_limit=20, min_limit=4)
+    controller.admit(0, high_priority=10)
+    for _ in range(100):
+        controller.observe(1.0)
+    steady = controller.limit
+    for _ in range(20):
+        controller.observe(1.0, success=False)
+    assert controller.limit < steady
+    failing = controller.limit
+    for _ in range(50):
+        controller.observe(30.0)
+    assert controller.min_limit <= controller.limit <= failing
+
+
+def test_limit_grows_when_used():
+    controller = _controller(20, initial_limit=20, max_limit=50)
+    controller.admit(0, high_priority=10)
+    for _ in range(50):
+        controller.observe(1.0)
+    assert 20 < controller.limit <= 50
+
+
+def test_limit_stays_when_unused():
+    controller = _controller(1, initial_limit=20)
+    controller.admit(0, high_priority=10)
+    for _ in range(50):
+        controller.observe(1.0)
+    assert controller.limit == 20
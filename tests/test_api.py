@@ -0,0 +1,448 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.api"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import os
+import json
+import time
+import importlib
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from grafana_webhook_api import configuration, runtime, sms, api
+from grafana_webhook_api.backends import DeliveryBackend
+
+
+CONFIG = """
+sms_command: "true"
+http_server:
+  no_auth: true
+"""
+
+
+class FakeBackend(DeliveryBackend):
+    """
+    Fails for failing numbers, keeps sent messages and the most concurrent sends seen
+    """
+
+    name = "fake"
+
+    def __init__(self, failing=(), delay: float = 0):
+        self.failing = set(failing)
+        self.delay = delay
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def send(self, number: str, message: str):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+            if number in self.failing:
+                return False, "modem error"
+            self.sent.append((number, message))
+        return True, "sent"
+
+
+@pytest.fixture
+def load_api(tmp_path, monkeypatch):
+    """
+    Returns a function loading the app with additional configuration, the fake backend
+    replacing the configured one
+    The app state is built at import time, so runtime, sms and api modules are reloaded
+    """
+
+    def _load_api(extra_config: str = "", backend: DeliveryBackend = None):
+        path = tmp_path / "grafana_webhook_api.conf"
+        path.write_text(CONFIG + extra_config)
+        monkeypatch.setattr(configuration, "_CONFIG_FILE", str(path))
+        monkeypatch.setattr(configuration, "_CONFIG_MTIME", os.stat(path).st_mtime)
+        monkeypatch.setattr(configuration, "_CONFIG", configuration.load_settings(path))
+        monkeypatch.setattr(configuration, "_RELOAD_CALLBACKS", [])
+        importlib.reload(runtime)
+        importlib.reload(sms)
+        importlib.reload(api)
+        runtime.get_runtime().delivery_backend = backend or FakeBackend()
+        return api
+
+    return _load_api
+
+
+def _lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_bulk_json_array(load_api):
+    backend = FakeBackend()
+    api = load_api(backend=backend)
+    body = [
+        {"number": "+33600000001", "message": "Disk full"},
+        {"numbers": "+33600000002;+33600000003", "message": "Load high"},
+        {"numbers": ["+33600000004"], "message": "Swap full", "priority": 10},
+    ]
+    with TestClient(api.app) as client:
+        response = client.post("/send", json=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = _lines(response)
+    assert sorted((line["index"], line["number"]) for line in lines) == [
+        (0, "+33600000001"),
+        (1, "+33600000002"),
+        (1, "+33600000003"),
+        (2, "+33600000004"),
+    ]
+    assert {line["status_code"] for line in lines} == {200}
+    assert sorted(backend.sent) == [
+        ("+33600000001", "Disk full"),
+        ("+33600000002", "Load high"),
+        ("+33600000003", "Load high"),
+        ("+33600000004", "Swap full"),
+    ]
+
+
+def test_bulk_ndjson(load_api):
+    backend = FakeBackend()
+    api = load_api(backend=backend)
+    body = (
+        '{"number": "+33600000001", "message": "Disk full"}\n'
+        "\n"
+        '{"number": "+33600000002", "message": "Load high"}\n'
+    )
+    with TestClient(api.app) as client:
+        response = client.post(
+            "/send", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+    assert response.status_code == 200
+    assert sorted((line["index"], line["number"]) for line in _lines(response)) == [
+        (0, "+33600000001"),
+        (1, "+33600000002"),
+    ]
+    assert len(backend.sent) == 2
+
+
+def test_bulk_item_errors(load_api):
+    backend = FakeBackend()
+    api = load_api(backend=backend)
+    body = (
+        '{"number": "+33600000001", "message": "Disk full"}\n'
+        '{"number": "+33600000002", "message": ""}\n'
+        '{"message": "Load high"}\n'
+    )
+    with TestClient(api.app) as client:
+        response = client.post("/send", content=body)
+        assert response.status_code == 422
+        message = response.json()["message"]
+        # Every invalid item is reported with its index
+        assert "'body', 1, 'message'" in message
+        assert "'body', 2" in message
+        assert "'body', 0" not in message
+
+        # Numbers made only of separators are refused after parsing
+        response = client.post(
+            "/send",
+            json=[
+                {"number": "+33600000001", "message": "Disk full"},
+                {"numbers": ";", "message": "Load high"},
+            ],
+        )
+        assert response.status_code == 422
+        assert "'body', 1, 'numbers'" in response.json()["message"]
+    # Nothing is sent when any item is invalid
+    assert backend.sent == []
+
+
+def test_bulk_max_items(load_api):
+    backend = FakeBackend()
+    api = load_api("send_queue:\n  max_bulk_items: 2\n", backend=backend)
+    with TestClient(api.app) as client:
+        response = client.post(
+            "/send",
+            json=[
+                {"number": "+33600000001", "message": "Disk full"},
+                {"numbers": "+33600000002;+33600000003", "message": "Load high"},
+            ],
+        )
+        # Sms are counted, not items
+        assert response.status_code == 413
+        assert backend.sent == []
+
+        response = client.post(
+            "/send",
+            json=[{"numbers": "+33600000002;+33600000003", "message": "Load high"}],
+        )
+        assert response.status_code == 200
+    assert len(backend.sent) == 2
+
+
+def test_bulk_streamed_results(load_api):
+    """
+    Every sms gets its own result line, failed ones too, in completion order
+    """
+    backend = FakeBackend(failing=["+33600000002"])
+    api = load_api(backend=backend)
+    with TestClient(api.app) as client:
+        with client.stream(
+            "POST",
+            "/send",
+            json=[
+                {"number": "+33600000001", "message": "Disk full"},
+                {"numbers": "+33600000002;+33600000003", "message": "Load high"},
+            ],
+        ) as response:
+            assert response.status_code == 200
+            lines = [json.loads(line) for line in response.iter_lines() if line]
+    results = {line["number"]: line for line in lines}
+    assert len(lines) == 3
+    assert results["+33600000001"]["status_code"] == 200
+    assert results["+33600000002"]["status_code"] == 402
+    assert results["+33600000002"]["index"] == 1
+    assert results["+33600000003"]["status_code"] == 200
+    assert results["+33600000003"]["message"] == "Message sent"
+
+
+def test_full_send_queue(load_api):
+    """
+    Sms that do not fit in the send queue are answered with 503, others are sent
+    """
+    backend = FakeBackend(delay=0.5)
+    api = load_api("send_queue:\n  workers: 1\n  max_size: 1\n", backend=backend)
+    with TestClient(api.app) as client:
+        response = client.post(
+            "/send/+33600000001;+33600000002;+33600000003",
+            json={"message": "Disk full"},
+        )
+    assert response.status_code == 207
+    data = response.json()["data"]
+    refused = [
+        number for number, result in data.items() if result["status_code"] == 503
+    ]
+    assert refused
+    assert data[refused[0]]["message"] == "Send queue full, cannot send text"
+    assert len(backend.sent) == 3 - len(refused)
+
+
+def test_async_response(load_api):
+    """
+    Sms are answered once queued, and still sent before shutdown completes
+    """
+    backend = FakeBackend(delay=0.2)
+    api = load_api("send_queue:\n  async_response: true\n", backend=backend)
+    with TestClient(api.app) as client:
+        response = client.post(
+            "/send/+33600000001;+33600000002", json={"message": "Disk full"}
+        )
+        assert response.status_code == 202
+        assert (
+            response.json()["message"]
+            == "Message queued to: +33600000001, +33600000002"
+        )
+        assert backend.sent == []
+    assert sorted(backend.sent) == [
+        ("+33600000001", "Disk full"),
+        ("+33600000002", "Disk full"),
+    ]
+
+
+NUMBERS = ";".join(f"+3360000000{i}" for i in range(6))
+
+
+def test_numbers_are_sent_concurrently(load_api):
+    backend = FakeBackend(delay=0.2)
+    api = load_api("send_queue:\n  workers: 6\n", backend=backend)
+    with TestClient(api.app) as client:
+        begin = time.monotonic()
+        response = client.post(f"/send/{NUMBERS}", json={"message": "Disk full"})
+        elapsed = time.monotonic() - begin
+    assert response.status_code == 200
+    assert len(backend.sent) == 6
+    assert backend.max_in_flight > 1
+    assert elapsed < 6 * 0.2
+
+
+def test_max_parallel_sends(load_api):
+    backend = FakeBackend(delay=0.1)
+    api = load_api(
+        "send_queue:\n  workers: 6\n  max_parallel_sends: 2\n", backend=backend
+    )
+    with TestClient(api.app) as client:
+        response = client.post(f"/send/{NUMBERS}", json={"message": "Disk full"})
+    assert response.status_code == 200
+    assert len(backend.sent) == 6
+    assert backend.max_in_flight == 2
+
+
+def test_mixed_results(load_api):
+    backend = FakeBackend(failing=["+33600000002"])
+    api = load_api(backend=backend)
+    with TestClient(api.app) as client:
+        response = client.post(
+            "/send/+33600000001;+33600000002;+33600000003",
+            json={"message": "Disk full"},
+        )
+    assert response.status_code == 207
+    content = response.json()
+    assert content["status_code"] == 207
+    assert content["data"]["+33600000001"]["status_code"] == 200
+    assert content["data"]["+33600000002"]["status_code"] == 402
+    assert content["data"]["+33600000003"]["status_code"] == 200
+    assert "Cannot send text to: +33600000002" in content["message"]
+
+
+def _alert(*sub_alerts, status: str = "firing") -> dict:
+    """
+    Grafana notification of (fingerprint, status) sub alerts
+    """
+    return {
+        "status": status,
+        "orgId": 1,
+        "alerts": [
+            {
+                "status": sub_status,
+                "labels": {"alertname": fingerprint},
+                "annotations": {},
+                "fingerprint": fingerprint,
+            }
+            for fingerprint, sub_status in sub_alerts
+        ],
+        "commonLabels": {},
+        "groupLabels": {},
+        "externalURL": "http://grafana",
+        "groupKey": "key",
+        "title": "Disk full",
+        "message": "Disk full",
+        "version": "1",
+        "state": "alerting",
+        "truncatedAlerts": 0,
+    }
+
+
+def test_duplicate_alerts(load_api):
+    backend = FakeBackend(failing=["+33600000002"])
+    api = load_api("dedup:\n  enabled: true\n", backend=backend)
+    alert = _alert(("a1", "firing"))
+    with TestClient(api.app) as client:
+        response = client.post("/grafana/+33600000001", json=alert)
+        assert response.status_code == 200
+        response = client.post("/grafana/+33600000001", json=alert)
+        assert response.status_code == 200
+        assert response.json()["message"].startswith("Duplicate alert")
+        assert len(backend.sent) == 1
+
+        # Failed sends are forgotten, so Grafana retries go through
+        for _ in range(2):
+            response = client.post("/grafana/+33600000002", json=alert)
+            assert response.status_code == 402
+    assert len(backend.sent) == 1
+
+
+def test_only_alert_state_changes_are_sent(load_api):
+    backend = FakeBackend()
+    api = load_api("alert_state:\n  enabled: true\n", backend=backend)
+    with TestClient(api.app) as client:
+        response = client.post("/grafana/+33600000001", json=_alert(("a1", "firing")))
+        assert response.status_code == 200
+        assert len(backend.sent) == 1
+
+        # Unchanged firing alert is not sent again
+        response = client.post("/grafana/+33600000001", json=_alert(("a1", "firing")))
+        assert response.status_code == 200
+        assert response.json()["message"] == "No alert state change to: +33600000001"
+        assert len(backend.sent) == 1
+
+        # Only the newly firing alert of the group is sent
+        response = client.post(
+            "/grafana/+33600000001", json=_alert(("a1", "firing"), ("a2", "firing"))
+        )
+        assert response.status_code == 200
+        assert len(backend.sent) == 2
+        assert "alertname=a2" in backend.sent[-1][1]
+        assert "alertname=a1" not in backend.sent[-1][1]
+
+        # Resolved alerts are sent
+        response = client.post(
+            "/grafana/+33600000001", json=_alert(("a1", "resolved"), ("a2", "firing"))
+        )
+        assert response.status_code == 200
+        assert len(backend.sent) == 3
+        assert "alertname=a1" in backend.sent[-1][1]
+        assert "alertname=a2" not in backend.sent[-1][1]
+
+
+def test_alert_state_is_only_saved_once_sent(load_api):
+    backend = FakeBackend(failing=["+33600000001"])
+    api = load_api("alert_state:\n  enabled: true\n", backend=backend)
+    with TestClient(api.app) as client:
+        for _ in range(2):
+            response = client.post(
+                "/grafana/+33600000001", json=_alert(("a1", "firing"))
+            )
+            assert response.status_code == 402
+        backend.failing.clear()
+        response = client.post("/grafana/+33600000001", json=_alert(("a1", "firing")))
+        assert response.status_code == 200
+        assert response.json()["message"] == "Message sent to: +33600000001"
+    assert len(backend.sent) == 1
+
+
+def test_client_side_min_interval(load_api):
+    backend = FakeBackend()
+    api = load_api(backend=backend)
+    with TestClient(api.app) as client:
+        response = client.post(
+            "/grafana/+33600000001/300", json=_alert(("a1", "firing"))
+        )
+        assert response.status_code == 200
+        assert len(backend.sent) == 1
+
+        response = client.post(
+            "/grafana/+33600000001/300", json=_alert(("a2", "firing"))
+        )
+        assert response.status_code == 200
+        assert response.json()["data"]["+33600000001"]["message"] == (
+            "Suppressed by client side min_interval"
+        )
+        assert len(backend.sent) == 1
+
+        # Only suppressed numbers are dropped
+        response = client.post(
+            "/grafana/+33600000001;+33600000002/300", json=_alert(("a1", "firing"))
+        )
+        assert response.status_code == 200
+        assert sorted(backend.sent)[-1][0] == "+33600000002"
+        assert len(backend.sent) == 2
+
+        # Other suppression groups are not suppressed
+        response = client.post(
+            "/grafana/+33600000001/300/disks", json=_alert(("a1", "firing"))
+        )
+        assert response.status_code == 200
+        assert len(backend.sent) == 3
+
+
+def test_failed_sends_are_not_suppressed(load_api):
+    backend = FakeBackend(failing=["+33600000001"])
+    api = load_api(backend=backend)
+    with TestClient(api.app) as client:
+        response = client.post(
+            "/grafana/+33600000001/300", json=_alert(("a1", "firing"))
+        )
+        assert response.status_code == 402
+        backend.failing.clear()
+        response = client.post(
+            "/grafana/+33600000001/300", json=_alert(("a1", "firing"))
+        )
+        assert response.status_code == 200
+        assert response.json()["message"] == "Message sent to: +33600000001"
+    assert len(backend.sent) == 1
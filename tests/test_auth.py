@@ -0,0 +1,116 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.auth"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import base64
+import pytest
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.auth import (
+    HASH_ITERATIONS,
+    PasswordHash,
+    hash_password,
+    credential_store_from_config,
+)
+
+
+def _authorization(username: str, password: str) -> str:
+    return "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode()
+
+
+def _config(**http_server) -> Config:
+    return Config.model_validate({"http_server": http_server})
+
+
+def test_users_need_a_password():
+    with pytest.raises(ValueError):
+        _config(users=[{"username": "nopassword"}])
+    with pytest.raises(ValueError):
+        _config(username="grafana")
+    # Credentials don't matter without authentication
+    _config(username="grafana", no_auth=True)
+
+
+def test_verify():
+    store = credential_store_from_config(
+        _config(
+            username="grafana",
+            password="secret",
+            users=[
+                {
+                    "username": "hashed",
+                    "password_hash": hash_password("other", iterations=1000),
+                    "max_priority": 5,
+                }
+            ],
+        )
+    )
+    assert store.verify(_authorization("grafana", "secret")).name == "grafana"
+    assert store.verify(_authorization("grafana", "")) is None
+    assert store.verify(_authorization("grafana", "wrong")) is None
+    user = store.verify(_authorization("hashed", "other"))
+    assert user.name == "hashed" and user.priority(10) == 5
+    assert store.verify(_authorization("unknown", "secret")) is None
+    assert store.verify("Bearer token") is None
+    assert store.verify("Basic !!!") is None
+
+
+def test_unknown_users_use_a_slow_hash():
+    store = credential_store_from_config(_config(username="grafana", password="x"))
+    assert store._dummy_hash.iterations == HASH_ITERATIONS
+
+
+def test_header_cache():
+    store = credential_store_from_config(
+        _config(username="grafana", password="secret", auth_cache_size=1)
+    )
+    authorization = _authorization("grafana", "secret")
+    assert store.cached(authorization) is None
+    store.remember(authorization, store.verify(authorization))
+    assert store.cached(authorization).name == "grafana"
+    store.remember("Basic other", store.users["grafana"])
+    # Least recently used header is evicted
+    assert store.cached(authorization) is None
+
+
+def test_password_hashes():
+    password_hash = PasswordHash.from_string(hash_password("secret", iterations=1000))
+    assert password_hash.iterations == 1000
+    assert password_hash.verify(b"secret")
+    assert not password_hash.verify(b"Secret")
+    with pytest.raises(ValueError, match="Bogus password hash"):
+        PasswordHash.from_string("md5$1$salt$hash")
+    with pytest.raises(ValueError, match="Bogus password hash"):
+        PasswordHash.from_string("pbkdf2_sha256$many$salt$hash")
+
+
+def test_users():
+    store = credential_store_from_config(
+        _config(
+            username="grafana",
+            password="secret",
+            users=[
+                {"username": "staging", "password": "other", "tenant": "lane"},
+                {"username": "ops", "password": "other", "default_priority": 3},
+            ],
+        )
+    )
+    assert store.users["grafana"].tenant == "grafana"
+    assert store.users["staging"].tenant == "lane"
+    assert store.users["ops"].default_priority == 3
+    assert store.users["ops"].priority(10) == 10
+    with pytest.raises(ValueError, match="Duplicate user"):
+        credential_store_from_config(
+            _config(
+                username="grafana",
+                password="secret",
+                users=[{"username": "grafana", "password": "other"}],
+            )
+        )
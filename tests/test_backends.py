@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.backends"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import os
+import sqlite3
+import pytest
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.backends import (
+    CommandBackend,
+    DeliveryBackend,
+    FallbackBackend,
+    FilesSpoolBackend,
+    SQLOutboxBackend,
+    backend_from_config,
+)
+
+
+class FakeBackend(DeliveryBackend):
+    name = "fake"
+
+    def __init__(self, works: bool):
+        self.works = works
+        self.calls = 0
+
+    def send(self, number: str, message: str):
+        self.calls += 1
+        return self.works, "fake output"
+
+
+@pytest.fixture
+def smsd_database(tmp_path):
+    path = str(tmp_path / "smsd.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE outbox (ID INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "DestinationNumber TEXT, TextDecoded TEXT, Coding TEXT, UDH TEXT, "
+        "MultiPart TEXT, CreatorID TEXT);"
+        "CREATE TABLE outbox_multipart (ID INTEGER, SequencePosition INTEGER, "
+        "TextDecoded TEXT, Coding TEXT, UDH TEXT);"
+    )
+    conn.close()
+    return path
+
+
+def test_files_backend(tmp_path):
+    backend = FilesSpoolBackend(str(tmp_path))
+    result, filename = backend.send("+33601020304", "Disk full")
+    assert result
+    assert filename.startswith("OUTA") and "_+33601020304_" in filename
+    assert os.listdir(tmp_path) == [filename]
+    with open(tmp_path / filename, "rb") as file_handle:
+        assert file_handle.read() == b"Disk full"
+
+    result, filename = backend.send("0601", "Température")
+    with open(tmp_path / filename, "rb") as file_handle:
+        assert file_handle.read().decode("utf-16") == "Température"
+
+
+def test_files_backend_refuses_bogus_numbers(tmp_path):
+    backend = FilesSpoolBackend(str(tmp_path))
+    result, output = backend.send("../0601", "hello")
+    assert not result and "Invalid phone number" in output
+    assert os.listdir(tmp_path) == []
+
+
+def test_files_backend_errors(tmp_path):
+    backend = FilesSpoolBackend(str(tmp_path / "missing"))
+    result, output = backend.send("0601", "hello")
+    assert not result and output.startswith("Cannot write")
+
+
+def test_sql_backend(smsd_database):
+    backend = SQLOutboxBackend(smsd_database, creator_id="tests")
+    assert backend.send("0601", "Disk full") == (True, "1")
+    result, message_id = backend.send("0602", "a" * 200)
+    assert result
+
+    conn = sqlite3.connect(smsd_database)
+    rows = conn.execute(
+        "SELECT DestinationNumber, TextDecoded, Coding, UDH, MultiPart, CreatorID "
+        "FROM outbox ORDER BY ID"
+    ).fetchall()
+    assert rows[0] == (
+        "0601",
+        "Disk full",
+        "Default_No_Compression",
+        "",
+        "false",
+        "tests",
+    )
+    assert rows[1][1] == "a" * 153 and rows[1][4] == "true"
+    assert rows[1][3].startswith("050003") and rows[1][3].endswith("0201")
+    parts = conn.execute(
+        "SELECT SequencePosition, TextDecoded, UDH FROM outbox_multipart WHERE ID = ?",
+        (message_id,),
+    ).fetchall()
+    conn.close()
+    assert len(parts) == 1
+    position, text, udh = parts[0]
+    assert (position, text) == (2, "a" * 47)
+    # Same reference number for all parts
+    assert udh == rows[1][3][:-2] + "02"
+
+
+def test_sql_backend_unicode(smsd_database):
+    backend = SQLOutboxBackend(smsd_database)
+    backend.send("0601", "Tempête")
+    conn = sqlite3.connect(smsd_database)
+    assert conn.execute("SELECT Coding FROM outbox").fetchone() == (
+        "Unicode_No_Compression",
+    )
+    conn.close()
+
+
+def test_sql_backend_errors(tmp_path):
+    backend = SQLOutboxBackend(str(tmp_path / "empty.db"))
+    result, output = backend.send("0601", "hello")
+    assert not result and output.startswith("Cannot insert sms into outbox")
+
+
+def test_fallback_backend():
+    primary, fallback = FakeBackend(False), FakeBackend(True)
+    backend = FallbackBackend(primary, fallback)
+    assert backend.name == "fake+fake"
+    assert backend.send("0601", "hello") == (True, "fake output")
+    assert (primary.calls, fallback.calls) == (1, 1)
+    primary.works = True
+    backend.send("0601", "hello")
+    assert (primary.calls, fallback.calls) == (2, 1)
+
+
+def test_backend_from_config(tmp_path):
+    def _backend(**delivery) -> DeliveryBackend:
+        return backend_from_config(
+            Config.model_validate({"sms_command": "true", "delivery": delivery})
+        )
+
+    assert isinstance(_backend(), CommandBackend)
+    assert isinstance(_backend(backend="files"), FilesSpoolBackend)
+    assert isinstance(
+        _backend(backend="files", fallback_to_command=True), FallbackBackend
+    )
+    # sql backend without database uses the command
+    assert isinstance(_backend(backend="sql", database=None), CommandBackend)
+    assert backend_from_config(Config()) is None
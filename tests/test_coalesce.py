@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.coalesce"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import asyncio
+from grafana_webhook_api.coalesce import Coalescer
+from grafana_webhook_api.dispatcher import SendQueue
+
+
+def _run(test_function, **kwargs) -> list:
+    """
+    Runs test_function(coalescer) against a running send queue
+    Returns the (number, message, priority) of every send
+    """
+    sent = []
+
+    def _send(number: str, message: str, priority: int = 0, **_) -> bool:
+        sent.append((number, message, priority))
+        return True
+
+    async def _test():
+        send_queue = SendQueue(_send, workers=1)
+        await send_queue.start()
+        await test_function(Coalescer(send_queue, **kwargs))
+        await send_queue.stop()
+
+    asyncio.run(_test())
+    return sent
+
+
+def test_merged_message_header():
+    async def _test(coalescer):
+        futures = [
+            coalescer.submit("+33600000001", "Disk full"),
+            coalescer.submit("+33600000001", "Load high", priority=5),
+            coalescer.submit("+33600000002", "Swap full"),
+        ]
+        assert coalescer.pending == 3
+        coalescer.flush_all()
+        assert await asyncio.gather(*futures) == [True, True, True]
+
+    sent = _run(_test, header="${COUNT} alerts", separator="\n--\n")
+    assert sorted(sent) == [
+        ("+33600000001", "2 alerts\nDisk full\n--\nLoad high", 5),
+        ("+33600000002", "Swap full", 0),
+    ]
+
+
+def test_flush_when_window_ends():
+    async def _test(coalescer):
+        first = coalescer.submit("+33600000001", "Disk full")
+        second = coalescer.submit("+33600000001", "Load high")
+        await asyncio.sleep(0.05)
+        assert not first.done()
+        assert await asyncio.wait_for(asyncio.gather(first, second), timeout=1) == [
+            True,
+            True,
+        ]
+        assert coalescer.pending == 0
+
+    sent = _run(_test, window=0.2)
+    assert sent == [("+33600000001", "2 alerts\nDisk full\n--\nLoad high", 0)]
+
+
+def test_flush_at_max_length():
+    async def _test(coalescer):
+        futures = [
+            coalescer.submit("+33600000001", "Disk full"),
+            coalescer.submit("+33600000001", "Load high"),
+        ]
+        # Sent without waiting for the window
+        assert coalescer.pending == 0
+        await asyncio.gather(*futures)
+        # Next message starts a new batch
+        coalescer.submit("+33600000001", "Swap full")
+        assert coalescer.pending == 1
+        coalescer.flush_all()
+
+    sent = _run(_test, window=60, max_length=15)
+    assert sent == [
+        ("+33600000001", "2 alerts\nDisk full\n--\nLoad high", 0),
+        ("+33600000001", "Swap full", 0),
+    ]
+
+
+def test_urgent_messages_are_sent_right_away():
+    async def _test(coalescer):
+        buffered = coalescer.submit("+33600000001", "Disk full")
+        coalescer.submit("+33600000002", "Load high")
+        urgent = coalescer.submit("+33600000001", "Host down", priority=10)
+        # Buffered messages to the same number go along, other numbers keep waiting
+        assert coalescer.pending == 1
+        assert await asyncio.gather(buffered, urgent) == [True, True]
+        coalescer.flush_all()
+
+    sent = _run(_test, window=60, urgent_priority=10)
+    assert sent == [
+        ("+33600000001", "2 alerts\nDisk full\n--\nHost down", 10),
+        ("+33600000002", "Load high", 0),
+    ]
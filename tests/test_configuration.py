@@ -0,0 +1,44 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.configuration"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+from grafana_webhook_api.configuration import (
+    Config,
+    config_file,
+    load_settings,
+    per_worker_features,
+)
+
+
+def test_shipped_configuration_keeps_messages_unchanged():
+    config = load_settings(config_file)
+    assert config.sms.max_segments == Config().sms.max_segments == 0
+    assert config.sms.transliterate is Config().sms.transliterate is False
+
+
+def test_shipped_configuration_reserves_no_rate_limit():
+    config = load_settings(config_file)
+    assert config.priority.reserved == 0
+    assert config.priority.rules == []
+
+
+def test_shipped_configuration_disables_optional_features():
+    config = load_settings(config_file)
+    assert config.delivery.fallback_to_command is False
+    assert config.dedup.enabled is False
+
+
+def test_per_worker_features():
+    assert per_worker_features(Config()) == []
+    config = Config.model_validate(
+        {"dedup": {"enabled": True}, "delivery_reports": {"enabled": True}}
+    )
+    assert per_worker_features(config) == ["dedup", "delivery_reports"]
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.dedup"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import time
+from grafana_webhook_api.dedup import DedupCache
+from grafana_webhook_api.models import AlertMessage, parse_alert_message
+
+
+ALERT = """{{
+    {fields}
+    "alerts": [{alerts}]
+}}"""
+
+FIELDS = [
+    '"status": "firing",',
+    '"orgId": 1,',
+    '"commonLabels": {},',
+    '"groupLabels": {},',
+    '"externalURL": "http://grafana",',
+    '"groupKey": "key",',
+    '"title": "title",',
+    '"message": "message",',
+    '"version": "1",',
+    '"state": "alerting",',
+    '"truncatedAlerts": 0,',
+]
+
+ALERTS = [
+    '{"status": "firing", "labels": {}, "annotations": {}, "fingerprint": "a1"}',
+    '{"fingerprint": "b2", "annotations": {}, "labels": {}, "status": "firing"}',
+]
+
+
+def _alert(fields: list = FIELDS, alerts: list = ALERTS) -> AlertMessage:
+    return AlertMessage.model_validate_json(
+        ALERT.format(fields="\n    ".join(fields), alerts=", ".join(alerts))
+    )
+
+
+def test_key_is_stable():
+    key = DedupCache.key(["01", "02"], _alert())
+    # Field order of the payload and order of the alerts do not matter
+    assert DedupCache.key(["01", "02"], _alert(FIELDS[::-1])) == key
+    assert DedupCache.key(["01", "02"], _alert(alerts=ALERTS[::-1])) == key
+    # Neither does the parser
+    fast_alert = parse_alert_message(
+        ALERT.format(fields="\n    ".join(FIELDS), alerts=", ".join(ALERTS)).encode()
+    )
+    assert DedupCache.key(["01", "02"], fast_alert) == key
+
+    assert DedupCache.key(["01"], _alert()) != key
+    resolved = [ALERTS[0], ALERTS[1].replace('"firing"', '"resolved"')]
+    assert DedupCache.key(["01", "02"], _alert(alerts=resolved)) != key
+
+
+def test_key_needs_fingerprints():
+    alerts = ['{"status": "firing", "labels": {}, "annotations": {}}']
+    assert DedupCache.key(["01"], _alert(alerts=alerts)) is None
+
+
+def test_ttl():
+    cache = DedupCache(ttl=0.1)
+    assert not cache.seen("key")
+    assert cache.seen("key")
+    time.sleep(0.15)
+    assert not cache.seen("key")
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 2}
+
+
+def test_lru_eviction():
+    cache = DedupCache(max_size=2)
+    assert not cache.seen("first")
+    assert not cache.seen("second")
+    assert not cache.seen("third")
+    assert cache.stats()["size"] == 2
+    # Oldest key was evicted
+    assert not cache.seen("first")
+    assert cache.seen("third")
+
+
+def test_discard():
+    cache = DedupCache()
+    assert not cache.seen("key")
+    cache.discard("key")
+    assert not cache.seen("key")
+    cache.discard("unknown")
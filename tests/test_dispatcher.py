@@ -0,0 +1,123 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.dispatcher"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import time
+import asyncio
+import threading
+import pytest
+from grafana_webhook_api.dispatcher import SendQueue, SendQueueFull
+
+
+class FakeSender:
+    """
+    Blocking send function, keeps sent numbers in order
+    """
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def __call__(self, number: str, message: str, **kwargs) -> bool:
+        time.sleep(self.delay)
+        with self._lock:
+            self.sent.append(number)
+        return True
+
+
+def test_full_queue_refuses_sends():
+    async def _run():
+        queue = SendQueue(FakeSender(delay=0.2), workers=1, max_size=2)
+        await queue.start()
+        futures = [queue.submit(f"+3360000000{i}", "Disk full") for i in range(2)]
+        with pytest.raises(SendQueueFull):
+            queue.submit("+33600000009", "Disk full")
+        assert queue.full
+        await queue.stop()
+        return [future.result() for future in futures]
+
+    assert asyncio.run(_run()) == [True, True]
+
+
+def test_stop_drains_pending_sends():
+    sender = FakeSender(delay=0.01)
+
+    async def _run():
+        queue = SendQueue(sender, workers=2, max_size=100)
+        await queue.start()
+        futures = [queue.submit(f"+336000000{i:02d}", "Disk full") for i in range(20)]
+        await queue.stop()
+        assert not queue.running
+        return [future.result() for future in futures]
+
+    assert asyncio.run(_run()) == [True] * 20
+    assert len(sender.sent) == 20
+
+
+def test_stop_gives_up_after_drain_timeout():
+    """
+    Sms still queued or being sent after drain_timeout are answered as not sent
+    """
+    sender = FakeSender(delay=0.2)
+
+    async def _run():
+        queue = SendQueue(sender, workers=1, max_size=100, drain_timeout=0.1)
+        await queue.start()
+        futures = [queue.submit(f"+3360000000{i}", "Disk full") for i in range(5)]
+        await queue.stop()
+        assert all(future.done() for future in futures)
+        return [future.result() for future in futures]
+
+    assert asyncio.run(_run()) == [False] * 5
+
+
+def test_submit_needs_a_running_queue():
+    async def _run():
+        queue = SendQueue(FakeSender())
+        with pytest.raises(RuntimeError):
+            queue.submit("+33600000001", "Disk full")
+
+    asyncio.run(_run())
+
+
+def test_priority_order():
+    """
+    Higher priorities leave the queue first, equal priorities in arrival order
+    """
+    sender = FakeSender()
+
+    async def _run():
+        queue = SendQueue(sender, workers=1)
+        await queue.start()
+        # Nothing is taken from the queue before we yield to the event loop
+        for number, priority in [
+            ("low1", 0),
+            ("low2", 0),
+            ("high", 10),
+            ("medium1", 5),
+            ("low3", None),
+            ("medium2", 5),
+            ("negative", -1),
+        ]:
+            queue.submit(number, "Disk full", priority=priority)
+        await queue.stop()
+
+    asyncio.run(_run())
+    assert sender.sent == [
+        "high",
+        "medium1",
+        "medium2",
+        "low1",
+        "low2",
+        "low3",
+        "negative",
+    ]
@@ -0,0 +1,228 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.gateways"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from grafana_webhook_api import runtime, sms
+from grafana_webhook_api.backends import DeliveryBackend
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.gateways import Gateway, GatewayPool, gateway_pool_from_config
+from grafana_webhook_api.metrics import GATEWAY_SECONDS
+
+
+class FakeModem(DeliveryBackend):
+    def __init__(self, works: bool = True, delay: float = 0):
+        self.works = works
+        self.delay = delay
+        self.numbers = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def send(self, number: str, message: str):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+            self.numbers.append(number)
+        return self.works, "sent" if self.works else "modem gone"
+
+
+def _pool(*modems, weights=None, **kwargs) -> GatewayPool:
+    weights = weights or [1] * len(modems)
+    return GatewayPool(
+        [
+            Gateway(f"modem{index}", modem, weight=weight, max_concurrency=2)
+            for index, (modem, weight) in enumerate(zip(modems, weights), 1)
+        ],
+        **kwargs,
+    )
+
+
+def test_round_robin_follows_weights():
+    modem1, modem2 = FakeModem(), FakeModem()
+    pool = _pool(modem1, modem2, weights=[2, 1], balancing="round_robin")
+    for index in range(30):
+        assert pool.send(f"06{index:02d}", "hello") == (True, "sent")
+    assert (len(modem1.numbers), len(modem2.numbers)) == (20, 10)
+
+
+def test_least_outstanding_respects_concurrency():
+    modem1, modem2 = FakeModem(delay=0.02), FakeModem(delay=0.02)
+    pool = _pool(modem1, modem2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(lambda index: pool.send(f"06{index}", "hi"), range(24))
+        )
+    assert all(result for result, _ in results)
+    assert modem1.max_running <= 2 and modem2.max_running <= 2
+    assert len(modem1.numbers) + len(modem2.numbers) == 24
+    assert modem1.numbers and modem2.numbers
+
+
+def test_sticky_numbers():
+    modems = [FakeModem() for _ in range(3)]
+    pool = _pool(*modems, sticky_numbers=True)
+    for _ in range(3):
+        for index in range(20):
+            pool.send(f"06{index:02d}", "hello")
+    for modem in modems:
+        # Every number always went through the same modem
+        assert all(count == 3 for count in Counter(modem.numbers).values())
+    assert sum(bool(modem.numbers) for modem in modems) > 1
+
+
+def test_failover_and_sender():
+    broken, working = FakeModem(works=False), FakeModem()
+    pool = _pool(broken, working, min_samples=100)
+    assert pool.send("0601", "hello") == (True, "sent")
+    assert broken.numbers == ["0601"] and working.numbers == ["0601"]
+    assert pool.sender() == "modem2"
+
+    pool = _pool(broken, working, failover=False, min_samples=100)
+    assert pool.send("0601", "hello") == (False, "gateway modem1: modem gone")
+
+
+def test_unhealthy_gateways_are_ejected_then_probed():
+    broken, working = FakeModem(works=False), FakeModem()
+    pool = _pool(broken, working, min_samples=3, max_failure_rate=0.5, cooldown=0.1)
+    for _ in range(3):
+        pool.send("0601", "hello")
+    assert len(broken.numbers) == 3
+    assert [gateway["in_rotation"] for gateway in pool.status()] == [False, True]
+    for _ in range(5):
+        pool.send("0601", "hello")
+    assert len(broken.numbers) == 3
+
+    # After cooldown, a single probe send which succeeds puts it back in rotation
+    broken.works = True
+    time.sleep(0.15)
+    assert pool.status()[0]["probing"]
+    pool.send("0601", "hello")
+    assert len(broken.numbers) == 4
+    assert [gateway["in_rotation"] for gateway in pool.status()] == [True, True]
+
+
+def test_failed_probe_keeps_gateway_out():
+    broken, working = FakeModem(works=False), FakeModem()
+    pool = _pool(broken, working, min_samples=1, cooldown=0.05)
+    pool.send("0601", "hello")
+    time.sleep(0.08)
+    pool.send("0601", "hello")
+    assert len(broken.numbers) == 2
+    assert not pool.status()[0]["in_rotation"]
+    assert not pool.status()[0]["probing"]
+
+
+def test_slow_gateways_are_ejected():
+    slow, fast = FakeModem(delay=0.02), FakeModem()
+    pool = _pool(slow, fast, min_samples=2, max_latency=0.01, cooldown=60)
+    pool.send("0601", "hello")
+    pool.send("0601", "hello")
+    assert not pool.status()[0]["in_rotation"]
+
+
+def test_gateway_pool_from_config(tmp_path):
+    assert gateway_pool_from_config(Config()) is None
+    config = Config.model_validate(
+        {
+            "sms_command": "true",
+            "delivery": {
+                "gateways": [
+                    {"name": "modem1", "backend": "command", "weight": 2},
+                    {
+                        "name": "modem2",
+                        "backend": "files",
+                        "outbox_path": str(tmp_path),
+                        "max_concurrency": 3,
+                    },
+                    # No database, skipped
+                    {"name": "modem3", "backend": "sql"},
+                ],
+                "balancing": "round_robin",
+            },
+        }
+    )
+    pool = gateway_pool_from_config(config)
+    assert [gateway.name for gateway in pool.gateways] == ["modem1", "modem2"]
+    assert pool.gateways[0].weight == 2 and pool.gateways[1].max_concurrency == 3
+    assert pool.balancing == "round_robin"
+
+
+def _config(tmp_path, **health) -> Config:
+    return Config.model_validate(
+        {
+            "sms_command": "true",
+            "delivery": {
+                "gateways": [
+                    {"name": "modem1", "backend": "command"},
+                    {
+                        "name": "modem2",
+                        "backend": "files",
+                        "outbox_path": str(tmp_path),
+                    },
+                ],
+                "health": health,
+            },
+        }
+    )
+
+
+def test_reload_keeps_unchanged_gateways(tmp_path, monkeypatch):
+    config = _config(tmp_path, min_samples=1)
+    monkeypatch.setattr(runtime, "_RUNTIME", runtime.Runtime(config))
+    pool = runtime.get_runtime().delivery_backend
+    pool.gateways[0].backend = FakeModem(works=False)
+    pool.send("0601", "hello")
+    assert not pool.status()[0]["in_rotation"]
+
+    # Reloading an unchanged configuration keeps the failing modem out of rotation
+    runtime._rebuild_runtime(config, config)
+    reloaded = runtime.get_runtime().delivery_backend
+    assert reloaded is not pool
+    assert [gateway["in_rotation"] for gateway in reloaded.status()] == [False, True]
+    assert reloaded._condition is pool._condition
+
+    # Changed gateways start afresh
+    changed = config.model_copy(update={"sms_command": "false"})
+    runtime._rebuild_runtime(config, changed)
+    assert runtime.get_runtime().delivery_backend.status()[0]["in_rotation"]
+
+
+def test_reload_resizes_health_window(tmp_path):
+    pool = gateway_pool_from_config(_config(tmp_path, window=20))
+    pool.gateways[1].results.extend([(True, 0.1)] * 20)
+    reloaded = gateway_pool_from_config(_config(tmp_path, window=5))
+    reloaded.carry_over(pool)
+    assert reloaded.gateways[1] is pool.gateways[1]
+    assert len(reloaded.gateways[1].results) == 5
+
+
+def _observations() -> int:
+    return sum(sum(counts[:-1]) for counts in GATEWAY_SECONDS.snapshot().values())
+
+
+def test_pooled_sends_are_observed_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(runtime, "_RUNTIME", runtime.Runtime(_config(tmp_path)))
+    pool = runtime.get_runtime().delivery_backend
+    pool.gateways[0].backend = FakeModem(works=False)
+    pool.gateways[1].backend = FakeModem()
+    observations = _observations()
+    # Retries skip rate limits
+    assert sms.send_sms("0601", "hello", retry=True)
+    # One observation per tried gateway, none for the pool itself
+    assert _observations() - observations == 2
+    assert not any(key[0] == "gateways" for key in GATEWAY_SECONDS.snapshot())
@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.journal"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import time
+import asyncio
+import sqlite3
+from grafana_webhook_api.dispatcher import SendQueue
+from grafana_webhook_api.journal import (
+    RETRYING,
+    DurableSendQueue,
+    Journal,
+    JournalEntry,
+)
+
+
+class FakeModem:
+    def __init__(self, failures: int = 0):
+        # Number of sends failing before the modem works
+        self.failures = failures
+        self.calls = []
+
+    def send(self, number: str, message: str, **kwargs) -> bool:
+        self.calls.append((number, message, kwargs))
+        if self.failures:
+            self.failures -= 1
+            return False
+        return True
+
+
+def _queue(path: str, modem: FakeModem, **kwargs) -> DurableSendQueue:
+    return DurableSendQueue(
+        SendQueue(modem.send, workers=1),
+        path,
+        backoff=0.01,
+        max_backoff=0.01,
+        commit_interval=0,
+        poll_interval=0.01,
+        **kwargs,
+    )
+
+
+async def _wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        await asyncio.sleep(0.01)
+
+
+def _rows(path: str, table: str) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT number, attempts FROM {table}").fetchall()
+    finally:
+        conn.close()
+
+
+def test_sent_sms_are_acked(tmp_path):
+    path = str(tmp_path / "journal.db")
+    modem = FakeModem()
+
+    async def _run():
+        queue = _queue(path, modem)
+        await queue.start()
+        result = await queue.submit("0601", "hello", group="g1", priority=5)
+        await queue.stop()
+        return result
+
+    assert asyncio.run(_run()) is True
+    assert modem.calls == [
+        (
+            "0601",
+            "hello",
+            {
+                "group": "g1",
+                "retry": False,
+                "priority": 5,
+                "tenant": None,
+                "delivery_attempt": 0,
+            },
+        )
+    ]
+    assert _rows(path, "messages") == []
+
+
+def test_failed_sms_are_retried_then_dead_lettered(tmp_path):
+    path = str(tmp_path / "journal.db")
+    modem = FakeModem(failures=10)
+
+    async def _run():
+        queue = _queue(path, modem, max_attempts=3)
+        await queue.start()
+        result = await queue.submit("0601", "hello")
+        await _wait_for(lambda: len(modem.calls) == 3 and not queue._in_flight)
+        await queue.stop()
+        return result
+
+    assert asyncio.run(_run()) == RETRYING
+    # Retries skip rate limits, which admitted the first attempt
+    assert [call[2]["retry"] for call in modem.calls] == [False, True, True]
+    assert _rows(path, "messages") == []
+    assert _rows(path, "dead_letters") == [("0601", 3)]
+
+
+def test_retry_succeeds(tmp_path):
+    path = str(tmp_path / "journal.db")
+    modem = FakeModem(failures=1)
+
+    async def _run():
+        queue = _queue(path, modem, max_attempts=3)
+        await queue.start()
+        await queue.submit("0601", "hello")
+        await _wait_for(lambda: len(modem.calls) == 2 and not queue._in_flight)
+        await queue.stop()
+
+    asyncio.run(_run())
+    assert _rows(path, "messages") == []
+    assert _rows(path, "dead_letters") == []
+
+
+def test_sms_of_a_crashed_process_are_replayed(tmp_path):
+    path = str(tmp_path / "journal.db")
+    # Journaled by a process which died before sending
+    crashed = Journal(path, "crashed")
+    crashed.open()
+    crashed.apply(
+        [
+            ("append", JournalEntry("0601", "first", priority=1)),
+            ("append", JournalEntry("0602", "second", priority=9)),
+        ]
+    )
+    crashed.close()
+    modem = FakeModem()
+
+    async def _run():
+        queue = _queue(path, modem)
+        await queue.start()
+        await _wait_for(lambda: len(modem.calls) == 2 and not queue._in_flight)
+        await queue.stop()
+
+    asyncio.run(_run())
+    # Claimed by priority
+    assert [call[0] for call in modem.calls] == ["0602", "0601"]
+    assert _rows(path, "messages") == []
+
+
+def test_live_owners_keep_their_claims(tmp_path):
+    path = str(tmp_path / "journal.db")
+    first = Journal(path, "first")
+    first.open()
+    first.apply([("append", JournalEntry("0601", "hello"))])
+    # Appended entries are dispatched by their owner, not claimed again
+    assert first.claim(10) == []
+
+    second = Journal(path, "second")
+    second.open()
+    assert second.claim(10) == []
+    # Given back on shutdown, so the next process replays it right away
+    first.leave()
+    first.close()
+    (entry,) = second.claim(10)
+    second.apply([("ack", entry.id)])
+    assert second.claim(10) == []
+    assert second.stats() == {"pending": 0, "dead_letters": 0}
+    second.close()
+
+
+def test_unsent_sms_survive_a_restart(tmp_path):
+    path = str(tmp_path / "journal.db")
+    modem = FakeModem(failures=1)
+
+    async def _first_run():
+        queue = _queue(path, modem)
+        # Retry far in the future
+        queue.backoff = queue.max_backoff = 3600
+        await queue.start()
+        assert await queue.submit("0601", "hello") == RETRYING
+        await queue.stop()
+
+    asyncio.run(_first_run())
+    assert _rows(path, "messages") == [("0601", 1)]
+
+    # Make the retry due
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE messages SET next_attempt = 0")
+    conn.commit()
+    conn.close()
+
+    async def _second_run():
+        queue = _queue(path, modem)
+        await queue.start()
+        await _wait_for(lambda: len(modem.calls) == 2 and not queue._in_flight)
+        await queue.stop()
+
+    asyncio.run(_second_run())
+    assert modem.calls[1][2]["retry"] is True
+    assert _rows(path, "messages") == []
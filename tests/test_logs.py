@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.logs"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import json
+import queue
+import logging
+import threading
+from grafana_webhook_api.logs import DroppingQueueHandler, JsonFormatter
+
+
+def _record(msg: str, args: tuple = (), exc_info=None) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.ERROR, __file__, 1, msg, args, exc_info)
+
+
+def test_records_are_prepared_when_queued():
+    log_queue = queue.Queue()
+    handler = DroppingQueueHandler(log_queue)
+    numbers = ["0601"]
+    try:
+        raise RuntimeError("modem gone")
+    except RuntimeError as exc:
+        handler.handle(_record("Cannot send to %s", (numbers,), (type(exc), exc, None)))
+    numbers.append("0602")
+
+    record = log_queue.get_nowait()
+    assert record.getMessage() == "Cannot send to ['0601']"
+    assert record.args is None and record.exc_info is None
+    assert "RuntimeError: modem gone" in logging.Formatter().format(record)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Cannot send to ['0601']"
+    assert "RuntimeError: modem gone" in entry["exception"]
+
+
+def test_dropped_records_are_counted_and_reported():
+    log_queue = queue.Queue(maxsize=10)
+    handler = DroppingQueueHandler(log_queue)
+
+    def _log():
+        for index in range(1000):
+            handler.handle(_record("record %s", (index,)))
+
+    threads = [threading.Thread(target=_log) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert log_queue.qsize() == 10
+    assert handler.dropped == 4000 - 10
+
+    while not log_queue.empty():
+        log_queue.get_nowait()
+    handler.handle(_record("after"))
+    messages = [log_queue.get_nowait().getMessage() for _ in range(2)]
+    assert messages == ["after", f"Log queue full, dropped {4000 - 10} log records"]
+    assert handler._reported == handler.dropped
+
+
+def test_dropped_records_are_not_formatted():
+    log_queue = queue.Queue(maxsize=1)
+    handler = DroppingQueueHandler(log_queue)
+    formatted = []
+
+    class _Argument:
+        def __str__(self):
+            formatted.append(self)
+            return "argument"
+
+    handler.handle(_record("first %s", (_Argument(),)))
+    assert len(formatted) == 1
+    try:
+        raise RuntimeError("modem gone")
+    except RuntimeError as exc:
+        record = _record("second %s", (_Argument(),), (type(exc), exc, None))
+    handler.handle(record)
+    assert len(formatted) == 1
+    assert record.exc_text is None
+    assert handler.dropped == 1
@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.metrics"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import os
+import time
+import threading
+from grafana_webhook_api.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    WorkerSnapshots,
+)
+
+
+def _registry():
+    registry = Registry()
+    counter = registry.register(Counter("sms_total", "Sent sms", ("status",)))
+    gauge = registry.register(Gauge("queue_depth", "Queued sms"))
+    histogram = registry.register(Histogram("send_seconds", "Sends", buckets=(1, 10)))
+    return registry, counter, gauge, histogram
+
+
+def test_thread_shards_are_summed():
+    _, counter, _, histogram = _registry()
+
+    def _update():
+        for _ in range(1000):
+            counter.inc(status="sent")
+            histogram.observe(2)
+
+    threads = [threading.Thread(target=_update) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.snapshot() == {("sent",): 4000}
+    assert histogram.snapshot() == {(): [0, 4000, 0, 8000]}
+
+
+def test_gauges_are_labelled_per_worker():
+    registry, counter, gauge, _ = _registry()
+    counter.inc(status="sent")
+    gauge.set_function(lambda: 3)
+    other_worker = {
+        "sms_total": {("sent",): 2},
+        "queue_depth": {("1",): 7},
+        "send_seconds": {},
+    }
+    exposition = registry.expose([other_worker])
+    assert 'sms_total{status="sent"} 3' in exposition
+    assert f'queue_depth{{worker="{os.getpid()}"}} 3' in exposition
+    assert 'queue_depth{worker="1"} 7' in exposition
+    assert "# TYPE queue_depth gauge" in exposition
+
+
+def test_failing_gauges_are_skipped():
+    registry, _, gauge, _ = _registry()
+    gauge.set_function(lambda: 1 / 0)
+    assert gauge.snapshot() == {}
+    assert "queue_depth{" not in registry.expose()
+
+
+def test_worker_snapshots(tmp_path):
+    registry, counter, gauge, histogram = _registry()
+    counter.inc(5, status="failed")
+    gauge.set_function(lambda: 2)
+    histogram.observe(0.5)
+    ours = WorkerSnapshots(registry, str(tmp_path), interval=5)
+    ours.write()
+
+    # As seen by another worker
+    other = WorkerSnapshots(registry, str(tmp_path), interval=5)
+    other.path = str(tmp_path / "metrics_1.json")
+    (snapshot,) = other.read_others()
+    assert snapshot["sms_total"] == {("failed",): 5}
+    assert snapshot["queue_depth"] == {(str(os.getpid()),): 2}
+    assert snapshot["send_seconds"] == {(): [1, 0, 0, 0.5]}
+
+    # Snapshots of dead workers are ignored
+    stale = time.time() - 60
+    os.utime(ours.path, (stale, stale))
+    assert other.read_others() == []
@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.models"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import os
+import json
+import pytest
+from grafana_webhook_api.configuration import HttpServerConfig
+from grafana_webhook_api.models import AlertMessage, PayloadError, parse_alert_message
+
+
+SAMPLES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "grafana-webhook-calls.txt",
+)
+
+
+def _payloads() -> list:
+    payloads = []
+    with open(SAMPLES, "r", encoding="utf-8") as file_handle:
+        for line in file_handle:
+            if not line.startswith("{"):
+                continue
+            try:
+                payloads.append(json.loads(line))
+            except ValueError:
+                # Truncated samples
+                continue
+    return payloads
+
+
+def test_fast_parsing_is_opt_in():
+    assert HttpServerConfig().fast_parsing is False
+
+
+def test_view_matches_model():
+    for payload in _payloads():
+        body = json.dumps(payload).encode("utf-8")
+        view = parse_alert_message(body)
+        alert = AlertMessage.model_validate_json(body)
+        for field in ("status", "groupLabels", "commonLabels", "orgId", "title"):
+            assert getattr(view, field) == getattr(alert, field)
+        assert [item.labels for item in view.alerts] == [
+            item.labels for item in alert.alerts
+        ]
+
+
+@pytest.mark.parametrize("org_id, expected", [(1, 1), ("2", 2), ("-3", -3), ("+4", 4)])
+def test_org_id(org_id, expected):
+    payload = _payloads()[0]
+    payload["orgId"] = org_id
+    assert parse_alert_message(json.dumps(payload).encode("utf-8")).orgId == expected
+
+
+@pytest.mark.parametrize("org_id", [3.7, 3.0, True, "3.7", "true", " 3", "", None])
+def test_invalid_org_id(org_id):
+    payload = _payloads()[0]
+    payload["orgId"] = org_id
+    with pytest.raises(PayloadError) as exc:
+        parse_alert_message(json.dumps(payload).encode("utf-8"))
+    assert exc.value.location == ("orgId",)
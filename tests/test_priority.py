@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.priority"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.models import AlertMessage
+from grafana_webhook_api.priority import (
+    Priorities,
+    PriorityRule,
+    priorities_from_config,
+)
+
+
+def _alert(*sub_alerts, common_labels: dict = None) -> AlertMessage:
+    return AlertMessage.model_validate(
+        {
+            "status": "firing",
+            "orgId": 1,
+            "alerts": [
+                {"status": status, "labels": labels, "annotations": {}}
+                for status, labels in sub_alerts
+            ],
+            "commonLabels": common_labels or {},
+            "groupLabels": {},
+            "externalURL": "http://grafana",
+            "groupKey": "key",
+            "title": "title",
+            "message": "message",
+            "version": "1",
+            "state": "alerting",
+            "truncatedAlerts": 0,
+        }
+    )
+
+
+PRIORITIES = Priorities(
+    [
+        PriorityRule(
+            20, status="firing", labels={"severity": ["critical", "disaster"]}
+        ),
+        PriorityRule(5, labels={"severity": "warning"}),
+        PriorityRule(-5, status="resolved"),
+    ],
+    default=1,
+    high_priority=10,
+    reserved=2,
+)
+
+
+def test_first_matching_rule():
+    assert PRIORITIES.priority(_alert(("firing", {"severity": "critical"}))) == 20
+    # Resolved critical alerts don't match the first rule
+    assert PRIORITIES.priority(_alert(("resolved", {"severity": "critical"}))) == -5
+    assert PRIORITIES.priority(_alert(("resolved", {"severity": "warning"}))) == 5
+    assert PRIORITIES.priority(_alert(("firing", {"severity": "info"}))) == 1
+
+
+def test_highest_sub_alert_priority():
+    alert = _alert(
+        ("firing", {"severity": "info"}),
+        ("firing", {"severity": "disaster"}),
+        ("resolved", {}),
+    )
+    assert PRIORITIES.priority(alert) == 20
+
+
+def test_alert_without_sub_alerts():
+    assert PRIORITIES.priority(_alert(common_labels={"severity": "warning"})) == 5
+
+
+def test_reserve():
+    assert PRIORITIES.reserve(10) == 0
+    assert PRIORITIES.reserve(9) == 2
+
+
+def test_priorities_from_config():
+    config = Config.model_validate(
+        {
+            "sms_command": "true",
+            "priority": {
+                "default": 3,
+                "rules": [{"priority": 15, "labels": {"team": "ops"}}],
+            },
+        }
+    )
+    priorities = priorities_from_config(config)
+    assert priorities.priority(_alert(("firing", {"team": "ops"}))) == 15
+    assert priorities.priority(_alert(("firing", {"team": "dev"}))) == 3
@@ -0,0 +1,139 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.ratelimit"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import pytest
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.ratelimit import (
+    RateLimiter,
+    RateLimitRule,
+    rules_from_config,
+)
+
+
+def test_sliding_window():
+    limiter = RateLimiter([RateLimitRule("global", "global", 3, 60)])
+    assert [limiter.admit("0601", now=now) for now in (0, 1, 2)] == [None] * 3
+    refusal = limiter.admit("0601", now=59)
+    assert refusal and refusal.rule.name == "global"
+    # The first send left the window
+    assert limiter.admit("0601", now=60) is None
+    assert limiter.admit("0601", now=60.5) is not None
+
+
+def test_token_bucket():
+    limiter = RateLimiter([RateLimitRule("global", "global", 2, 60, mode="bucket")])
+    assert limiter.admit("0601", now=0) is None
+    assert limiter.admit("0601", now=0) is None
+    assert limiter.admit("0601", now=1) is not None
+    # One token every 30 seconds
+    assert limiter.admit("0601", now=31) is None
+    assert limiter.admit("0601", now=32) is not None
+
+
+def test_scopes():
+    limiter = RateLimiter(
+        [
+            RateLimitRule("number", "number", 1, 60),
+            RateLimitRule("group", "group", 2, 60),
+            RateLimitRule("tenant", "tenant", 1, 60, tenant="org1"),
+        ]
+    )
+    assert limiter.admit("0601", group="g1", now=0) is None
+    assert limiter.admit("0601", group="g2", now=1).rule.name == "number"
+    assert limiter.admit("0602", group="g1", now=1) is None
+    assert limiter.admit("0603", group="g1", now=1).rule.name == "group"
+    # Sms without group are not group limited
+    assert limiter.admit("0604", now=1) is None
+    assert limiter.admit("0605", tenant="org1", now=1) is None
+    assert limiter.admit("0606", tenant="org1", now=1).rule.name == "tenant"
+    assert limiter.admit("0607", tenant="org2", now=1) is None
+
+
+def test_refused_sends_are_not_recorded():
+    limiter = RateLimiter(
+        [
+            RateLimitRule("number", "number", 1, 60),
+            RateLimitRule("global", "global", 2, 60),
+        ]
+    )
+    assert limiter.admit("0601", now=0) is None
+    assert limiter.admit("0601", now=1) is not None
+    # The refused send didn't use global capacity
+    assert limiter.admit("0602", now=2) is None
+
+
+def test_reserve():
+    limiter = RateLimiter([RateLimitRule("global", "global", 3, 60)])
+    assert limiter.admit("0601", now=0, reserve=1) is None
+    assert limiter.admit("0602", now=0, reserve=1) is None
+    # The last send is kept for high priority sms
+    assert limiter.admit("0603", now=0, reserve=1) is not None
+    assert limiter.admit("0603", now=0) is None
+
+
+def test_reserve_keeps_one_send():
+    limiter = RateLimiter([RateLimitRule("number", "number", 1, 60)])
+    assert limiter.admit("0601", now=0, reserve=5) is None
+
+
+def test_evict():
+    limiter = RateLimiter([RateLimitRule("number", "number", 1, 60)])
+    for index in range(100):
+        limiter.admit(f"06{index:02d}", now=index)
+    assert limiter.stats() == {"limiters": 100}
+    # Only numbers which would still be refused are remembered
+    limiter.evict(now=110)
+    assert limiter.stats() == {"limiters": 49}
+    assert limiter.admit("0699", now=110) is not None
+
+
+def test_set_rules_keeps_unchanged_rules():
+    number = RateLimitRule("number", "number", 1, 60)
+    limiter = RateLimiter([number, RateLimitRule("global", "global", 10, 60)])
+    limiter.admit("0601", now=0)
+    limiter.set_rules([RateLimitRule("global", "global", 20, 60), number])
+    assert limiter.admit("0601", now=1).rule is number
+
+
+def test_bogus_rules():
+    with pytest.raises(ValueError):
+        RateLimitRule("bogus", "country", 1, 60)
+    with pytest.raises(ValueError):
+        RateLimitRule("bogus", "global", 1, 60, mode="leaky")
+    with pytest.raises(ValueError):
+        RateLimitRule.from_string("bogus", "global", "0/60")
+
+
+def test_rules_from_config():
+    config = Config.model_validate(
+        {
+            "min_interval": 300,
+            "global_rate_limit": "5/300",
+            "rate_limits": [{"scope": "group", "limit": "3/600", "mode": "bucket"}],
+            "tenants": {
+                "enabled": True,
+                "rate_limit": "20/3600",
+                "tenants": {"1": {"rate_limit": "100/3600"}},
+            },
+        }
+    )
+    rules = rules_from_config(config)
+    assert [(rule.name, rule.scope, rule.mode) for rule in rules] == [
+        ("min_interval", "number", "window"),
+        ("global_rate_limit", "global", "window"),
+        ("rate_limits[0]", "group", "bucket"),
+        ("tenants.rate_limit", "tenant", "window"),
+        ("tenants.1.rate_limit", "tenant", "window"),
+    ]
+    # Listed tenants only get their own limit
+    assert not rules[3].applies_to_tenant("1")
+    assert rules[3].applies_to_tenant("2")
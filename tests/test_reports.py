@@ -0,0 +1,298 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.reports"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import os
+import time
+import asyncio
+import sqlite3
+import pytest
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.journal import Journal, JournalEntry
+from grafana_webhook_api.reports import (
+    DELIVERED,
+    FAILED,
+    PENDING,
+    RETRIED,
+    SENT,
+    UNKNOWN,
+    DeliveryTracker,
+    SpoolReports,
+    SQLReports,
+    delivery_tracker_from_config,
+    message_reference,
+)
+
+
+@pytest.fixture
+def spool(tmp_path):
+    for directory in ("outbox", "sent", "error"):
+        (tmp_path / directory).mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def sentitems(tmp_path):
+    path = tmp_path / "smsd.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE sentitems (ID INTEGER, SequencePosition INTEGER, Status TEXT)"
+    )
+    conn.commit()
+
+    def _set(message_id: int, *statuses: str):
+        conn.execute("DELETE FROM sentitems WHERE ID = ?", (message_id,))
+        conn.executemany(
+            "INSERT INTO sentitems VALUES (?, ?, ?)",
+            [
+                (message_id, position, status)
+                for position, status in enumerate(statuses, 1)
+            ],
+        )
+        conn.commit()
+
+    _set.path = str(path)
+    yield _set
+    conn.close()
+
+
+def _statuses(tracker: DeliveryTracker, number: str) -> list:
+    return [delivery["status"] for delivery in tracker.deliveries(number)]
+
+
+def test_message_reference():
+    assert (
+        message_reference(
+            "gammu-smsd-inject\nWritten message with ID "
+            "/var/spool/gammu/outbox/OUTC20261018_120000_00_0601_sms0.txt\n"
+        )
+        == "OUTC20261018_120000_00_0601_sms0.txt"
+    )
+    assert message_reference("Written message with ID 42") == "42"
+    assert message_reference("OUTA20261018_120000_00_0601_1.txt") == (
+        "OUTA20261018_120000_00_0601_1.txt"
+    )
+    assert message_reference("") is None
+
+
+def test_sql_reports_wait_for_delivery_report(sentitems):
+    tracker = DeliveryTracker({None: SQLReports(sentitems.path)}, timeout=3600)
+    tracker.track("1", "0601", "hello")
+    tracker.track("2", "0602", "hello")
+    # References of another backend are not tracked
+    tracker.track("OUTA_file.txt", "0603", "hello")
+    assert tracker.pending == 2
+
+    asyncio.run(tracker.check())
+    assert _statuses(tracker, "0601") == [PENDING]
+
+    # Sent, but the delivery report is still to come
+    sentitems(1, "SendingOK")
+    sentitems(2, "DeliveryPending", "DeliveryPending")
+    asyncio.run(tracker.check())
+    assert _statuses(tracker, "0601") == [SENT]
+    assert _statuses(tracker, "0602") == [SENT]
+    assert tracker.pending == 2
+
+    sentitems(1, "DeliveryOK")
+    # A single failed part fails the whole sms
+    sentitems(2, "DeliveryOK", "DeliveryFailed")
+    asyncio.run(tracker.check())
+    assert _statuses(tracker, "0601") == [DELIVERED]
+    assert _statuses(tracker, "0602") == [FAILED]
+    assert tracker.pending == 0
+
+
+def test_sql_reports_without_delivery_report_are_final(sentitems):
+    tracker = DeliveryTracker({None: SQLReports(sentitems.path)})
+    tracker.track("1", "0601", "hello")
+    sentitems(1, "SendingOKNoReport")
+    asyncio.run(tracker.check())
+    assert _statuses(tracker, "0601") == [SENT]
+    assert tracker.pending == 0
+
+
+def test_sql_batches(sentitems):
+    tracker = DeliveryTracker({None: SQLReports(sentitems.path)}, batch_size=2)
+    for message_id in range(1, 6):
+        tracker.track(str(message_id), "0601", "hello")
+        sentitems(message_id, "DeliveryOK")
+    asyncio.run(tracker.check())
+    assert _statuses(tracker, "0601") == [DELIVERED] * 5
+
+
+def test_spool_reports(spool):
+    tracker = DeliveryTracker(
+        {None: SpoolReports(str(spool / "sent"), str(spool / "error"))}
+    )
+    tracker.track("OUTA_1_0601.txt", "0601", "hello")
+    tracker.track("OUTA_2_0602.txt", "0602", "hello")
+    (spool / "sent" / "OUTA_1_0601.txt").touch()
+    (spool / "error" / "OUTA_2_0602.txt").touch()
+    asyncio.run(tracker.check())
+    assert _statuses(tracker, "0601") == [SENT]
+    assert _statuses(tracker, "0602") == [FAILED]
+    assert tracker.pending == 0
+    assert tracker.stats()["statuses"] == {SENT: 1, FAILED: 1}
+
+
+def test_failed_sms_are_resent(spool):
+    tracker = DeliveryTracker(
+        {None: SpoolReports(str(spool / "sent"), str(spool / "error"))}, retries=1
+    )
+    resent = []
+    tracker.resend = resent.append
+    tracker.track("OUTA_1.txt", "0601", "hello", priority=5)
+    (spool / "error" / "OUTA_1.txt").touch()
+    asyncio.run(tracker.check())
+    assert [delivery.priority for delivery in resent] == [5]
+    assert _statuses(tracker, "0601") == [RETRIED]
+
+    # The resend is tracked with its attempt, and not resent again
+    tracker.track("OUTA_2.txt", "0601", "hello", attempt=resent[0].attempt + 1)
+    (spool / "error" / "OUTA_2.txt").touch()
+    asyncio.run(tracker.check())
+    assert len(resent) == 1
+    assert _statuses(tracker, "0601") == [FAILED, RETRIED]
+
+
+def test_timeout(spool, sentitems):
+    tracker = DeliveryTracker(
+        {None: SQLReports(sentitems.path)}, timeout=0.01, max_size=10
+    )
+    tracker.track("1", "0601", "hello")
+    tracker.track("2", "0602", "hello")
+    sentitems(2, "SendingOK")
+    asyncio.run(tracker.check())
+    time.sleep(0.02)
+    tracker.expire()
+    assert _statuses(tracker, "0601") == [UNKNOWN]
+    # Sent sms whose delivery report never came stay sent
+    assert _statuses(tracker, "0602") == [SENT]
+    assert tracker.pending == 0
+
+
+def test_max_size(sentitems):
+    tracker = DeliveryTracker({None: SQLReports(sentitems.path)}, max_size=2)
+    for message_id in range(1, 4):
+        tracker.track(str(message_id), "0601", "hello")
+    assert [delivery["reference"] for delivery in tracker.deliveries("0601")] == [
+        "3",
+        "2",
+    ]
+    assert tracker.pending == 2
+
+
+def test_gateway_sources(spool, tmp_path):
+    modem2 = tmp_path / "modem2"
+    for directory in ("outbox", "sent", "error"):
+        (modem2 / directory).mkdir(parents=True)
+    config = Config.model_validate(
+        {
+            "delivery": {
+                "backend": "command",
+                "gateways": [
+                    {"name": "modem1", "backend": "command"},
+                    {
+                        "name": "modem2",
+                        "backend": "files",
+                        "outbox_path": str(modem2 / "outbox"),
+                    },
+                ],
+            },
+            "delivery_reports": {
+                "enabled": True,
+                "sent_path": str(spool / "sent"),
+                "error_path": str(spool / "error"),
+            },
+        }
+    )
+    tracker = delivery_tracker_from_config(config)
+    assert set(tracker.sources) == {None, "modem2"}
+    # Command gateways use the configured source
+    tracker.track("OUTA_1.txt", "0601", "hello", gateway="modem1")
+    tracker.track("OUTA_1.txt", "0602", "hello", gateway="modem2")
+    (modem2 / "sent" / "OUTA_1.txt").touch()
+    for gateway in tracker.sources:
+        asyncio.run(tracker.check(gateway))
+    assert _statuses(tracker, "0601") == [PENDING]
+    assert tracker.deliveries("0602")[0]["gateway"] == "modem2"
+    assert _statuses(tracker, "0602") == [SENT]
+
+
+def test_journal_keeps_delivery_attempt(tmp_path):
+    journal = Journal(str(tmp_path / "journal.db"), "owner1")
+    journal.open()
+    journal.apply([("append", JournalEntry("0601", "hello", delivery_attempt=2))])
+    journal.apply([("release", 1)])
+    journal.close()
+
+    journal = Journal(str(tmp_path / "journal.db"), "owner2")
+    journal.open()
+    (entry,) = journal.claim(10)
+    assert entry.number == "0601" and entry.delivery_attempt == 2
+    journal.close()
+
+
+def test_spool_watch(spool):
+    pytest.importorskip("watchfiles")
+    source = SpoolReports(str(spool / "sent"), str(spool / "error"))
+
+    async def _watch():
+        watcher = source.watch(5)
+
+        async def _move():
+            await asyncio.sleep(0.3)
+            os.rename(spool / "outbox" / "OUTA_1.txt", spool / "error" / "OUTA_1.txt")
+
+        (spool / "outbox" / "OUTA_1.txt").touch()
+        mover = asyncio.create_task(_move())
+        reports = await watcher.__anext__()
+        await mover
+        await watcher.aclose()
+        return reports
+
+    assert asyncio.run(_watch()) == {"OUTA_1.txt": (FAILED, True)}
+
+
+class _FailingOnceReports(SpoolReports):
+    def __init__(self, sent_path: str, error_path: str):
+        super().__init__(sent_path, error_path)
+        self.watches = 0
+
+    async def watch(self, interval: float):
+        self.watches += 1
+        if self.watches == 1:
+            raise ValueError("source went away")
+        async for reports in super().watch(interval):
+            yield reports
+
+
+def test_failing_source_is_restarted(spool, caplog):
+    source = _FailingOnceReports(str(spool / "sent"), str(spool / "error"))
+    tracker = DeliveryTracker({None: source}, poll_interval=0.05)
+    tracker.track("OUTA_1_0601.txt", "0601", "hello")
+    (spool / "sent" / "OUTA_1_0601.txt").touch()
+
+    async def _run():
+        task = asyncio.create_task(tracker.run())
+        for _ in range(100):
+            if not tracker.pending:
+                break
+            await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(_run())
+    assert source.watches == 2
+    assert _statuses(tracker, "0601") == [SENT]
+    (record,) = [record for record in caplog.records if record.levelname == "ERROR"]
+    assert "source went away" in record.getMessage() and record.exc_info
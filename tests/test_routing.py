@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.routing"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.models import AlertMessage
+from grafana_webhook_api.routing import Router, router_from_config
+
+
+ROUTES = [
+    ({"grafana_folder": ["Databases"], "severity": ["critical", "disaster"]}, ["01"]),
+    ({"grafana_folder": ["Databases"]}, ["02"]),
+    ({"orgId": ["2"]}, ["03"]),
+    ({"status": ["resolved"], "team": ["ops"]}, ["04", "01"]),
+]
+
+
+def _alert(*sub_alerts, org_id: int = 1) -> AlertMessage:
+    return AlertMessage.model_validate(
+        {
+            "status": "firing",
+            "orgId": org_id,
+            "alerts": [
+                {"status": status, "labels": labels, "annotations": {}}
+                for status, labels in sub_alerts
+            ],
+            "commonLabels": {},
+            "groupLabels": {},
+            "externalURL": "http://grafana",
+            "groupKey": "key",
+            "title": "title",
+            "message": "message",
+            "version": "1",
+            "state": "alerting",
+            "truncatedAlerts": 0,
+        }
+    )
+
+
+def test_numbers():
+    router = Router(ROUTES, default_numbers=["99"])
+    assert router.numbers({"grafana_folder": "Databases", "severity": "critical"}) == [
+        "01",
+        "02",
+    ]
+    assert router.numbers({"grafana_folder": "Databases", "severity": "warning"}) == [
+        "02"
+    ]
+    assert router.numbers({"grafana_folder": "Web"}) == ["99"]
+
+
+def test_pseudo_labels():
+    router = Router(ROUTES)
+    assert router.numbers({}, {"orgId": "2", "status": "firing"}) == ["03"]
+    assert router.numbers({"team": "ops"}, {"orgId": "1", "status": "resolved"}) == [
+        "04",
+        "01",
+    ]
+    # Real labels win over pseudo labels
+    assert router.numbers({"orgId": "1"}, {"orgId": "2"}) == []
+
+
+def test_catch_all_route():
+    router = Router([({}, ["00"]), ({"team": ["ops"]}, ["01"])], ["99"])
+    assert router.numbers({"team": "dev"}) == ["00"]
+    assert router.numbers({"team": "ops"}) == ["00", "01"]
+
+
+def test_route_splits_sub_alerts():
+    router = Router(ROUTES)
+    alert = _alert(
+        ("firing", {"grafana_folder": "Databases", "severity": "critical"}),
+        ("firing", {"grafana_folder": "Databases"}),
+        ("resolved", {"team": "ops"}),
+    )
+    deliveries = {
+        tuple(numbers): [sub_alert.labels for sub_alert in routed.alerts]
+        for routed, numbers in router.route(alert)
+    }
+    assert deliveries == {
+        ("01",): [
+            {"grafana_folder": "Databases", "severity": "critical"},
+            {"team": "ops"},
+        ],
+        ("02",): [
+            {"grafana_folder": "Databases", "severity": "critical"},
+            {"grafana_folder": "Databases"},
+        ],
+        ("04",): [{"team": "ops"}],
+    }
+
+
+def test_route_by_org():
+    router = Router(ROUTES)
+    alert = _alert(("firing", {"grafana_folder": "Web"}), org_id=2)
+    ((routed, numbers),) = router.route(alert)
+    assert routed is alert and numbers == ["03"]
+    assert router.route(_alert(("firing", {"grafana_folder": "Web"}))) == []
+
+
+def test_router_from_config():
+    assert router_from_config(Config()) is None
+    router = router_from_config(
+        Config.model_validate(
+            {
+                "routing": {
+                    "routes": [{"match": {"orgId": 2}, "numbers": "0601;0602"}],
+                    "default_numbers": "0699",
+                }
+            }
+        )
+    )
+    assert router.numbers({}, {"orgId": "2"}) == ["0601", "0602"]
+    assert router.numbers({}, {"orgId": "1"}) == ["0699"]
@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.segments"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import pytest
+from grafana_webhook_api.segments import (
+    Segmenter,
+    count_segments,
+    is_gsm7,
+    split_parts,
+    transliterate,
+    ucs2_length,
+)
+
+
+@pytest.mark.parametrize(
+    "message, segments",
+    [
+        ("", 1),
+        ("a" * 160, 1),
+        ("a" * 161, 2),
+        ("a" * 306, 2),
+        ("a" * 307, 3),
+        # Extension table characters cost two septets
+        ("€" * 80, 1),
+        ("€" * 81, 2),
+        # A single UCS-2 character changes the whole message encoding
+        ("é" + "a" * 69, 1),
+        ("ê" + "a" * 69, 1),
+        ("ê" + "a" * 70, 2),
+        ("ê" + "a" * 133, 2),
+        ("ê" + "a" * 134, 3),
+    ],
+)
+def test_segment_boundaries(message, segments):
+    assert count_segments(message) == segments
+
+
+def test_parts_are_not_split_within_characters():
+    # An extension character never straddles two GSM parts
+    message = "a" * 152 + "€" + "a" * 10
+    parts = split_parts(message)
+    assert parts == ["a" * 152, "€" + "a" * 10]
+    # Nor does a surrogate pair in UCS-2
+    message = "😀" * 40
+    parts = split_parts(message)
+    assert "".join(parts) == message
+    assert all(ucs2_length(part) <= 67 for part in parts)
+
+
+def test_gsm7():
+    assert is_gsm7("Disk usage 95% on db01 [critical] @ops")
+    assert not is_gsm7("Température ’élevée’")
+    assert ucs2_length("😀") == 2
+
+
+def test_transliterate():
+    # é is part of the GSM alphabet, ê isn't
+    assert transliterate("Tempête ’élevée’ – 40°") == "Tempete 'élevée' - 40o"
+    assert transliterate("ﬁle 😀") == "file ?"
+    assert is_gsm7(transliterate("naïve “quotes” …"))
+
+
+def test_segmenter_truncates_to_segments():
+    segmenter = Segmenter(max_segments=2, max_length=2500)
+    message = segmenter.fit("a" * 500)
+    assert message.endswith("...")
+    assert count_segments(message) == 2
+    assert len(message) == 306
+
+
+def test_segmenter_transliterates_before_counting():
+    segmenter = Segmenter(max_segments=1, transliterate=True)
+    # 150 characters fit a single GSM sms once the quote is replaced
+    assert segmenter.fit("’" + "a" * 149) == "'" + "a" * 149
+    assert Segmenter(max_segments=1).fit("’" + "a" * 149).endswith("...")
+
+
+def test_segmenter_max_length():
+    segmenter = Segmenter(max_length=10, truncation_marker="[cut]")
+    assert segmenter.fit("a" * 20) == "aaaaa[cut]"
+    assert segmenter.fit("a" * 10) == "a" * 10
@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.state"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import os
+import pytest
+from grafana_webhook_api import configuration
+from grafana_webhook_api.ratelimit import rules_from_config
+from grafana_webhook_api.state import MemoryStateStore, SQLiteStateStore
+
+CONFIG = """
+min_interval: 300
+global_rate_limit: {global_rate_limit}
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    """
+    Configuration module pointed at a temporary file, without reload callbacks of the app
+    """
+    path = tmp_path / "grafana_webhook_api.conf"
+    path.write_text(CONFIG.format(global_rate_limit="5/300"))
+    monkeypatch.setattr(configuration, "_CONFIG_FILE", str(path))
+    monkeypatch.setattr(configuration, "_CONFIG_MTIME", os.stat(path).st_mtime)
+    monkeypatch.setattr(configuration, "_CONFIG", configuration.load_settings(path))
+    monkeypatch.setattr(configuration, "_RELOAD_CALLBACKS", [])
+    return path
+
+
+def _touch(path):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_rate_limits_survive_reload(config_file, tmp_path, backend):
+    rules = rules_from_config(configuration.get_config())
+    if backend == "memory":
+        store = MemoryStateStore(rules)
+    else:
+        store = SQLiteStateStore(str(tmp_path / "state.db"), rules)
+    configuration.on_reload(
+        lambda old_config, new_config: store.set_rules(rules_from_config(new_config))
+    )
+
+    assert store.admit("+33600000001") is None
+    assert store.admit("+33600000001") is not None
+
+    # Touching the file reloads the very same rules
+    _touch(config_file)
+    assert configuration.reload_config()
+    refusal = store.admit("+33600000001")
+    assert refusal is not None and refusal.rule.name == "min_interval"
+
+    # Changing one rule keeps the state of the others
+    config_file.write_text(CONFIG.format(global_rate_limit="10/300"))
+    _touch(config_file)
+    assert configuration.reload_config()
+    refusal = store.admit("+33600000001")
+    assert refusal is not None and refusal.rule.name == "min_interval"
+    assert store.admit("+33600000002") is None
+
+
+def test_memory_store_suppressions():
+    store = MemoryStateStore([])
+    assert store.suppress("+33600000001", "group", 60)
+    assert not store.suppress("+33600000001", "group", 60)
+    assert store.suppressed("+33600000001", "group") > 0
+    assert store.suppress("+33600000001", "other", 60)
+    store.release("+33600000001", "group")
+    assert store.suppressed("+33600000001", "group") is None
@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.templates"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import pytest
+from grafana_webhook_api.models import AlertMessage
+from grafana_webhook_api.templates import (
+    HEADER_FIELDS,
+    LABEL_FIELDS,
+    MessageTemplate,
+    compile_template,
+)
+
+# Literal text which would be code, or break the generated f-string, if not escaped
+LITERALS = [
+    "{alert.__class__}",
+    "{{ double }} and } unbalanced {",
+    'double " and single \' quotes """',
+    "back\\slash \\n \\x41 \\",
+    '"); __import__("os").system("false"); ("',
+    "f'{1+1}' ${lowercase} $ {SPACED} $TITLE",
+    "é ü 漢字 \t tab\nnewline",
+]
+
+
+def _alert(labels: dict, title: str = "Disk full") -> AlertMessage:
+    return AlertMessage.model_validate(
+        {
+            "status": "firing",
+            "orgId": 1,
+            "alerts": [{"status": "firing", "labels": labels, "annotations": {}}],
+            "commonLabels": {},
+            "groupLabels": {},
+            "externalURL": "http://grafana",
+            "groupKey": "key",
+            "title": title,
+            "message": "message",
+            "version": "1",
+            "state": "alerting",
+            "truncatedAlerts": 0,
+        }
+    )
+
+
+@pytest.mark.parametrize("literal", LITERALS)
+def test_literal_text(literal):
+    render = compile_template(literal + "${TITLE}" + literal, HEADER_FIELDS, "alert")
+    assert render(_alert({})) == literal + "Disk full" + literal
+
+
+@pytest.mark.parametrize("literal", LITERALS)
+def test_literal_constants(literal):
+    render = compile_template(
+        "${SUPERVISION_NAME}: ${TITLE}",
+        HEADER_FIELDS,
+        "alert",
+        {"SUPERVISION_NAME": literal},
+    )
+    assert render(_alert({})) == literal + ": Disk full"
+
+
+def test_fields_are_not_evaluated():
+    # Alert data is inserted as is, never parsed as a template or as code
+    title = "${ORG_ID} {alert.orgId} \" ' \\"
+    render = compile_template("${TITLE}", HEADER_FIELDS, "alert")
+    assert render(_alert({}, title=title)) == title
+    render = compile_template("${LABEL}=${VALUE}", LABEL_FIELDS, "label, value")
+    assert render("{label}", "${VALUE}") == "{label}=${VALUE}"
+
+
+def test_unknown_placeholders_are_refused():
+    with pytest.raises(ValueError):
+        compile_template("${TITLE} ${UNKNOWN}", HEADER_FIELDS, "alert")
+    # Known elsewhere is still unknown here
+    with pytest.raises(ValueError):
+        compile_template("${LABEL}", HEADER_FIELDS, "alert")
+
+
+def test_templates_have_no_builtins():
+    render = compile_template("${TITLE}", {"TITLE": "open"}, "alert")
+    with pytest.raises(NameError):
+        render(_alert({}))
+
+
+@pytest.mark.parametrize("literal", LITERALS)
+def test_message_template(literal):
+    template = MessageTemplate(
+        header=literal + " ${TITLE}",
+        alert_header=literal + " ${STATUS}",
+        label_format=literal + " ${LABEL}=${VALUE}",
+        more_alerts=literal,
+        supervision_name=literal,
+    )
+    labels = {"host": literal, literal: "value"}
+    assert template.render(_alert(labels)) == "\n".join(
+        [
+            f"{literal} Disk full",
+            f"{literal} firing",
+            f"{literal} host={literal}",
+            f"{literal} {literal}=value",
+            "",
+        ]
+    )
+    # Selected labels are compiled another way
+    template = MessageTemplate(label_format=literal + " ${LABEL}", labels=["host"])
+    assert template.render(_alert(labels)).endswith(f"\n{literal} host\n")
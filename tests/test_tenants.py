@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of grafana_webhook_smsd
+
+__intname__ = "grafana_webhook_api.tests.tenants"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2026 NetInvent"
+__license__ = "BSD-3 Clause"
+__build__ = "2026101801"
+
+
+import asyncio
+import itertools
+import pytest
+from grafana_webhook_api.configuration import Config
+from grafana_webhook_api.tenants import (
+    DEFAULT_TENANT,
+    FairQueue,
+    Tenant,
+    Tenants,
+    tenants_from_config,
+)
+
+
+_SEQUENCE = itertools.count()
+
+
+def _item(tenant: str, priority: int = 0) -> tuple:
+    return (-priority, next(_SEQUENCE), (tenant,), {"tenant": tenant}, None)
+
+
+def _drain(queue: FairQueue, count: int) -> list:
+    return [queue.get_nowait()[2][0] for _ in range(count)]
+
+
+def _run(coroutine_function):
+    # asyncio.Queue needs a running loop
+    return asyncio.run(coroutine_function())
+
+
+def test_lanes_are_served_by_weight():
+    tenants = Tenants({"big": Tenant("big", weight=3), "small": Tenant("small")})
+
+    async def _test():
+        queue = FairQueue(lambda: tenants)
+        for _ in range(40):
+            queue.put_nowait(_item("big"))
+            queue.put_nowait(_item("small"))
+        return _drain(queue, 40)
+
+    served = _run(_test)
+    assert served.count("big") == 30
+    assert served.count("small") == 10
+
+
+def test_flooding_tenant_only_delays_itself():
+    async def _test():
+        queue = FairQueue(lambda: None)
+        for _ in range(100):
+            queue.put_nowait(_item("flood"))
+        queue.put_nowait(_item("quiet"))
+        return _drain(queue, 3)
+
+    assert "quiet" in _run(_test)
+
+
+def test_priority_within_a_lane():
+    async def _test():
+        queue = FairQueue(lambda: None)
+        queue.put_nowait(_item("org1", priority=0))
+        queue.put_nowait(_item("org1", priority=10))
+        return [queue.get_nowait()[0] for _ in range(2)]
+
+    assert _run(_test) == [-10, 0]
+
+
+def test_idle_lanes_keep_no_credit():
+    async def _test():
+        queue = FairQueue(lambda: None)
+        for _ in range(10):
+            queue.put_nowait(_item("busy"))
+        _drain(queue, 10)
+        # A lane coming back starts from current virtual time, it doesn't get 10 sends in a row
+        for _ in range(4):
+            queue.put_nowait(_item("busy"))
+            queue.put_nowait(_item("late"))
+        return _drain(queue, 4)
+
+    assert sorted(_run(_test)) == ["busy", "busy", "late", "late"]
+
+
+def test_lane_max_size():
+    tenants = Tenants({"small": Tenant("small", max_size=2)})
+
+    async def _test():
+        queue = FairQueue(lambda: tenants, maxsize=10)
+        queue.put_nowait(_item("small"))
+        queue.put_nowait(_item("small"))
+        with pytest.raises(asyncio.QueueFull, match="small"):
+            queue.put_nowait(_item("small"))
+        queue.put_nowait(_item(DEFAULT_TENANT))
+        return queue.depths()
+
+    assert _run(_test) == {"small": 2, DEFAULT_TENANT: 1}
+
+
+def test_tenants_from_config():
+    assert tenants_from_config(Config()) is None
+    tenants = tenants_from_config(
+        Config.model_validate(
+            {
+                "tenants": {
+                    "enabled": True,
+                    "weight": 2,
+                    "max_size": 5,
+                    "tenants": {"1": {"weight": 4}, "2": {"max_size": 1}},
+                }
+            }
+        )
+    )
+    assert (tenants.get("1").weight, tenants.get("1").max_size) == (4, 5)
+    assert tenants.get("2").max_size == 1
+    assert (tenants.get("3").weight, tenants.get("3").max_size) == (2, 5)